@@ -6,8 +6,13 @@
 # @File: manager.py
 
 
+import os
+import sys
+
 from core.config.setting import static_setting
+from core.result.render import write_text, write_report
 from core.testengine.caserunner import CaseRunner
+from core.testengine.shard import parse_address, parse_shard
 from core.testengine.testlist import TestList
 
 runner = None
@@ -68,12 +73,90 @@ def run_test():
     global runner
     runner.start()
     runner.wait_for_test_done()
-    print(runner.result_report.root.to_text())
+    print_result()
+
+
+def resume_test(run_dir):
+    """
+    从检查点继续执行被中断的测试
+    @param run_dir: 被中断的那次执行的测试用例日志目录
+    """
+    global runner
+    runner.resume(run_dir)
+    runner.wait_for_test_done()
+    print_result()
+
+
+def set_shard(shard, policy="hash"):
+    """
+    静态分片, 只执行测试列表中属于本分片的测试用例
+    @param shard: 分片描述"i/N", i从0开始
+    @param policy: 分片方式: hash或duration
+    """
+    global runner
+    index, count = parse_shard(shard)
+    runner.set_shard(index, count, policy)
+
+
+def run_coordinator(address):
+    """
+    作为协调器向测试机分发测试用例, 并输出合并后的测试结果
+    @param address: 监听地址"host:port", 只指定端口时只监听本机
+    """
+    global runner
+    runner.run_coordinator(parse_address(address))
+    print_result()
+
+
+def run_worker(address):
+    """
+    作为测试机执行协调器分发的测试用例
+    @param address: 协调器地址"host:port"
+    """
+    global runner
+    runner.start_worker(parse_address(address))
+    runner.wait_for_test_done()
+    print_result()
+
+
+def plan_test():
+    """
+    输出执行计划, 不装载测试资源, 不执行测试用例
+    """
+    global runner
+    plan = runner.plan()
+    for index, case in enumerate(plan['order']):
+        estimate = "未知" if case['estimate'] is None else f"{case['estimate']:.1f}s"
+        print(f"{index + 1}. {case['case_key']} {case['case_name']} 优先级: {case['priority']} 预计耗时: {estimate}")
+    for case in plan['skipped']:
+        print(f"跳过: {case['case_key']} {case['case_name']} 原因: {case['reason']}")
+    print(f"执行: {len(plan['order'])}, 跳过: {len(plan['skipped'])}, "
+          f"预计耗时: {plan['estimated_duration']:.1f}s (另有{plan['unknown_duration']}个测试用例没有历史记录)")
+    return plan
+
+
+def print_result():
+    """
+    输出测试结果
+    """
+    write_text(runner.result_report.root, sys.stdout)
     tp_stats = runner.result_report.root.get_test_point_stats()
     print(f"PASS: {tp_stats[0]}, FAIL: {tp_stats[1]}")
     print(f"ERROR: {tp_stats[2]}, WARNING: {tp_stats[3]}, EXCEPTION: {tp_stats[4]}")
 
 
+def save_report(filename, report_format=None):
+    """
+    将测试结果写入文件
+    @param filename: 输出文件路径
+    @param report_format: text, json或junit, 为None时根据扩展名判断(.json, .xml, 其他为text)
+    """
+    if report_format is None:
+        extension = os.path.splitext(filename)[1].lower()
+        report_format = {".json": "json", ".xml": "junit"}.get(extension, "text")
+    write_report(runner.result_report.root, filename, report_format)
+
+
 if __name__ == "__main__":
     load_settings()
     init_engine()
@@ -28,10 +28,14 @@ class TestCaseBase(metaclass=ABCMeta):
         cleanup: 恢复测试的配置,测试对象恢复初始状态
         (可额外扩展, 增加资源收集步骤)
     """
+    # 测试用例的基础信息由@case装饰器设置在类上, 此处仅提供默认值, 实例中不能覆盖
+    priority = 999
+    pre_tests = []
+    test_type = TestType.ALL
+    skip_if_high_priority_failed = False
+    timeout = None  # collect_resource, setup, test三个阶段的总执行时间限制(秒), None表示不限制
 
     def __init__(self, reporter: ResultReporter):
-        self.priority = None
-        self.pre_tests = None
         self.reporter = reporter
         self._output_var = {}
         self.setting = None
@@ -61,6 +65,13 @@ class TestCaseBase(metaclass=ABCMeta):
     def cleanup(self, *args):
         pass
 
+    def release_resource(self):
+        """
+        测试用例执行超时后, 在cleanup之后由测试引擎调用
+        阻塞的阶段仍在后台线程中运行, 子类可以重载此方法关闭设备连接等资源, 使阻塞的操作尽快返回
+        """
+        pass
+
     @property
     def output_var(self):
         """
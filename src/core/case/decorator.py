@@ -11,7 +11,7 @@ import os
 import re
 from functools import wraps
 
-from base import TestType
+from core.case.base import TestType
 from core.result.reporter import StepResult
 
 
@@ -24,7 +24,7 @@ class MethodNotFoundError(Exception):
 
 
 def case(priority=0, test_type=TestType.ALL, feature_name=None,
-         testcase_id=None, pre_tests=None, skip_if_high_priority_failed=False):
+         testcase_id=None, pre_tests=None, skip_if_high_priority_failed=False, timeout=None):
     """
     测试用例的类装饰器, 用以对测试用例进行基础信息的配置
     """
@@ -36,6 +36,7 @@ def case(priority=0, test_type=TestType.ALL, feature_name=None,
         setattr(cls, "testcase_id", testcase_id)  # 测试用例对应的测试用例ID
         setattr(cls, "pre_tests", pre_tests if pre_tests else [])  # 前置的测试用例列表
         setattr(cls, "skip_if_high_priority_failed", skip_if_high_priority_failed)  # 当高优先级失败时,不执行该测试用例
+        setattr(cls, "timeout", timeout)  # 测试用例的最长执行时间(秒), 超时后中止并执行cleanup
         return cls
 
     return decorator
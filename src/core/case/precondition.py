@@ -74,7 +74,7 @@ class IsTestCasePriority(PreConditionBase):
         if ret:
             result_report.add(StepResult.INFO, self.get_description())
         else:
-            result_report.add(StepResult.INFO, self.get_description(), + f",当前测试用例优先级是{test_case.priority}")
+            result_report.add(StepResult.INFO, self.get_description() + f",当前测试用例优先级是{test_case.priority}")
         return ret
 
     def get_description(self):
@@ -87,27 +87,33 @@ class IsPreCasePassed(PreConditionBase):
     """
 
     def __init__(self, result_list):
-        self.result_list = result_list  # 用来记录已经执行的测试用例的结果信息
+        self.result_list = result_list  # 用来记录已经执行的测试用例的结果信息, 测试用例的键 -> 结果(包括测试用例名称)
 
     def is_meet(self, test_case, result_report: ResultReporter):
         if not any(test_case.pre_tests):
             # 没有前置测试用例，直接返回真
             return True
 
-        # 遍历前置测试用例清单, 并从测试完成结果集中查找测试用例执行结果
-        # 结果集查无该测试用例, 则返回False
+        # 遍历前置测试用例清单, 从测试报告的索引中直接查找执行完毕的测试用例, 优先查找同一个测试列表中的
+        # 索引中没有的测试用例(前置条件不满足而没有执行, 或者在其他测试机上执行), 从测试完成结果集中查找
+        # 都查无该测试用例, 则返回False
         # 一旦有一个结果没有成功执行则返回False
-        # TODO: 此处查找算法可进行优化, 如二分等
         for pre_case in test_case.pre_tests:
-            for case, data in self.result_list.items():
-                if pre_case == case:
-                    if not data['result']:
-                        result_report.add(StepResult.INFO, f"{case}的执行结果不成功")
-                        return False
-                    else:
-                        break
+            node = result_report.find_case(pre_case)
+            if node is not None:
+                passed = node.status == StepResult.PASS
             else:
-                result_report.add(StepResult.INFO, f"{pre_case}没有执行")
+                # 同名的测试用例执行了多次时, 使用最后记录的结果
+                data = None
+                for value in self.result_list.values():
+                    if value['case_name'] == pre_case:
+                        data = value
+                if data is None:
+                    result_report.add(StepResult.INFO, f"{pre_case}没有执行")
+                    return False
+                passed = data['result']
+            if not passed:
+                result_report.add(StepResult.INFO, f"{pre_case}的执行结果不成功")
                 return False
 
         # 全部执行则返回True
@@ -131,12 +137,12 @@ class IsHigherPriorityPassed(PreConditionBase):
         if not test_case.skip_if_high_priority_failed:
             return True
         #  遍历测试用例结果集, 判断是否存在高优先级未成功执行的测试用例
-        for case, data in self.result_list.items():
+        for data in self.result_list.values():
             if data['priority'] < self.priority and not data["result"]:
-                result_report.add(StepResult.INFO, f"测试用例{case}没有执行成功")
+                result_report.add(StepResult.INFO, f"测试用例{data['case_name']}没有执行成功")
                 return False
         result_report.add(StepResult.INFO, self.get_description())
-        return
+        return True
 
     def get_description(self):
         return f"优先级{self.priority}以上的测试用例必须通过"
@@ -15,7 +15,6 @@ import os
 import time
 
 from core.config.setting import static_setting, SettingBase
-from core.resource.constraints import ConnectionConstraint
 from core.resource.error import ResourceError, ResourceNotMeetConstraint
 from core.resource.setting import ResourceSetting
 
@@ -342,6 +341,9 @@ class ResourcePool:
         @parm resource: 资源
         @param constraints: 连接限制
         """
+        # constraints模块引用了本模块的ResourceDevice, 在使用时才导入, 避免循环导入
+        from core.resource.constraints import ConnectionConstraint
+
         # 限制类必须是连接限制ConnectionConstraint
         if constraints is None:
             constraints = []
@@ -360,11 +362,11 @@ class ResourcePool:
         return ret
 
 
-@static_setting.setter("ResourceSetting")
+@static_setting.setting("ResourceSetting")
 class ResourceSetting(SettingBase):
     """
         资源配置模块的配置类
-        当该模块被引用时, 执行static_setting的装饰器函数(setter)
+        当该模块被引用时, 执行static_setting的装饰器函数(setting)
         即在赋值的同时,更新所有的对象的配置路径
     """
     file_name = "resource_setting.setting"
@@ -0,0 +1,224 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/29 0029 20:16
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: diff.py
+
+"""
+    比较两次执行的测试结果
+"""
+
+# =====================================
+# 比较方法
+#   1. 测试用例以"测试列表路径/测试用例名称"为键建立索引, 同一路径下重名的测试用例按出现的顺序加上序号
+#   2. 两次都执行的测试用例比较状态和执行时间, 再以"步骤路径"为键比较步骤的增减和状态变化
+#   3. 只在一次中出现的测试用例记为新增或移除, 不比较其步骤
+#   每个节点只访问一次, 查找都是字典操作, 比较的耗时与两棵结果树的节点数量成线性关系
+#
+# 结果文件
+#   支持ResultNode.to_dict或render.write_json输出的json文件, 以及事件日志(events.log)
+# =====================================
+import json
+
+from core.result.eventlog import MAGIC, replay
+from core.result.reporter import NodeType, StepResult, ResultNode
+
+_FAILED = (StepResult.FAIL, StepResult.ERROR, StepResult.EXCEPTION)
+
+
+def load_result(filename):
+    """
+    读取保存的测试结果
+    @param filename: json文件或事件日志
+    @return: 结果树的根节点
+    """
+    with open(filename, mode="rb") as file:
+        is_event_log = file.read(len(MAGIC)) == MAGIC
+    if is_event_log:
+        return replay(filename)
+    with open(filename, encoding="utf-8") as file:
+        return ResultNode.from_dict(json.load(file))
+
+
+def _unique_key(counter, key):
+    """
+    同一个键第二次出现时加上序号
+    """
+    count = counter.get(key, 0)
+    counter[key] = count + 1
+    return key if count == 0 else f"{key}#{count + 1}"
+
+
+def index_cases(root):
+    """
+    建立测试用例的索引
+    @return: {测试列表路径/测试用例名称: 测试用例节点}, 按出现的顺序
+    """
+    rv = dict()
+    counter = dict()
+    stack = [(root, "")]
+    while stack:
+        node, path = stack.pop()
+        children = node.children
+        for child in reversed(children):
+            if child.type == NodeType.Case:
+                continue
+            if child.type != NodeType.Step:
+                stack.append((child, f"{path}/{child.header}" if child.type == NodeType.TestList else path))
+        # 测试用例按照在测试列表中的顺序加入索引
+        for child in children:
+            if child.type == NodeType.Case:
+                rv[_unique_key(counter, f"{path}/{child.header}")] = child
+    return rv
+
+
+def index_steps(case):
+    """
+    建立测试用例中步骤的索引
+    @return: {步骤路径: 步骤状态}
+    """
+    rv = dict()
+    stack = [(case, "")]
+    while stack:
+        node, path = stack.pop()
+        counter = dict()
+        for child in node.children:
+            key = _unique_key(counter, f"{path}/{child.header}")
+            rv[key] = child.status
+            stack.append((child, key))
+    return rv
+
+
+class CaseChange:
+    """
+    一个测试用例在两次执行之间的变化
+    """
+
+    def __init__(self, key, old_status, new_status, old_duration=None, new_duration=None):
+        self.key = key
+        self.old_status = old_status
+        self.new_status = new_status
+        self.old_duration = old_duration
+        self.new_duration = new_duration
+        self.steps_added = list()
+        self.steps_removed = list()
+        self.steps_changed = list()  # (步骤路径, 原状态, 新状态)
+
+    def to_dict(self):
+        return {"key": self.key,
+                "old_status": None if self.old_status is None else self.old_status.name,
+                "new_status": None if self.new_status is None else self.new_status.name,
+                "old_duration": self.old_duration,
+                "new_duration": self.new_duration,
+                "steps_added": self.steps_added,
+                "steps_removed": self.steps_removed,
+                "steps_changed": [[path, old.name, new.name] for path, old, new in self.steps_changed]}
+
+
+class ResultDiff:
+    """
+    两次执行的测试结果的差异
+    """
+
+    def __init__(self):
+        self.newly_failing = list()  # 上次没有失败, 本次失败的测试用例
+        self.newly_passing = list()  # 上次失败, 本次没有失败的测试用例
+        self.status_changed = list()  # 其他状态变化的测试用例
+        self.added = list()  # 本次新增的测试用例
+        self.removed = list()  # 本次没有执行的测试用例
+        self.step_changes = list()  # 步骤有增减或状态变化的测试用例
+        self.duration_regressions = list()  # 执行时间变长的测试用例
+
+    @property
+    def has_changes(self):
+        return any([self.newly_failing, self.newly_passing, self.status_changed, self.added, self.removed,
+                    self.step_changes, self.duration_regressions])
+
+    def to_dict(self):
+        return {"newly_failing": [change.to_dict() for change in self.newly_failing],
+                "newly_passing": [change.to_dict() for change in self.newly_passing],
+                "status_changed": [change.to_dict() for change in self.status_changed],
+                "added": [change.to_dict() for change in self.added],
+                "removed": [change.to_dict() for change in self.removed],
+                "step_changes": [change.to_dict() for change in self.step_changes],
+                "duration_regressions": [change.to_dict() for change in self.duration_regressions]}
+
+    def to_text(self):
+        lines = list()
+
+        def section(title, changes, describe):
+            if changes:
+                lines.append(f"{title}({len(changes)}):")
+                lines.extend(f"    {change.key} {describe(change)}" for change in changes)
+
+        section("新增失败", self.newly_failing, lambda c: f"{c.old_status.name} -> {c.new_status.name}")
+        section("恢复通过", self.newly_passing, lambda c: f"{c.old_status.name} -> {c.new_status.name}")
+        section("状态变化", self.status_changed, lambda c: f"{c.old_status.name} -> {c.new_status.name}")
+        section("新增测试用例", self.added, lambda c: c.new_status.name)
+        section("移除测试用例", self.removed, lambda c: c.old_status.name)
+        section("执行时间变长", self.duration_regressions,
+                lambda c: f"{c.old_duration:.1f}s -> {c.new_duration:.1f}s")
+        if self.step_changes:
+            lines.append(f"步骤变化({len(self.step_changes)}):")
+            for change in self.step_changes:
+                lines.append(f"    {change.key}")
+                lines.extend(f"        + {path}" for path in change.steps_added)
+                lines.extend(f"        - {path}" for path in change.steps_removed)
+                lines.extend(f"        * {path} {old.name} -> {new.name}" for path, old, new in change.steps_changed)
+        return "\n".join(lines) if lines else "没有差异"
+
+
+def diff_results(old_root, new_root, duration_threshold=0.2, min_duration_delta=1.0):
+    """
+    比较两次执行的测试结果
+    @param old_root: 上次执行的结果树的根节点
+    @param new_root: 本次执行的结果树的根节点
+    @param duration_threshold: 执行时间增加超过该比例时记为变长
+    @param min_duration_delta: 执行时间增加的最小秒数, 避免很短的测试用例的波动
+    @return: ResultDiff实例
+    """
+    rv = ResultDiff()
+    old_cases = index_cases(old_root)
+    new_cases = index_cases(new_root)
+
+    for key, new_case in new_cases.items():
+        new_duration = getattr(new_case, "duration", None)
+        old_case = old_cases.get(key)
+        if old_case is None:
+            rv.added.append(CaseChange(key, None, new_case.status, new_duration=new_duration))
+            continue
+        old_duration = getattr(old_case, "duration", None)
+        change = CaseChange(key, old_case.status, new_case.status, old_duration, new_duration)
+
+        # 状态
+        was_failed, is_failed = old_case.status in _FAILED, new_case.status in _FAILED
+        if is_failed and not was_failed:
+            rv.newly_failing.append(change)
+        elif was_failed and not is_failed:
+            rv.newly_passing.append(change)
+        elif old_case.status != new_case.status:
+            rv.status_changed.append(change)
+
+        # 执行时间
+        if old_duration is not None and new_duration is not None and \
+                new_duration - old_duration >= min_duration_delta and \
+                new_duration > old_duration * (1 + duration_threshold):
+            rv.duration_regressions.append(change)
+
+        # 步骤
+        old_steps, new_steps = index_steps(old_case), index_steps(new_case)
+        for path, status in new_steps.items():
+            old_status = old_steps.get(path)
+            if old_status is None:
+                change.steps_added.append(path)
+            elif old_status != status:
+                change.steps_changed.append((path, old_status, status))
+        change.steps_removed.extend(path for path in old_steps if path not in new_steps)
+        if change.steps_added or change.steps_removed or change.steps_changed:
+            rv.step_changes.append(change)
+
+    for key, old_case in old_cases.items():
+        if key not in new_cases:
+            rv.removed.append(CaseChange(key, old_case.status, None, old_duration=getattr(old_case, "duration", None)))
+    return rv
@@ -0,0 +1,221 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/28 0028 15:40
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: eventlog.py
+
+"""
+    测试结果的事件日志: 将测试报告的每一次修改追加写入二进制文件, 可以据此重建结果树
+"""
+
+# =====================================
+# 记录格式
+#   文件以MAGIC开头, 之后是连续的记录, 每条记录为固定长度的头部加上两段utf-8文本:
+#       操作(B) 序号(I) 父节点序号(I) 节点类型(H) 节点状态(B) 时间戳纳秒(q) 标题长度(I) 内容长度(I)
+#   1. NODE: 新建节点, 序号在一次会话中从1开始递增, 父节点序号为0表示新的根节点(fork产生的测试报告)
+#   2. END: 测试用例、测试列表或步骤集合结束, 用于外部工具显示进度和计算测试用例的执行时间
+#   3. MERGE: 将序号节点(fork产生的根节点)的全部子节点移动到父节点下
+#   4. ATTACH: 将内容中的结果子树(ResultNode.to_dict的json)挂载到父节点下
+#   5. SESSION: 每次打开日志时写入, 继续执行(resume)时序号重新开始
+#
+# 写入
+#   每条记录一次write系统调用写入, 进程崩溃时最多丢失正在写入的一条记录, 读取时忽略不完整的记录
+#   只有可能继续添加子节点的节点(根节点, 测试列表, 测试用例, 步骤集合)需要记住序号,
+#   测试用例结束时释放, 因此长时间运行时占用的内存不随步骤数量增长
+#
+# 读取
+#   1. iter_records从文件对象的当前位置读取完整的记录, 外部工具可以反复调用来跟踪正在执行的测试
+#   2. replay按记录重建最后一次会话的结果树, 节点状态的传递与执行时相同
+# =====================================
+import json
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from core.tool.file_tool import FileTool
+
+MAGIC = b"ATEVLOG1"
+
+OP_NODE = 1
+OP_END = 2
+OP_MERGE = 3
+OP_ATTACH = 4
+OP_SESSION = 5
+
+_RECORD = struct.Struct("<BIIHBqII")
+
+EventRecord = namedtuple("EventRecord", ["op", "seq", "parent", "node_type", "status", "timestamp_ns",
+                                         "header", "message"])
+
+
+class EventLog:
+    """
+    事件日志的写入端, 多个线程(以及fork产生的测试报告)共享同一个实例
+    """
+    file_name = "events.log"
+
+    def __init__(self, filename):
+        """
+        @param filename: 日志文件路径, 已经存在时在末尾追加新的会话
+        """
+        FileTool.check_and_create_directory(filename)
+        self.filename = filename
+        self._file = open(filename, mode="ab", buffering=0)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._open_nodes = dict()  # id(节点) -> (序号, 节点), 持有节点的引用, 避免id被重用
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._write(OP_SESSION, 0, 0, 0, 0, "", "")
+
+    def _write(self, op, seq, parent, node_type, status, header, message, timestamp_ns=None):
+        if self._file.closed:  # 日志关闭后后台线程的写入被忽略
+            return
+        header_bytes = header.encode("utf-8")
+        message_bytes = message.encode("utf-8")
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        self._file.write(_RECORD.pack(op, seq, parent, node_type, status, timestamp_ns,
+                                      len(header_bytes), len(message_bytes)) + header_bytes + message_bytes)
+
+    def _seq_of(self, node):
+        """
+        @return: 节点或其最近的仍然打开的祖先节点的序号
+            测试用例结束后, 后台线程(例如超时的阶段)仍可能继续写入, 这些记录挂在仍然打开的祖先节点下
+        """
+        while node is not None:
+            entry = self._open_nodes.get(id(node))
+            if entry is not None:
+                return entry[0]
+            node = node.parent
+        return 0
+
+    def add_node(self, node, is_open=False):
+        """
+        记录新建的节点
+        @param node: 已经加入父节点的ResultNode, 没有父节点时表示新的根节点
+        @param is_open: 之后是否还会在该节点下添加子节点
+        """
+        with self._lock:
+            self._seq += 1
+            parent = self._seq_of(node.parent)
+            if is_open:
+                self._open_nodes[id(node)] = (self._seq, node)
+            self._write(OP_NODE, self._seq, parent, int(node.type), int(node.status), str(node.header),
+                        str(node.message), node.timestamp_ns)
+
+    def end_node(self, node):
+        """
+        记录节点结束, 释放该节点以及其下仍然打开的节点
+        """
+        with self._lock:
+            entry = self._open_nodes.get(id(node))
+            if entry is None:
+                return
+            self._write(OP_END, entry[0], 0, int(node.type), int(node.status), "", "")
+            for key, (_, open_node) in list(self._open_nodes.items()):
+                current = open_node
+                while current is not None and current is not node:
+                    current = current.parent
+                if current is node:
+                    del self._open_nodes[key]
+
+    def merge(self, source, target):
+        """
+        记录将source的全部子节点移动到target下
+        """
+        with self._lock:
+            entry = self._open_nodes.pop(id(source), None)
+            if entry is not None:
+                self._write(OP_MERGE, entry[0], self._seq_of(target), 0, 0, "", "")
+
+    def attach(self, node, target):
+        """
+        记录将一个在日志之外生成的结果子树挂载到target下
+        """
+        message = json.dumps(node.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._write(OP_ATTACH, 0, self._seq_of(target), int(node.type), int(node.status), "", message)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._open_nodes.clear()
+
+
+def iter_records(file):
+    """
+    从文件对象的当前位置读取完整的记录, 遇到不完整的记录时停在该记录的开头
+    @param file: 以二进制方式打开的日志文件, 位于文件开头时先校验MAGIC
+    """
+    if file.tell() == 0:
+        magic = file.read(len(MAGIC))
+        if len(magic) < len(MAGIC):
+            file.seek(0)
+            return
+        if magic != MAGIC:
+            raise ValueError(f"不是测试结果的事件日志: {getattr(file, 'name', file)}")
+    while True:
+        start = file.tell()
+        head = file.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            file.seek(start)
+            return
+        op, seq, parent, node_type, status, timestamp_ns, header_len, message_len = _RECORD.unpack(head)
+        body = file.read(header_len + message_len)
+        if len(body) < header_len + message_len:
+            file.seek(start)
+            return
+        yield EventRecord(op, seq, parent, node_type, status, timestamp_ns,
+                          body[:header_len].decode("utf-8"), body[header_len:].decode("utf-8"))
+
+
+def replay(filename):
+    """
+    根据事件日志重建最后一次会话的结果树
+    @return: 主测试报告的根节点, 日志为空时返回None
+    """
+    from core.result.reporter import ResultNode, ListNode, CaseNode, NodeType, StepResult
+
+    nodes = dict()
+    root = None
+    with open(filename, mode="rb") as file:
+        for record in iter_records(file):
+            if record.op == OP_SESSION:
+                nodes = dict()
+                root = None
+            elif record.op == OP_NODE:
+                node_type = NodeType(record.node_type)
+                if node_type == NodeType.TestList or record.parent == 0:
+                    node_class = ListNode
+                elif node_type == NodeType.Case:
+                    node_class = CaseNode
+                else:
+                    node_class = ResultNode
+                parent = nodes.get(record.parent)
+                if parent is None:
+                    node = node_class(record.header, message=record.message, status=StepResult(record.status),
+                                      node_type=node_type)
+                    if root is None:
+                        root = node  # 第一个根节点是主测试报告的根节点
+                else:
+                    node = parent.add_child(record.header, StepResult(record.status), record.message, node_type,
+                                            node_class=node_class)
+                node.timestamp_ns = record.timestamp_ns
+                nodes[record.seq] = node
+            elif record.op == OP_END:
+                node = nodes.get(record.seq)
+                if isinstance(node, CaseNode):
+                    node.end(record.timestamp_ns)
+            elif record.op == OP_MERGE:
+                source, target = nodes.pop(record.seq, None), nodes.get(record.parent)
+                if source is not None and target is not None:
+                    for child in source.detach_children():
+                        target.append_child(child)
+            elif record.op == OP_ATTACH:
+                target = nodes.get(record.parent)
+                if target is not None:
+                    target.append_child(ResultNode.from_dict(json.loads(record.message)))
+    return root
@@ -0,0 +1,194 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/30 0030 20:47
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: jsonlog.py
+
+"""
+    结构化日志: 将所有注册的日志以json lines格式写入一个文件, 并生成按测试用例和步骤查找的偏移索引
+"""
+
+# =====================================
+# 文件
+#   logs.jsonl: 每行一条日志记录
+#       {"ts": 墙上时间(秒), "mono": 单调时钟(纳秒), "logger": 日志名称, "level": 等级, "thread": 线程,
+#        "case": 测试用例名称, "step": 从测试用例开始的步骤路径, "msg": 内容}
+#   logs.jsonl.keys: 每行一个json数组[测试用例名称, 步骤路径], 行号(从0开始)为键的序号
+#   logs.jsonl.idx: 固定长度的索引记录, 每条表示一段连续的、属于同一个键的日志行
+#       键序号(I) 长度(I) 偏移(Q) 最早的单调时钟(q) 最晚的单调时钟(q)
+#
+# 写入
+#   1. 测试用例名称和步骤路径来自记录日志的线程的log_context(ResultReporter的最近节点)
+#   2. 相同键的连续日志行合并为一条索引记录, 键变化或关闭时写出, 因此索引不包含最后一段正在写入的日志
+#
+# 读取
+#   read_logs通过mmap读取索引, 只解析与测试用例、步骤和时间范围相符的日志片段, 不扫描整个日志文件
+# =====================================
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from core.tool.file_tool import FileTool
+
+_INDEX = struct.Struct("<IIQqq")
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+_exception_formatter = logging.Formatter()
+_MISSING = object()
+
+
+class _LogContext(threading.local):
+    """
+    线程独立的日志上下文
+    """
+    node = None  # 当前线程正在记录的结果节点, 由ResultReporter设置
+
+
+log_context = _LogContext()
+
+
+def capture_context(record):
+    """
+    在记录日志的线程中保存上下文, 日志记录由其他线程输出时使用
+    """
+    record.log_node = log_context.node
+    record.mono_ns = time.monotonic_ns()
+
+
+class JsonLinesHandler(logging.Handler):
+    """
+    json lines格式的日志输出句柄
+    """
+    file_name = "logs.jsonl"
+
+    def __init__(self, filename):
+        """
+        @param filename: 日志文件路径, 已经存在时清空; 索引文件为filename.keys和filename.idx
+        """
+        super().__init__()
+        FileTool.check_and_create_directory(filename)
+        self.filename = filename
+        self._file = open(filename, mode="wb")
+        self._key_file = open(filename + ".keys", mode="w", encoding="utf-8")
+        self._index_file = open(filename + ".idx", mode="wb")
+        self._keys = dict()  # (测试用例名称, 步骤路径) -> 键的序号
+        self._offset = 0
+        self._run = None  # 正在写入的一段日志: [键序号, 长度, 偏移, 最早的单调时钟, 最晚的单调时钟]
+
+    def _key_id(self, key):
+        key_id = self._keys.get(key)
+        if key_id is None:
+            key_id = self._keys[key] = len(self._keys)
+            self._key_file.write(_encode(key) + "\n")
+        return key_id
+
+    def _write_run(self):
+        if self._run is not None:
+            self._index_file.write(_INDEX.pack(*self._run))
+            self._run = None
+
+    def write(self, record):
+        """
+        写入但不刷新
+        """
+        if self._file.closed:
+            return
+        node = getattr(record, "log_node", _MISSING)
+        if node is _MISSING:
+            node, mono_ns = log_context.node, time.monotonic_ns()
+        else:
+            mono_ns = record.mono_ns
+        case, step = node.get_case_path() if node is not None else (None, "")
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        line = (_encode({"ts": record.created, "mono": mono_ns, "logger": record.name, "level": record.levelname,
+                         "thread": record.thread, "case": case, "step": step, "msg": message}) + "\n").encode("utf-8")
+
+        key_id = self._key_id((case, step))
+        run = self._run
+        if run is not None and run[0] == key_id:
+            run[1] += len(line)
+            run[3] = min(run[3], mono_ns)
+            run[4] = max(run[4], mono_ns)
+        else:
+            self._write_run()
+            self._run = [key_id, len(line), self._offset, mono_ns, mono_ns]
+        self._file.write(line)
+        self._offset += len(line)
+
+    def emit(self, record):
+        try:
+            self.write(record)
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """
+        先写出日志, 再写出键和索引, 读取时索引记录不会超出日志文件
+        """
+        self.acquire()
+        try:
+            if not self._file.closed:
+                self._file.flush()
+                self._key_file.flush()
+                self._index_file.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if not self._file.closed:
+                self._write_run()
+                self._file.close()
+                self._key_file.close()
+                self._index_file.close()
+        finally:
+            self.release()
+        super().close()
+
+
+def read_logs(filename, case=None, step=None, start=None, end=None):
+    """
+    按测试用例、步骤和时间范围读取结构化日志
+    @param filename: 日志文件路径(logs.jsonl)
+    @param case: 测试用例名称, 为None时不限
+    @param step: 步骤路径, 包含其下的子步骤, 为None时不限
+    @param start: 单调时钟(纳秒)的开始, 与日志记录的mono字段相同, 为None时不限
+    @param end: 单调时钟(纳秒)的结束, 为None时不限
+    @return: 生成器, 按写入顺序产生日志记录(dict)
+    """
+    with open(filename + ".keys", encoding="utf-8") as file:
+        keys = [json.loads(line) for line in file if line.endswith("\n")]
+    wanted = {key_id for key_id, (key_case, key_step) in enumerate(keys)
+              if (case is None or key_case == case) and
+              (step is None or key_step == step or key_step.startswith(step + "/"))}
+    if not wanted:
+        return
+
+    with open(filename, mode="rb") as data_file, open(filename + ".idx", mode="rb") as index_file:
+        data_size = os.fstat(data_file.fileno()).st_size
+        index_size = os.fstat(index_file.fileno()).st_size
+        index_size -= index_size % _INDEX.size  # 忽略正在写入的不完整的索引记录
+        if data_size == 0 or index_size == 0:
+            return
+        with mmap.mmap(index_file.fileno(), index_size, access=mmap.ACCESS_READ) as index, \
+                mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for key_id, length, offset, first_ns, last_ns in _INDEX.iter_unpack(index):
+                if key_id not in wanted or offset + length > data_size:
+                    continue
+                if (start is not None and last_ns < start) or (end is not None and first_ns > end):
+                    continue
+                for line in data[offset:offset + length].splitlines():
+                    record = json.loads(line)
+                    if (start is not None and record["mono"] < start) or (end is not None and record["mono"] > end):
+                        continue
+                    yield record
@@ -5,11 +5,18 @@
 # @Email: 2827709585@qq.com
 # @File: logger.py
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import threading
 import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
+from core.result.jsonlog import JsonLinesHandler, capture_context
 from core.tool.file_tool import FileTool
 
 """ 
@@ -34,11 +41,341 @@ logger_level = {
 }
 
 
+# =====================================
+# 测试用例日志文件
+#   1. 测试用例日志以及各模块输出到测试用例目录的日志(for_test)都通过_CaseFiles写入,
+#      注册时只记录文件路径, 第一次写入时才创建目录和打开文件, 注册测试用例日志不需要系统调用
+#   2. _CaseFiles按最近使用的顺序最多保持max_open个打开的文件, 超出时关闭最久没有写入的文件,
+#      之后再写入时以追加方式重新打开
+#   3. 同一个测试列表中并行执行的测试用例共用目录, 模块日志文件按注册次数计数,
+#      第一次注册时才清空, 最后一个使用者释放时才关闭
+#   4. 每个for_test模块只挂载一个_CaseFileHandler, 同时输出到所有正在执行的测试用例的目录;
+#      模块的case_targets按测试用例日志名称记录输出的文件, 测试用例注册和注销时只增删自己的条目,
+#      然后替换为新的句柄, 句柄本身不持有文件
+# =====================================
+class _CaseFiles:
+    """
+    测试用例日志文件的注册表, 所有测试用例日志文件通过同一个实例写入
+    """
+    max_open = 64  # 同时打开的文件数量上限
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = OrderedDict()  # 文件路径 -> 打开的文件对象, 按最近使用的顺序
+        self._truncate = set()  # 已经注册但还没有打开过, 第一次打开时需要清空的文件
+        self._refs = dict()  # 文件路径 -> 注册的次数
+
+    def register(self, filename, mode="w"):
+        """
+        @param mode: w-第一次写入时清空文件, a-追加; 文件已经被其他测试用例使用时总是追加
+        """
+        with self._lock:
+            count = self._refs.get(filename, 0)
+            self._refs[filename] = count + 1
+            if count == 0 and mode == "w":
+                self._truncate.add(filename)
+
+    def _get(self, filename):
+        file = self._files.get(filename)
+        if file is not None:
+            self._files.move_to_end(filename)
+            return file
+        if len(self._files) >= self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        mode = "w" if filename in self._truncate else "a"
+        try:
+            file = open(filename, mode)
+        except FileNotFoundError:
+            # 测试用例目录在第一次写入时才创建
+            FileTool.check_and_create_directory(filename)
+            file = open(filename, mode)
+        self._truncate.discard(filename)
+        self._files[filename] = file
+        return file
+
+    def write(self, filenames, text):
+        with self._lock:
+            for filename in filenames:
+                self._get(filename).write(text)
+
+    def flush(self, filenames):
+        with self._lock:
+            for filename in filenames:
+                file = self._files.get(filename)
+                if file is not None:
+                    file.flush()
+
+    def release(self, filenames):
+        """
+        释放一次注册, 最后一个使用者释放时关闭文件, 之后再写入时以追加方式重新打开
+        """
+        with self._lock:
+            for filename in filenames:
+                count = self._refs.pop(filename, 1) - 1
+                if count > 0:
+                    self._refs[filename] = count
+                    continue
+                self._truncate.discard(filename)
+                file = self._files.pop(filename, None)
+                if file is not None:
+                    file.close()
+
+    def in_use(self, dir_path):
+        """
+        @return: 目录dir_path(包括子目录)中是否有还没有释放的日志文件
+        """
+        with self._lock:
+            return any(_is_under(filename, dir_path) for filename in self._refs)
+
+
+class _CaseFileHandler(logging.Handler):
+    """
+    通过_CaseFiles同时写入一个或多个测试用例日志文件
+    """
+    terminator = "\n"
+
+    def __init__(self, case_files, filenames, formatter):
+        super().__init__()
+        self.case_files = case_files
+        self.filenames = filenames  # 不可变的文件路径元组
+        self.setFormatter(formatter)
+
+    def write(self, record):
+        """
+        写入但不刷新
+        """
+        self.case_files.write(self.filenames, self.format(record) + self.terminator)
+
+    def emit(self, record):
+        try:
+            self.write(record)
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.case_files.flush(self.filenames)
+
+
+# =====================================
+# 队列模式
+#   1. 每个注册的logger只挂载一个_QueueHandler, 测试线程记录日志时只合并消息参数并保存日志上下文, 然后放入队列
+#   2. 日志记录连同所属logger当时的输出句柄(文件, 控制台, 测试用例目录)一起入队,
+#      因此测试用例结束前记录的日志仍然输出到该测试用例的目录
+#   3. _LogListener线程批量取出记录, 格式化后写入, 每批记录每个文件只刷新一次
+#   4. flush等待此前入队的记录全部写入, 测试用例的日志注销(打包)前调用
+# =====================================
+_exception_formatter = logging.Formatter()
+_DIRECT_HANDLERS = (logging.FileHandler, logging.StreamHandler, _CaseFileHandler, JsonLinesHandler)  # 监听线程直接写入, 批量刷新的句柄类型
+_BUFFERED_HANDLERS = (_CaseFileHandler, JsonLinesHandler)  # 提供write方法, 只写入不刷新
+
+
+def _freeze_record(record):
+    """
+    合并日志记录的消息参数和异常信息, 避免参数对象在输出前被修改, 也不再持有异常的调用栈
+    """
+    if record.args:
+        record.msg = record.getMessage()
+        record.args = None
+    if record.exc_info:
+        if not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+    return record
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    将日志记录连同所属logger的输出句柄放入队列
+    """
+
+    def __init__(self, log_queue, handlers):
+        """
+        @param handlers: 所属logger的输出句柄列表, 与LoggerManager.logger_info共享
+        """
+        super().__init__(log_queue)
+        self.handlers = handlers
+
+    def prepare(self, record):
+        # 只合并消息参数和异常信息, 格式化由监听线程完成
+        capture_context(record)
+        return _freeze_record(record)
+
+    def enqueue(self, record):
+        self.queue.put_nowait((tuple(self.handlers), record))
+
+
+class _LogListener:
+    """
+    日志输出线程
+    """
+    batch_size = 500  # 一批最多处理的记录数
+
+    def __init__(self, log_queue):
+        self.queue = log_queue
+        self._thread = threading.Thread(target=self.__monitor, name="LogListener", daemon=True)
+        self._thread.start()
+
+    def __monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self.__handle(batch):
+                return
+
+    @staticmethod
+    def __handle(batch):
+        """
+        @return: 是否收到了停止标志(None)
+        """
+        written = set()
+        events = list()
+        stop = False
+        for item in batch:
+            if item is None:
+                stop = True
+                continue
+            if isinstance(item, threading.Event):
+                events.append(item)
+                continue
+            handlers, record = item
+            for handler in handlers:
+                if record.levelno < handler.level or not handler.filter(record):
+                    continue
+                if type(handler) in _DIRECT_HANDLERS:
+                    # 只写入不刷新, 一批记录写完后统一刷新
+                    handler.acquire()
+                    try:
+                        if type(handler) in _BUFFERED_HANDLERS:
+                            handler.write(record)
+                        else:
+                            handler.stream.write(handler.format(record) + handler.terminator)
+                        written.add(handler)
+                    except Exception:
+                        handler.handleError(record)
+                    finally:
+                        handler.release()
+                else:
+                    handler.handle(record)
+        for handler in written:
+            handler.flush()
+        for event in events:
+            event.set()
+        return stop
+
+    def flush(self):
+        """
+        等待此前入队的记录全部写入
+        """
+        event = threading.Event()
+        self.queue.put(event)
+        event.wait()
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+
+
+# =====================================
+# 环形缓冲区
+#   1. 注册测试用例日志时指定ring_buffer=N, logger的等级降为DEBUG, 只挂载一个_RingBufferHandler
+#   2. 达到注册等级的记录直接转发给原来的输出句柄(队列模式下转发给队列句柄);
+#      _RingBufferHandler只在内存中保留最近的N条低于注册等级的记录, 因此DEBUG记录不产生文件写入, 也不进入队列
+#   3. 注销时指定dump=True(测试用例执行失败), 才将缓冲区中的记录追加到测试用例日志, 不会重复已经输出的记录
+# =====================================
+class _RingBufferHandler(logging.Handler):
+    """
+    在内存中保留最近的低于输出等级的日志记录, 达到输出等级的记录转发给targets
+    """
+
+    def __init__(self, capacity, output_level, targets):
+        """
+        @param capacity: 保留的记录数量
+        @param output_level: 转发的最低等级
+        @param targets: 转发的输出句柄列表
+        """
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+        self.output_level = logger_level.get(output_level, output_level)
+        self.targets = targets
+
+    def handle(self, record):
+        if record.levelno < self.output_level:
+            # deque的追加是线程安全的, 不使用句柄的锁
+            self.records.append(_freeze_record(record))
+            return True
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+        return True
+
+    def emit(self, record):
+        pass
+
+    def dump(self, formatter):
+        """
+        @return: 缓冲区中的记录格式化后的文本, 并清空缓冲区
+        """
+        records = list(self.records)
+        self.records.clear()
+        lines = [f"======== 最近的{len(records)}条未输出的日志(低于{logging.getLevelName(self.output_level)}) ========"]
+        lines.extend(formatter.format(record) for record in records)
+        lines.append("=" * 40)
+        return "\n".join(lines) + "\n"
+
+
+# =====================================
+# 日志压缩
+#   1. 注销时在后台线程中压缩日志目录, 压缩包和校验文件以_ARCHIVE_PREFIX开头, 之后的压缩不再包含它们
+#   2. 压缩会删除目录中的文件, 因此目录(包括子目录)中还有注册的logger或者没有释放的测试用例日志文件时
+#      (例如同一个测试列表中并行执行的其他测试用例), 推迟到它们全部注销后再压缩
+#   3. 同一个目录树(相同目录, 子目录或父目录)的压缩按提交的顺序依次执行, 不会同时压缩和删除相同的文件;
+#      线程池按提交的顺序开始任务, 等待的任务一定已经开始, 因此不会死锁
+# =====================================
+_ARCHIVE_PREFIX = "achieved_logs_"
+
+
+def _is_same_tree(path, other):
+    """
+    判断两个目录是否相同或者一个是另一个的子目录
+    """
+    path, other = os.path.abspath(path), os.path.abspath(other)
+    return os.path.commonpath([path, other]) in (path, other)
+
+
+def _is_under(path, dir_path):
+    """
+    判断path是否是dir_path或者在dir_path之下
+    """
+    path, dir_path = os.path.abspath(path), os.path.abspath(dir_path)
+    return os.path.commonpath([path, dir_path]) == dir_path
+
+
 class LoggerManager:
+    archive_workers = 2  # 同时压缩日志的线程数
+    archive_compression = zipfile.ZIP_DEFLATED  # 压缩方式, ZIP_LZMA的压缩包更小, 但很多解压工具无法打开
 
     def __init__(self):
         # 用于记录logger的配置信息
         self.logger_info = {}
+        # 测试用例并行执行时, 多个线程会同时注册和删除logger
+        self._lock = threading.RLock()
+        # 队列模式下的日志队列和输出线程
+        self._queue = None
+        self._listener = None
+        # 测试用例日志文件的注册表
+        self._case_files = _CaseFiles()
+        # 后台压缩日志的线程池和还没有完成的压缩任务
+        self._archiver = None
+        self._archives = dict()  # 压缩任务 -> 压缩的目录
+        self._pending_archives = list()  # 还有日志在使用, 推迟压缩的目录
+        # 所有注册的logger共享的结构化日志输出句柄
+        self._json_handler = None
 
     def register(self, logger_name, filename=None, console=True,
                  default_level=logging.INFO, **kwargs):
@@ -56,10 +393,15 @@ class LoggerManager:
                             mode:日志文件产生模式
                             for_test: 表示注册的模块需要在测试用例执行期间同时向测试用例所在的日志目录输出日志信息
                             is_test: 表示该日志是一个测试用例日志
+                            ring_buffer: 测试用例日志在内存中保留最近的N条日志(包括DEBUG), 注销时指定dump才写入日志文件
                         }
         @return:
         """
 
+        with self._lock:
+            return self._register(logger_name, filename, console, default_level, **kwargs)
+
+    def _register(self, logger_name, filename, console, default_level, **kwargs):
         # 基本参数设置
         file_size_limit = kwargs.get("size_limit", 1024 * 1024)  # 单个文件大小，默认一个文件大小为1M
         max_files = kwargs.get("max_files", None)  # 最大文件数
@@ -76,13 +418,23 @@ class LoggerManager:
 
         # 获取新的logger实例
         logger_handle = logging.getLogger(logger_name)
-        self.logger_info[logger_name] = {'timestamp': time.localtime(),
-                                         'for_test': for_test,
-                                         'is_test': is_test}
+        info = {'timestamp': time.localtime(),
+                'for_test': for_test,
+                'is_test': is_test,
+                'handlers': list(),  # 注册时添加的输出句柄, 队列模式下由监听线程调用
+                'logger': logger_handle}  # 日志的实例化对象
+        self.logger_info[logger_name] = info
+
+        # 测试用例日志的环形缓冲区, 转发给之后添加的输出句柄
+        ring_size = kwargs.get("ring_buffer", 0)  # 环形缓冲区保留的记录数量
+        if ring_size and is_test and filename:
+            info['ring_buffer'] = _RingBufferHandler(ring_size, default_level, info['handlers'])
+            logger_handle.addHandler(info['ring_buffer'])
 
         # 指定了存放日志的文件路径
         if filename:
-            FileTool.check_and_create_directory(filename)
+            if not is_test or max_files:
+                FileTool.check_and_create_directory(filename)
             self.logger_info[logger_name].update({
                 'file_path': os.path.dirname(filename),
                 'file_name': os.path.basename(filename),
@@ -90,67 +442,245 @@ class LoggerManager:
             })
 
             # 日志文件句柄的定义
+            formatter = logging.Formatter(fmt=log_format)
+            info['formatter'] = formatter
             if max_files:
                 file_handler = logging.handlers.RotatingFileHandler(
                     filename=filename,
                     mode=file_mode,
                     maxBytes=file_size_limit,  # 将文件按照最大大小进行分割
                     backupCount=max_files)  # 实现日志文件自动备份
+                file_handler.setFormatter(formatter)
+            elif is_test:
+                # 测试用例日志由注册表写入, 注销时关闭
+                self._case_files.register(filename, file_mode)
+                file_handler = _CaseFileHandler(self._case_files, (filename,), formatter)
             else:
                 file_handler = logging.FileHandler(filename, mode=file_mode)  # 按照指定格式，获取日志文件流句柄
-            file_handler.setFormatter(logging.Formatter(fmt=log_format))
-            logger_handle.addHandler(file_handler)
+                file_handler.setFormatter(formatter)
+            self._add_handler(info, file_handler)
 
             # 是否需要输出到测试用例日志所在的目录
             if is_test:
+                info['case_files'] = {logger_name: filename}  # 日志名称 -> 该测试用例目录中的日志文件
                 for l_logger, l_value in self.logger_info.items():
                     # 需要是一个注册了日志文件的模块才能向测试用例输出日志
                     if l_value['for_test'] and "file_name" in l_value:
                         logger_filename = os.path.join(
                             os.path.dirname(filename), f"{l_logger}.log")
-                        # 为该日志添加一个新的FileHandler，输出该模块的日志到测试用例日志所在的目录
-                        case_handler = logging.FileHandler(logger_filename, mode="w")
-                        case_handler.setFormatter(logging.Formatter(fmt=log_format))
-                        l_value['case_handler'] = case_handler
-                        l_value['logger'].addHandler(case_handler)
+                        self._case_files.register(logger_filename)
+                        info['case_files'][l_logger] = logger_filename
+                        # 该模块的日志同时输出到该测试用例的目录, 每个测试用例一个条目, 注销时只删除自己的条目
+                        l_value.setdefault('case_targets', {})[logger_name] = logger_filename
+                        self._update_case_handler(l_value)
 
         # 指定了需要同步输出控制台
         if console:
             stream_handler = logging.StreamHandler()
             stream_handler.setFormatter(logging.Formatter(fmt=log_format))
-            logger_handle.addHandler(stream_handler)
+            self._add_handler(info, stream_handler)
 
-        logger_handle.setLevel(default_level)  # 设置日志等级
-        self.logger_info[logger_name]['logger'] = logger_handle  # 设置日志的实例化对象
+        if self._json_handler is not None:
+            self._add_handler(info, self._json_handler)
+        if self._queue is not None:
+            self._attach_queue(info)
+        logger_handle.setLevel(logging.DEBUG if 'ring_buffer' in info else default_level)  # 设置日志等级
         return logger_handle
 
-    def unregister(self, logger_name):
+    def _add_handler(self, info, handler):
+        info['handlers'].append(handler)
+        if self._queue is None and 'ring_buffer' not in info:  # 有环形缓冲区时由其转发
+            info['logger'].addHandler(handler)
+
+    def _remove_handler(self, info, handler):
+        info['handlers'].remove(handler)
+        if self._queue is None and 'ring_buffer' not in info:
+            info['logger'].removeHandler(handler)
+
+    def _update_case_handler(self, info):
+        """
+        将模块输出到测试用例目录的句柄替换为输出到所有正在执行的测试用例目录(case_targets)的新句柄
+            队列模式下已经入队的日志记录仍然使用原来的句柄, 因此注销前记录的日志不会丢失
+        """
+        filenames = tuple(dict.fromkeys(info.get('case_targets', {}).values()))  # 共用目录的测试用例只写入一次
+        case_handler = info.pop('case_handler', None)
+        if case_handler is not None:
+            self._remove_handler(info, case_handler)
+        if filenames:
+            info['case_handler'] = _CaseFileHandler(self._case_files, filenames, info['formatter'])
+            self._add_handler(info, info['case_handler'])
+
+    def _attach_queue(self, info):
+        """
+        将logger的输出句柄替换为队列句柄
+        """
+        for handler in info['handlers']:
+            info['logger'].removeHandler(handler)
+        info['queue_handler'] = _QueueHandler(self._queue, info['handlers'])
+        if 'ring_buffer' in info:
+            info['ring_buffer'].targets = [info['queue_handler']]
+        else:
+            info['logger'].addHandler(info['queue_handler'])
+
+    def start_queue(self):
+        """
+        切换到队列模式: 已经注册和之后注册的logger都只向队列放入日志记录, 由单独的线程输出
+        """
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.SimpleQueue()
+            self._listener = _LogListener(self._queue)
+            for info in self.logger_info.values():
+                self._attach_queue(info)
+            atexit.register(self.stop_queue)
+
+    def stop_queue(self):
+        """
+        恢复为直接输出, 并等待队列中的日志记录全部写入
+        """
+        with self._lock:
+            if self._queue is None:
+                return
+            for info in self.logger_info.values():
+                info['logger'].removeHandler(info.pop('queue_handler'))
+                if 'ring_buffer' in info:
+                    info['ring_buffer'].targets = info['handlers']
+                    continue
+                for handler in info['handlers']:
+                    info['logger'].addHandler(handler)
+            self._listener.stop()
+            self._queue = None
+            self._listener = None
+            atexit.unregister(self.stop_queue)
+
+    def start_json_log(self, filename):
+        """
+        开始将已经注册和之后注册的logger的日志同时写入结构化日志文件(json lines), 已经开始时先结束原来的文件
+        """
+        with self._lock:
+            self.stop_json_log()
+            self._json_handler = JsonLinesHandler(filename)
+            for info in self.logger_info.values():
+                self._add_handler(info, self._json_handler)
+
+    def stop_json_log(self):
+        """
+        结束结构化日志, 写出索引并关闭文件
+        """
+        with self._lock:
+            handler = self._json_handler
+            if handler is None:
+                return
+            for info in self.logger_info.values():
+                if handler in info['handlers']:
+                    self._remove_handler(info, handler)
+            self._json_handler = None
+            self.flush()
+            handler.close()
+
+    def flush(self):
+        """
+        等待队列中的日志记录全部写入, 非队列模式下不需要等待
+        """
+        listener = self._listener
+        if listener is not None:
+            listener.flush()
+
+    def unregister(self, logger_name, dump=False):
         """
         删除注册的logger，同时将需要打包的logger文件打包
+        @param dump: 是否将环形缓冲区中的日志写入测试用例日志, 一般在测试用例执行失败时指定
         """
-        logger_dict = logging.Logger.manager.loggerDict
-        if logger_name in logger_dict:
-            # logging对象内移除该对象
-            logger_dict.pop(logger_name)
-            # 如果该日志注册了测试用例的handler，则移除
-            if self.logger_info[logger_name]['is_test']:
-                for _, lvalue in self.logger_info.items():
-                    if 'case_handler' in lvalue:
-                        lvalue['logger'].removeHandler(lvalue['case_handler'])
-                        lvalue.pop("case_handler")  # 删除对应的测试用例句柄的字典信息
-            self._achieve_files(logger_name)  # 将日志压缩,减少体积大小
-            self.logger_info.pop(logger_name)  # 删除相应的logger_name的字典信息
+        with self._lock:
+            logger_dict = logging.Logger.manager.loggerDict
+            if logger_name in logger_dict:
+                # logging对象内移除该对象
+                logger_dict.pop(logger_name)
+                try:
+                    # 如果该日志是测试用例日志，则各模块不再向该测试用例的目录输出
+                    case_files = self.logger_info[logger_name].get('case_files', {})
+                    for l_logger in case_files:
+                        l_value = self.logger_info.get(l_logger)
+                        if l_logger != logger_name and l_value is not None and \
+                                l_value.get('case_targets', {}).pop(logger_name, None) is not None:
+                            self._update_case_handler(l_value)
+                    self.flush()  # 队列模式下等待已经记录的日志写入后再打包
+                    ring = self.logger_info[logger_name].get('ring_buffer')
+                    if ring is not None and dump:
+                        filenames = (case_files[logger_name],)
+                        self._case_files.write(filenames, ring.dump(self.logger_info[logger_name]['formatter']))
+                        self._case_files.flush(filenames)
+                    self._case_files.release(case_files.values())
+                    self._achieve_files(logger_name)  # 将日志压缩,减少体积大小
+                finally:
+                    self.logger_info.pop(logger_name)  # 删除相应的logger_name的字典信息
 
     def _achieve_files(self, logger_name):
-        if self.logger_info[logger_name]['zip']:
-            current = time.localtime()
-            output_file = "achieved_logs_%d_%d_%d_%d_%d_%d.zip" % (
-                current.tm_year, current.tm_mon, current.tm_mday,
-                current.tm_hour, current.tm_min, current.tm_sec
-            )
-            FileTool.zip_directory(
-                self.logger_info[logger_name]['file_path'],
-                os.path.join(self.logger_info[logger_name]['file_path'], output_file))
+        """
+        在后台线程中压缩日志目录, 注销日志不等待压缩完成
+            目录中还有其他日志在使用时推迟压缩, 每次注销时检查推迟的目录是否已经可以压缩
+        """
+        info = self.logger_info[logger_name]
+        if info.get('zip') and info['file_path'] not in self._pending_archives:
+            self._pending_archives.append(info['file_path'])
+        for file_path in list(self._pending_archives):
+            if not self._dir_in_use(file_path, logger_name):
+                self._pending_archives.remove(file_path)
+                self._submit_archive(file_path)
+
+    def _dir_in_use(self, dir_path, exclude):
+        """
+        @param exclude: 正在注销的logger名称
+        @return: 目录(包括子目录)中是否还有注册的logger或者没有释放的测试用例日志文件
+        """
+        for name, info in self.logger_info.items():
+            if name != exclude and 'file_path' in info and _is_under(info['file_path'], dir_path):
+                return True
+        return self._case_files.in_use(dir_path)
+
+    def _submit_archive(self, file_path):
+        current = time.localtime()
+        output_file = _ARCHIVE_PREFIX + "%d_%d_%d_%d_%d_%d.zip" % (
+            current.tm_year, current.tm_mon, current.tm_mday,
+            current.tm_hour, current.tm_min, current.tm_sec
+        )
+        if self._archiver is None:
+            self._archiver = ThreadPoolExecutor(max_workers=self.archive_workers,
+                                                thread_name_prefix="LogArchiver")
+        # 同一目录树中还没有完成的压缩, 完成后才开始本次压缩
+        waits = [future for future, path in self._archives.items() if _is_same_tree(path, file_path)]
+        future = self._archiver.submit(self.__archive, file_path, os.path.join(file_path, output_file), waits,
+                                       self.archive_compression)
+        self._archives[future] = file_path
+        future.add_done_callback(self.__archive_done)
+
+    @staticmethod
+    def __archive(file_path, output_file, waits, compression):
+        for future in waits:
+            future.exception()
+        # 同一秒内压缩同一个目录时, 压缩包的名称加上序号
+        name, ext = os.path.splitext(output_file)
+        index = 1
+        while os.path.exists(output_file):
+            index += 1
+            output_file = f"{name}_{index}{ext}"
+        return FileTool.archive_directory(file_path, output_file, compression, skip_prefix=_ARCHIVE_PREFIX)
+
+    def __archive_done(self, future):
+        with self._lock:
+            self._archives.pop(future, None)
+        if future.exception() is not None:
+            logging.getLogger("LoggerManager").error("日志压缩失败", exc_info=future.exception())
+
+    def wait_archives(self):
+        """
+        等待已经开始的日志压缩全部完成, 推迟的压缩在其目录中的日志全部注销后才开始
+        """
+        with self._lock:
+            archives = list(self._archives)
+        for future in archives:
+            future.exception()
 
     def get_logger(self, logger_name):
         """
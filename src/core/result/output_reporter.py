@@ -1,9 +1,13 @@
+import atexit
 import json
 import logging
 import os
+import threading
 import time
 from enum import Enum
 
+from core.config.setting import static_setting
+
 """ 
     输出测试结果
         1. 使用with语句进行层次处理与异常控制
@@ -27,6 +31,15 @@ class StepEnd(Exception):
         self.result = result
 
 
+# =====================================
+# 结果的缓存
+#   1. 测试用例和步骤节点的结果由子节点的结果汇总得到, 汇总的结果缓存在节点中
+#   2. 节点的结果被设置或者添加子节点时, 该节点及其祖先节点标记为需要重新汇总(dirty),
+#      遇到已经标记的祖先节点时停止
+#   3. update_result只重新汇总标记过的节点, 没有变化的子树直接使用缓存的结果
+#   4. 同一棵树的节点共用一个锁(lock), 添加子节点、设置结果、标记和汇总都在锁内进行,
+#      后台线程读取结果时不会与测试线程的修改交错
+# =====================================
 class NodeEntry:
     """
     代表一般节点，比如测试根节点或测试列表
@@ -49,6 +62,23 @@ class NodeEntry:
         self.children = []
         self.timestamp = time.localtime()
         self.update_action = update_action
+        self.lock = threading.RLock() if parent is None else parent.lock  # 整棵树共用的锁
+        self._dirty = False  # 结果是否需要重新汇总
+
+    def _mark_dirty(self):
+        """
+        标记当前节点及其祖先节点需要重新汇总结果
+        """
+        with self.lock:
+            node = self
+            while node is not None and not node._dirty:
+                node._dirty = True
+                node = node.parent
+
+    def _add_child(self, child):
+        with self.lock:
+            self.children.append(child)
+            self._mark_dirty()
 
     def __str__(self):
         return self.headline + "[" + time.strftime(TIME_FORMAT, self.timestamp) + "]" + os.linesep
@@ -58,7 +88,7 @@ class NodeEntry:
             用于产生新的普通节点
         """
         ret = NodeEntry(headline, parent=self, message=message, update_action=self.update_action)
-        self.children.append(ret)
+        self._add_child(ret)
         if self.update_action is not None:
             self.update_action()
         return ret
@@ -69,7 +99,7 @@ class NodeEntry:
         """
         ret = CaseEntry(headline, parent=self)
         ret.update_action = self.update_action
-        self.children.append(ret)
+        self._add_child(ret)
         if self.update_action is not None:
             self.update_action()
         return ret
@@ -134,7 +164,9 @@ class CaseEntry(NodeEntry):
         if len(head_str) > headline_max:
             head_str = head_str[0: headline_max] + "..."
         space_count = width - indent - len(head_str)
-        ret = (" " * indent) + head_str + ("-" * space_count) + self.result.value.upper()
+        # 后台写入结果文件时, 正在执行的节点还没有结果
+        result = "RUNNING" if self.result is None else self.result.value.upper()
+        ret = (" " * indent) + head_str + ("-" * space_count) + result
         return ret
 
     def start(self, headline, message, prefix=None):
@@ -145,7 +177,7 @@ class CaseEntry(NodeEntry):
         entry.update_action = self.update_action
         if prefix is not None:
             entry.step_prefix = prefix
-        self.children.append(entry)
+        self._add_child(entry)
         if self.update_action is not None:
             self.update_action()
         return entry
@@ -189,10 +221,24 @@ class CaseEntry(NodeEntry):
         super().__init__(headline, parent, message)
         self.result = None
 
+    @property
+    def result(self):
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        """
+        直接设置结果后, 当前节点(有子节点时结果仍由子节点汇总)和祖先节点需要重新汇总
+        """
+        with self.lock:
+            self._result = value
+            self._dirty = False
+            self._mark_dirty()
+
     def get_json(self):
         self.update_result()
         json_obj = super().get_json()
-        json_obj['result'] = self.result.value
+        json_obj['result'] = None if self.result is None else self.result.value
         return json_obj
 
     def get_friend_print(self, indent=0):
@@ -202,6 +248,13 @@ class CaseEntry(NodeEntry):
         return ret
 
     def update_result(self):
+        with self.lock:
+            self._update_result()
+
+    def _update_result(self):
+        if not self._dirty:
+            return
+        self._dirty = False
         if not any(self.children):
             return
         has_error = False
@@ -221,15 +274,20 @@ class CaseEntry(NodeEntry):
                 has_pass = True
 
         if has_block:
-            self.result = ResultType.BLOCK
+            result = ResultType.BLOCK
         elif has_error:
-            self.result = ResultType.ERROR
+            result = ResultType.ERROR
         elif has_failed:
-            self.result = ResultType.FAIL
+            result = ResultType.FAIL
         elif has_pass:
-            self.result = ResultType.PASS
+            result = ResultType.PASS
         else:
-            self.result = ResultType.INFO
+            result = ResultType.INFO
+        # 汇总的结果变化时只需要标记祖先节点, 当前节点已经是最新的
+        if result != self._result:
+            self._result = result
+            if self.parent is not None:
+                self.parent._mark_dirty()
 
 
 class CaseStepEntry(CaseEntry):
@@ -286,12 +344,13 @@ class CaseStepEntry(CaseEntry):
         else:
             entry.step_prefix = self.step_prefix + str(self.step_no) + "-"
 
-        if any(self.children):
-            entry.step_no = self.children[-1].step_no + 1
         entry.update_action = self.update_action
         if self.update_action is not None:
             self.update_action()
-        self.children.append(entry)
+        with self.lock:
+            if any(self.children):
+                entry.step_no = self.children[-1].step_no + 1
+            self._add_child(entry)
         return entry
 
     def get_json(self):
@@ -303,42 +362,125 @@ class CaseStepEntry(CaseEntry):
         return json_obj
 
 
+# =====================================
+# 结果文件的后台写入
+#   1. 节点的每次修改只调用request_update记录一次变化, 不直接写文件
+#   2. 后台线程每隔flush_interval秒, 或者累计flush_changes次变化时, 将结果一次性写入文件
+#   3. 在树的锁内取得结果的快照(json对象和文本), 释放锁之后再写文件, 写文件期间不阻塞测试线程
+#   4. 先写入临时文件再替换, 读取结果文件的外部工具不会读到写了一半的内容
+#   5. close(或进程退出)时写入最后的结果
+# =====================================
 class StepReporter:
     """
     测试结果，用单例实现
     """
     instance = None
-    path = ""
-    json_path = ""
-    txt_path = ""
+    _instance_lock = threading.Lock()
+    flush_interval = 0.5  # 两次写入结果文件的最长间隔(秒)
+    flush_changes = 200  # 累计多少次变化时立即写入
 
     @classmethod
-    def get_instance(cls, logger):
-        cls.path = "/home/emc/"
-        cls.json_path = os.path.join(cls.path, "step_result.json")
-        cls.txt_path = os.path.join(cls.path, "step_result.txt")
-        if cls.instance is None:
-            return StepReporter(logger)
-        else:
+    def get_instance(cls, logger, path=None):
+        """
+        获取单例, 第一次调用时创建
+        @param path: 结果文件的输出目录, 只在创建时使用, 为None时使用测试引擎的日志目录(CaseRunnerSetting.log_path)
+        """
+        with cls._instance_lock:
+            if cls.instance is None:
+                cls.instance = StepReporter(logger, path)
             return cls.instance
 
-    def __init__(self, logger):
+    def __init__(self, logger, path=None):
+        """
+        @param path: 结果文件的输出目录, 为None时使用测试引擎的日志目录(CaseRunnerSetting.log_path)
+        """
         self.logger = logger
+        self.path = path if path is not None else static_setting.settings["CaseRunner"].log_path
+        self.json_path = os.path.join(self.path, "step_result.json")
+        self.txt_path = os.path.join(self.path, "step_result.txt")
         self.case_node = None
-        self.root = NodeEntry(headline="Test Result")
+        self.root = NodeEntry(headline="Test Result", update_action=self.request_update)
 
         self.recent_node = self.root
 
+        self._pending = 0  # 上次写入之后的变化次数
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher = None
+        self._closed = False
+
+    def request_update(self):
+        """
+        记录一次结果的变化, 由后台线程合并写入
+        """
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._pending += 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self.__flush_loop, name="StepReporterFlusher", daemon=True)
+                self._flusher.start()
+                atexit.register(self.close)
+            if self._pending >= self.flush_changes:
+                self._flush_event.set()
+
+    def __flush_loop(self):
+        while not self._closed:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                self.logger.exception(ex)
+
+    def flush(self):
+        """
+        有未写入的变化时立即写入结果文件
+        """
+        with self._pending_lock:
+            if self._pending == 0:
+                return
+            self._pending = 0
+        self.update_file()
+
+    def close(self):
+        """
+        停止后台写入, 并写入最后的结果
+        """
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._flush_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        try:
+            self.flush()
+        except Exception as ex:
+            self.logger.exception(ex)
+
     def update_file(self):
-        with open(self.json_path, "w") as jsonfile:
-            json.dump(self.root.get_json(), jsonfile, indent=4)
-        with open(self.txt_path, "w") as txtfile:
-            txtfile.write(self.root.get_friend_print())
+        """
+        将结果写入json和文本文件, 先写入临时文件再替换
+        """
+        with self._write_lock:
+            with self.root.lock:
+                json_obj = self.root.get_json()
+                text = self.root.get_friend_print()
+            os.makedirs(self.path, exist_ok=True)
+            self._replace_file(self.json_path, lambda file: json.dump(json_obj, file, indent=4))
+            self._replace_file(self.txt_path, lambda file: file.write(text))
+
+    @staticmethod
+    def _replace_file(filename, write):
+        temp_file = filename + ".tmp"
+        with open(temp_file, "w") as file:
+            write(file)
+        os.replace(temp_file, filename)
 
     def start_node(self, headline, message):
-        ret = NodeEntry(headline, parent=self.root, message=message)
-        self.root.children.append(ret)
-        return ret
+        return self.root.start_node(headline, message)
 
     def print(self):
         print(self.root.get_friend_print())
@@ -346,7 +488,7 @@ class StepReporter:
 
 if __name__ == "__main__":
     logger = logging.getLogger("单元测试")
-    rr = StepReporter.get_instance(logger)
+    rr = StepReporter.get_instance(logger, os.getcwd())
     with rr.root.start_node("测试列表") as testlist:
         with testlist.start_case("test_feature_001") as case:
             with case.start(headline="", message="", prefix="SETUP") as step:
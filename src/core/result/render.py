@@ -0,0 +1,216 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/28 0028 10:05
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: render.py
+
+"""
+    测试报告的输出: 将结果树逐行写入文件对象
+"""
+
+# =====================================
+# 流式输出
+#   1. 一次深度优先遍历, 每个节点的内容生成后立即写入文件对象, 不拼接整个报告的字符串,
+#      也不先生成整个结果树的字典
+#   2. 遍历使用子节点迭代器的栈, 占用的内存只与树的深度有关, 与节点数量无关
+#   3. 支持三种格式:
+#       text: 与ResultNode.to_text相同的格式化文本
+#       json: 与ResultNode.to_dict相同的结构, 可以用ResultNode.from_dict重建
+#       junit: JUnit XML, 每个测试列表作为一个testsuite, 供CI系统展示
+# =====================================
+import json
+import os
+from xml.sax.saxutils import escape, quoteattr
+
+from core.result.reporter import NodeType, StepResult, ResultNode
+
+REPORT_FORMATS = ("text", "json", "junit")
+
+
+def _walk(node):
+    """
+    深度优先遍历结果树
+    @return: 生成器, 依次产生("enter", 节点, 深度)和("exit", 节点, 深度)
+    """
+    yield "enter", node, 0
+    stack = [(node, iter(node.children))]
+    while stack:
+        parent, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield "exit", parent, len(stack)
+            continue
+        yield "enter", child, len(stack)
+        stack.append((child, iter(child.children)))
+
+
+def iter_text(node, indent=0):
+    """
+    逐行生成文本格式的测试报告
+    @param node: 结果树的根节点
+    @param indent: 根节点的缩进层次
+    """
+    for event, current, depth in _walk(node):
+        if event != "enter":
+            continue
+        intent = ResultNode._get_intent(indent + depth)
+        line = f"{intent}[{current.timestamp}]"
+        if current.type == NodeType.Case:
+            line += "[TestCase]"
+        if current.type == NodeType.TestList:
+            line += "[TestList]"
+        line += current.header
+        if current.type in [NodeType.Case, NodeType.Step]:
+            line += ResultNode._get_dot_line(line, 120)
+            line += current.status.name
+        yield line + os.linesep
+        if current.message:
+            yield f"{intent}描述: {current.message}{os.linesep}"
+
+
+def write_text(node, file):
+    """
+    将文本格式的测试报告写入文件对象
+    """
+    for line in iter_text(node):
+        file.write(line)
+
+
+_json_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def iter_json(node):
+    """
+    逐段生成JSON格式的测试报告, 结构与ResultNode.to_dict相同
+    """
+    separator = ""  # 兄弟节点之间的逗号
+    for event, current, _ in _walk(node):
+        if event == "enter":
+            message = _json_encode(current.message) if current.message else '""'
+            yield (f'{separator}{{"header": {_json_encode(current.header)}, "status": {int(current.status)}, '
+                   f'"message": {message}, "type": {int(current.type)}, "children": [')
+            separator = ""
+        else:
+            duration = getattr(current, "duration", None)  # 结束的测试用例节点附带执行时间
+            if duration is None:
+                yield f'], "timestamp": "{current.timestamp}"}}'
+            else:
+                yield f'], "timestamp": "{current.timestamp}", "duration": {round(duration, 3)}}}'
+            separator = ", "
+
+
+def write_json(node, file):
+    """
+    将JSON格式的测试报告写入文件对象
+    """
+    for chunk in iter_json(node):
+        file.write(chunk)
+
+
+# =====================================
+# JUnit XML
+#   1. 测试用例状态的对应关系: FAIL -> failure, ERROR/EXCEPTION -> error, STOP -> skipped,
+#      其他状态视为通过
+#   2. 失败的测试用例附带其结果子树的文本, 便于在CI系统中直接查看失败的步骤
+#   3. 嵌套的测试列表展开为独立的testsuite, 名称为测试列表的路径
+# =====================================
+_JUNIT_TAGS = {
+    StepResult.FAIL: "failure",
+    StepResult.ERROR: "error",
+    StepResult.EXCEPTION: "error",
+}
+
+
+def _suite_counts(node):
+    """
+    统计测试列表直接包含的测试用例
+    @return: (测试用例数, 失败数, 错误数, 跳过数)
+    """
+    tests = failures = errors = skipped = 0
+    for child in node.children:
+        if child.type != NodeType.Case:
+            continue
+        tests += 1
+        if child.status == StepResult.FAIL:
+            failures += 1
+        elif child.status in [StepResult.ERROR, StepResult.EXCEPTION]:
+            errors += 1
+        elif child.status == StepResult.STOP:
+            skipped += 1
+    return tests, failures, errors, skipped
+
+
+def _first_failed_step(node):
+    """
+    @return: 测试用例中第一个与测试用例状态相同的叶子步骤的标题
+    """
+    for event, current, _ in _walk(node):
+        if event == "enter" and not current.children and current.status == node.status:
+            return current.header
+    return node.status.name
+
+
+def iter_junit(node):
+    """
+    逐段生成JUnit XML格式的测试报告
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    case_stats = node.get_test_case_stats()
+    yield (f'<testsuites name={quoteattr(node.header)} '
+           f'failures="{case_stats["stats_fail"]}" '
+           f'errors="{case_stats["stats_error"] + case_stats["stats_exception"]}">\n')
+    # 只遍历到测试列表一级, 测试用例的子树只在失败时展开
+    stack = [(node, node.header)]
+    while stack:
+        suite, path = stack.pop()
+        tests, failures, errors, skipped = _suite_counts(suite)
+        if tests:
+            yield (f'  <testsuite name={quoteattr(path)} tests="{tests}" failures="{failures}" '
+                   f'errors="{errors}" skipped="{skipped}" timestamp="{suite.timestamp.replace(" ", "T")}">\n')
+            for case in suite.children:
+                if case.type != NodeType.Case:
+                    continue
+                duration = getattr(case, "duration", None)
+                yield f'    <testcase name={quoteattr(case.header)} classname={quoteattr(path)}'
+                if duration is not None:
+                    yield f' time="{duration:.3f}"'
+                tag = _JUNIT_TAGS.get(case.status)
+                if tag is not None:
+                    yield f'>\n      <{tag} message={quoteattr(_first_failed_step(case))} type="{case.status.name}">'
+                    for line in iter_text(case):
+                        yield escape(line)
+                    yield f'</{tag}>\n    </testcase>\n'
+                elif case.status == StepResult.STOP:
+                    yield '>\n      <skipped/>\n    </testcase>\n'
+                else:
+                    yield '/>\n'
+            yield '  </testsuite>\n'
+        # 按测试列表的顺序输出子测试列表
+        sub_lists = [child for child in suite.children if child.type == NodeType.TestList]
+        for sub_list in reversed(sub_lists):
+            stack.append((sub_list, f"{path}/{sub_list.header}"))
+    yield '</testsuites>\n'
+
+
+def write_junit(node, file):
+    """
+    将JUnit XML格式的测试报告写入文件对象
+    """
+    for chunk in iter_junit(node):
+        file.write(chunk)
+
+
+def write_report(node, filename, report_format="text"):
+    """
+    将测试报告写入文件
+    @param node: 结果树的根节点
+    @param filename: 输出文件路径
+    @param report_format: text, json或junit
+    """
+    writers = {"text": write_text, "json": write_json, "junit": write_junit}
+    if report_format not in writers:
+        raise ValueError(f"不支持的测试报告格式: {report_format}")
+    with open(filename, mode="w", encoding="utf-8", newline="") as file:
+        writers[report_format](node, file)
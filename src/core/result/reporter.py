@@ -6,11 +6,15 @@
 # @File: reporter.py
 import collections
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from enum import Enum, IntEnum
-from functools import wraps
-from threading import Event, Lock
+from functools import lru_cache
+from threading import Event
 
-from core.tool.time_tool import TimeTool
+from core.result.jsonlog import log_context
 
 
 # =====================================
@@ -22,21 +26,29 @@ from core.tool.time_tool import TimeTool
 # 基于树形的测试步骤
 #   1. 通过测试报告单例（ResultReporter）来控制整个测试用例执行周期的报告输出
 #   2. 将测试结果映射成树形数据结构
+#
+# 并发记录
+#   1. 每个线程使用独立的游标(recent_node, recent_case, recent_list), 不同线程的步骤不会相互错位
+#   2. 新线程的游标从根节点开始, 通过context方法可以让线程从指定的节点继续记录
+#   3. 添加子节点只是列表的追加, 不需要加锁; 只有节点状态的比较和设置以及统计值的更新使用一个很短的锁
+#   4. context可以指定一个分离标志(threading.Event), 标志被设置后该线程的游标与结果树分离:
+#      之后添加的节点挂在临时的游离节点下, 不记录事件日志, 不输出日志, 不触发失败中断,
+#      用于丢弃超时后仍在运行的看门狗线程的记录
 # =====================================
 
-def locker(lock):
-    def outer(func):
-        @wraps(func)
-        def inner(*args, **kwargs):
-            try:
-                lock.acquire()
-                return func(*args, **kwargs)
-            finally:
-                lock.release()
+_status_lock = threading.Lock()  # 只保护节点状态的比较和设置以及统计值的更新, 不包含日志输出等耗时操作
 
-        return inner
 
-    return outer
+class _Cursor(threading.local):
+    """
+    线程独立的游标, 每个线程第一次访问时从根节点开始
+    """
+
+    def __init__(self, root):
+        self.recent_node = root  # 最近节点
+        self.recent_case = None  # 当前测试用例标识符,为None表示添加失败
+        self.recent_list = None  # 测试节点列表
+        self.detached = None  # 分离标志(threading.Event), 被设置后丢弃该线程的记录
 
 
 class NodeType(IntEnum):
@@ -70,15 +82,23 @@ class StepInfo(Enum):
 
 
 class ResultReporter:
-    my_lock = Lock()
-
-    def __init__(self, logger):
-        self.root = ResultNode("Root")
-        self.recent_node = self.root  # 最近节点
 
-        # 失败回滚
-        self.recent_case = None  # 当前测试用例标识符,为None表示添加失败
-        self.recent_list = None  # 测试节点列表
+    def __init__(self, logger, event_log=None):
+        """
+        @param logger: 日志实例
+        @param event_log: 事件日志(EventLog), 为None时不记录
+        """
+        self.root = ListNode("Root")
+        # 最近节点和失败回滚的标识符, 每个线程独立
+        self._cursor = _Cursor(self.root)
+        # 执行完毕的测试用例的索引, fork产生的测试报告共享同一个索引
+        self.case_index = dict()  # 测试用例的完整路径(/测试列表/子测试列表/测试用例名称) -> 最近一次执行完毕的节点
+        self.case_names = dict()  # 测试用例名称 -> 最近一次执行完毕的该名称的节点
+        self.list_path = None  # 测试用例所属测试列表的路径(/测试列表/子测试列表), 为None时根据节点在结果树中的位置确定
+        self.spill = None  # 溢出文件(SpillFile), 设置后执行完毕的测试用例的子树写入磁盘
+        self.event_log = None
+        if event_log is not None:
+            self.set_event_log(event_log)
 
         # 失败中断
         self.halt_on_failure = False  # 失败停止标识符
@@ -89,24 +109,139 @@ class ResultReporter:
         self.logger = logger
         self.case_logger = None
 
+    def set_event_log(self, event_log):
+        """
+        开始将测试报告的修改记录到事件日志, 之前添加的节点不会被记录
+        """
+        self.event_log = event_log
+        event_log.add_node(self.root, is_open=True)
+
+    def _record(self, node, is_open=False):
+        if self.event_log is not None and not self.is_detached:
+            self.event_log.add_node(node, is_open)
+        return node
+
+    def _record_end(self, node):
+        if self.event_log is not None and node is not None and not self.is_detached:
+            self.event_log.end_node(node)
+
+    @property
+    def is_detached(self):
+        """
+        当前线程的游标是否已经与结果树分离
+        """
+        detached = self._cursor.detached
+        return detached is not None and detached.is_set()
+
+    @property
+    def recent_node(self):
+        if self.is_detached:
+            return ListNode("Detached")  # 游离节点, 添加的子节点不会出现在结果树中
+        return self._cursor.recent_node
+
+    @recent_node.setter
+    def recent_node(self, node):
+        self._cursor.recent_node = node
+        log_context.node = node  # 结构化日志记录当前线程所在的测试用例和步骤
+
+    @property
+    def recent_case(self):
+        if self.is_detached:
+            return None
+        return self._cursor.recent_case
+
+    @recent_case.setter
+    def recent_case(self, node):
+        self._cursor.recent_case = node
+
+    @property
+    def recent_list(self):
+        if self.is_detached:
+            return None
+        return self._cursor.recent_list
+
+    @recent_list.setter
+    def recent_list(self, node):
+        self._cursor.recent_list = node
+
+    @contextmanager
+    def context(self, node=None, detached=None):
+        """
+        在当前线程中临时使用从指定节点开始的游标, 退出时恢复原来的游标
+            例如看门狗线程或并行模块需要在执行器线程的某个步骤集合下继续记录
+        @param node: 游标的起始节点, 为None时从根节点开始
+        @param detached: 分离标志(threading.Event), 被设置后丢弃当前线程的记录, 为None时沿用原来的分离标志
+        """
+        cursor = self._cursor
+        saved = (cursor.recent_node, cursor.recent_case, cursor.recent_list, cursor.detached)
+        if detached is not None:
+            cursor.detached = detached
+        self.recent_node = self.root if node is None else node
+        self.recent_case = None
+        self.recent_list = None
+        # 从起始节点向上查找所属的测试用例和测试列表, 使end_test和end_list在新的游标中仍然有效
+        current = self.recent_node
+        while current is not None:
+            if current.type == NodeType.Case and self.recent_case is None:
+                self.recent_case = current
+            elif current.type == NodeType.TestList and self.recent_list is None:
+                self.recent_list = current
+            current = current.parent
+        try:
+            yield self
+        finally:
+            self.recent_node, self.recent_case, self.recent_list, cursor.detached = saved
+
     def search_result(self, case_name):
         """
         搜索给定的测试用例名称的测试结果
+        @return: 最近一次执行完毕的测试用例节点的状态, 没有执行时返回None
         """
-        self._search_result(self.root, case_name)
+        node = self.find_case(case_name)
+        return None if node is None else node.status
+
+    def find_case(self, case_name):
+        """
+        查找执行完毕的测试用例节点
+        @param case_name: 测试用例的完整路径, 或者测试用例名称;
+                          按名称查找时优先查找同一个测试列表(list_path)中的测试用例, 其次是最近执行完毕的同名测试用例
+        @return: 测试用例节点, 没有执行时返回None
+        """
+        if "/" in case_name:
+            return self.case_index.get(case_name)
+        if self.list_path is not None:
+            node = self.case_index.get(f"{self.list_path}/{case_name}")
+            if node is not None:
+                return node
+        return self.case_names.get(case_name)
+
+    def _index_case(self, node):
+        """
+        将执行完毕的测试用例节点加入索引
+        """
+        if self.list_path is not None:
+            path = f"{self.list_path}/{node.header}"
+        else:
+            path = ""
+            current = node.parent
+            while current is not None:
+                if current.type == NodeType.TestList:
+                    path = f"/{current.header}{path}"
+                current = current.parent
+            path = f"{path}/{node.header}"
+        self.case_index[path] = node
+        self.case_names[node.header] = node
 
-    @locker(my_lock)
     def add_node(self, header, message="", status=StepResult.INFO, node_type=NodeType.Other):
         """
         添加最近节点的子节点
         """
-        self.recent_node = self.recent_node.add_child(header=header,
-                                                      message=message,
-                                                      status=status,
-                                                      node_type=node_type)
+        self.recent_node = self._record(self.recent_node.add_child(header=header,
+                                                                   message=message,
+                                                                   status=status,
+                                                                   node_type=node_type), is_open=True)
 
     # 若添加的节点没有子节点(如:叶子节点),则需要执行一次pop方法
-    @locker(my_lock)
     def add_step_group(self, group_name):
         """
             初始化一个步骤的集合
@@ -114,17 +249,17 @@ class ResultReporter:
         self.add_node(header=group_name, node_type=NodeType.Step)
         self._log_info(f"[Test Step Group] {group_name}")
 
-    @locker(my_lock)
     def end_step_group(self):
         """
             退出一个步骤的集合
         """
         self.pop()
 
-    @locker(my_lock)
     def add(self, status: StepResult, headline, message=""):
-        self.recent_node.add_child(header=headline, message=message,
-                                   status=status, node_type=NodeType.Step)
+        if self.is_detached:
+            return
+        self._record(self.recent_node.add_child(header=headline, message=message,
+                                                status=status, node_type=NodeType.Step))
         self._log_info("Step: " + headline)
         self._log_info("Message" + message)
         # 每次添加测试步骤节点时, halt_event复位
@@ -137,7 +272,6 @@ class ResultReporter:
         elif status == StepResult.STOP and self.halt_on_stop:
             self.halt_event.wait()
 
-    @locker(my_lock)
     def pop(self):
         """
         弹出最近的节点
@@ -145,85 +279,241 @@ class ResultReporter:
         """
         # 将当前节点的recent_node的值设置为当前节点的父节点
         if self.recent_node.parent:
+            self._record_end(self.recent_node)
             self.recent_node = self.recent_node.parent
 
-    @locker(my_lock)
     def add_event_group(self, group_name):
         """
             给每个线程只分配一个ResultNode对象,这些线程内他们只操作自己的ResultNode
             添加新的测试节点,而不会对整个测试结果的树结构产生影响
         """
-        rv = self.recent_node.add_child(header=group_name, node_type=NodeType.Step)
-        rv.log = self.case_logger if self.case_logger is not None else self.logger
+        rv = self._record(self.recent_node.add_child(header=group_name, node_type=NodeType.Step,
+                                                     node_class=EventNode), is_open=True)
+        if not self.is_detached:
+            rv.log = self.case_logger if self.case_logger is not None else self.logger
+            rv.event_log = self.event_log
         self._log_info(f"[事件] {group_name}")
         return rv
 
-    @locker(my_lock)
     def add_test(self, case_name):
         """
         加入当前节点清单
         """
-        self.recent_node = self.recent_node.add_child(header=case_name, node_type=NodeType.Case)
+        self.recent_node = self._record(self.recent_node.add_child(header=case_name, node_type=NodeType.Case,
+                                                                   node_class=CaseNode), is_open=True)
         self.recent_case = self.recent_node
         self._log_info(f"[Test Case] {case_name}")
 
-    @locker(my_lock)
     def end_test(self):
         """
         回退到当前测试用例的父节点
         """
         if self.recent_case is None:
             return
+        if isinstance(self.recent_case, CaseNode):
+            self.recent_case.end()
+        self._record_end(self.recent_case)
+        if self.recent_case.type == NodeType.Case:
+            self._index_case(self.recent_case)
+        if self.spill is not None:
+            self.recent_case.spill_children(self.spill)
         self.recent_node = self.recent_case.parent
         self.recent_case = None
 
-    @locker(my_lock)
     def add_list(self, list_name):
-        self.recent_node = self.recent_node.add_child(header=list_name, node_type=NodeType.TestList)
+        self.recent_node = self._record(self.recent_node.add_child(header=list_name, node_type=NodeType.TestList,
+                                                                   node_class=ListNode), is_open=True)
         self.recent_case = self.recent_node
         self._log_info(f"[Test list] {list_name}")
 
-    @locker(my_lock)
     def end_list(self):
         """
         回退到当前测试列表的父节点
         """
         if self.recent_list is None:
             return
+        self._record_end(self.recent_list)
         self.recent_node = self.recent_list.parent
         self.recent_list = None
 
+    def fork(self):
+        """
+        生成一个独立的测试报告实例, 供并行执行的测试用例单独记录结果
+            1. 共享日志实例与失败中断的配置
+            2. 执行完毕后通过merge方法合并回当前测试报告
+        """
+        rv = ResultReporter(self.logger, self.event_log)
+        rv.halt_on_failure = self.halt_on_failure
+        rv.halt_on_exception = self.halt_on_exception
+        rv.halt_on_stop = self.halt_on_stop
+        rv.halt_event = self.halt_event
+        rv.case_index = self.case_index
+        rv.case_names = self.case_names
+        rv.list_path = self.list_path
+        rv.spill = self.spill
+        return rv
+
+    def merge(self, reporter):
+        """
+        将另一个测试报告的结果树合并到最近节点下
+        @param reporter: 由fork方法产生的测试报告
+        """
+        if self.event_log is not None:
+            self.event_log.merge(reporter.root, self.recent_node)
+        for child in reporter.root.detach_children():
+            self.recent_node.append_child(child)
+
+    def attach(self, node):
+        """
+        将一个已经生成的结果节点(例如从测试用例进程传回的结果)挂载到最近节点下
+        @param node: ResultNode实例
+        """
+        if self.event_log is not None:
+            # 节点属于另一个测试报告(例如重试时每次执行的测试报告)时, 该测试报告随之结束
+            if node.parent is not None:
+                self.event_log.end_node(node.parent)
+            self.event_log.attach(node, self.recent_node)
+        self.recent_node.append_child(node)
+        self._add_finished_cases(node)
+        return node
+
+    def attach_attempts(self, case_name, attempts):
+        """
+        将同一个测试用例多次执行的结果挂载到最近节点下
+            每次执行的测试用例节点作为新测试用例节点的子节点, 测试用例的状态取最后一次执行的状态
+        @param case_name: 测试用例名称
+        @param attempts: 每次执行产生的测试用例节点列表
+        """
+        case_node = CaseNode(case_name, node_type=NodeType.Case)
+        # 执行时间从第一次执行开始, 到最后一次执行结束
+        case_node.timestamp_ns = attempts[0].timestamp_ns
+        if isinstance(attempts[-1], CaseNode) and attempts[-1].ended_ns is not None:
+            case_node.end(attempts[-1].ended_ns)
+        for index, node in enumerate(attempts):
+            if self.event_log is not None and node.parent is not None:
+                self.event_log.end_node(node.parent)
+            node.header = f"第{index + 1}次执行"
+            node.type = NodeType.Step
+            node.parent = case_node
+            case_node.add_child_node(node)
+        case_node.status = attempts[-1].status
+        return self.attach(case_node)
+
+    def replay_node(self, parent, header, message="", status=StepResult.INFO, node_type=NodeType.Other,
+                    timestamp_ns=None, is_open=False):
+        """
+        在指定节点下重放在其他进程中添加的节点(例如测试用例进程实时传回的节点), 不移动游标, 不输出日志
+        @param parent: 父节点
+        @param timestamp_ns: 节点创建时的墙上时间(纳秒), 为None时使用当前时间
+        @param is_open: 之后是否还会在该节点下添加子节点
+        @return: 新建的节点
+        """
+        node_class = {NodeType.Case: CaseNode, NodeType.TestList: ListNode}.get(node_type)
+        node = parent.add_child(header, status, message, node_type, node_class=node_class)
+        if timestamp_ns is not None:
+            node.timestamp_ns = timestamp_ns
+        return self._record(node, is_open)
+
+    def replay_end(self, node, timestamp_ns=None):
+        """
+        重放在其他进程中结束的节点, 测试用例节点记录结束的时间
+        @param timestamp_ns: 结束时的墙上时间(纳秒), 为None时使用当前时间
+        """
+        if isinstance(node, CaseNode):
+            node.end(timestamp_ns)
+        self._record_end(node)
+        if node.type == NodeType.Case:
+            self._index_case(node)
+            if self.spill is not None:
+                node.spill_children(self.spill)
+
     def add_precheck_result(self, result, headline):
         pass
 
     def is_high_priority_passed(self, priority):
         pass
 
-    def _search_result(self, node, case_name):
-        if node.type == NodeType.Step:
-            return None
-        for child in node.children:
-            if child.header == case_name:
-                return child.status
-            else:
-                rv = self._search_result(child, case_name)
-                if rv:
-                    return rv
-        else:
-            return None
+    def _add_finished_cases(self, node):
+        """
+        将挂载的结果子树中的测试用例加入索引, 设置了溢出文件时将其子节点写入磁盘
+            测试用例节点之下只有步骤, 不需要继续遍历
+        """
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.type == NodeType.Case:
+                self._index_case(current)
+                if self.spill is not None:
+                    current.spill_children(self.spill)
+            elif current.type != NodeType.Step:
+                stack.extend(current.children)
 
     def _log_info(self, message):
+        if self.is_detached:
+            return
         if self.case_logger:
             self.case_logger.info(message)
         else:
             self.logger.info(message)
 
 
+# =====================================
+# 结果节点的内存占用
+#   长时间运行的测试会产生数百万个步骤节点, 因此节点尽量紧凑:
+#   1. 使用__slots__, 没有__dict__
+#   2. 时间戳保存为单调时钟的纳秒整数, 只在输出时格式化; 单调时钟在模块导入时与墙上时间对齐
+#   3. 标题字符串驻留(intern), 相同的步骤标题只保存一份
+#   4. 叶子节点不分配子节点列表
+#   5. 只有事件节点(EventNode)需要日志实例
+#
+# 溢出到磁盘
+#   测试报告设置了溢出文件(spill)时, 执行完毕的测试用例的子节点写入溢出文件, 内存中只保留测试用例节点、
+#   读取位置和子树的统计值:
+#   1. 读取children时从溢出文件重建子节点, 重建的子节点不保留在内存中, 输出报告时同一时刻只有一个测试用例的子树
+#   2. 向已经溢出的节点添加或移除子节点时, 子节点重新载入内存
+#   3. 测试用例结束后仍在后台线程中(例如超时的阶段)写入的步骤不会出现在已经溢出的子树中
+# =====================================
+_WALL_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()  # 单调时钟到墙上时间的偏移
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+_NO_CHILDREN = ()
+
+
+@lru_cache(maxsize=4096)
+def _format_seconds(seconds):
+    """
+    格式化时间戳, 同一秒内创建的节点共用格式化的结果
+    """
+    return time.strftime(_TIME_FORMAT, time.localtime(seconds))
+
+
+@lru_cache(maxsize=4096)
+def _parse_seconds(value):
+    """
+    解析格式化的时间戳, 重建大量节点时同一秒的时间戳只解析一次
+    """
+    return int(time.mktime(time.strptime(value, _TIME_FORMAT)))
+
+
+class _SpilledChildren:
+    """
+    已经写入溢出文件的子节点: 读取位置和子树的统计值((统计项, 数量)的元组)
+    """
+    __slots__ = ("spill", "offset", "length", "case_stats", "point_stats")
+
+    def __init__(self, spill, offset, length, case_stats, point_stats):
+        self.spill = spill
+        self.offset = offset
+        self.length = length
+        self.case_stats = case_stats
+        self.point_stats = point_stats
+
+
 class ResultNode:
     """
     测试结果节点:
         利用树形结构进行表示
     """
+    __slots__ = ("header", "message", "status", "parent", "type", "_children", "_created_ns")
 
     def __init__(self, header, message="", status=None, parent=None, node_type=NodeType.Other):
         """
@@ -233,36 +523,170 @@ class ResultNode:
         @param parent: 父节点
         @param node_type: 节点类型
         """
-        self.header = header  # 简短描述信息
+        self.header = sys.intern(header) if type(header) is str else header  # 简短描述信息
         self.message = message  # 具体描述信息
         self.status = StepResult.INFO if status is None else status  # 节点状态
-        self.children = []  # 节点的子节点
+        self._children = None  # 节点的子节点, 第一次添加时才分配
         self.parent = parent  # 节点的父节点
         self.type = node_type  # 节点类型
-        self.timestamp = TimeTool.get_time_stamp()  # 节点创建的时间戳
-        self.log = None
+        self._created_ns = time.monotonic_ns()  # 节点创建时的单调时钟(纳秒)
 
-    def add_child(self, header, status=StepResult.INFO, message="", node_type=NodeType.Other):
+    @property
+    def children(self):
+        """
+        节点的子节点, 只读; 添加子节点使用add_child, append_child或add_child_node
+            子节点已经溢出到磁盘时, 每次读取都从溢出文件重建
+        """
+        children = self._children
+        if children is None:
+            return _NO_CHILDREN
+        if type(children) is _SpilledChildren:
+            return self._load_children(children)
+        return children
+
+    def _load_children(self, spilled):
+        return [ResultNode.from_dict(obj, self) for obj in spilled.spill.read(spilled.offset, spilled.length)]
+
+    @property
+    def is_spilled(self):
+        return type(self._children) is _SpilledChildren
+
+    def spill_children(self, spill):
+        """
+        将子节点写入溢出文件, 内存中只保留读取位置和子树的统计值
+        @param spill: 溢出文件(SpillFile)
+        """
+        children = self._children
+        if not children or type(children) is _SpilledChildren:
+            return
+        count = len(children)
+        case_stats, point_stats = collections.Counter(), collections.Counter()
+        for child in children[:count]:
+            child_case_stats, child_point_stats = _subtree_stats(child)
+            case_stats.update(child_case_stats)
+            point_stats.update(child_point_stats)
+        offset, length = spill.write([child.to_dict() for child in children[:count]])
+        with _status_lock:
+            # 写入期间有新的子节点加入时放弃本次溢出
+            if self._children is children and len(children) == count:
+                self._children = _SpilledChildren(spill, offset, length, tuple((+case_stats).items()),
+                                                  tuple((+point_stats).items()))
+
+    def _page_in(self):
+        """
+        将溢出的子节点重新载入内存
+        """
+        spilled = self._children
+        if type(spilled) is _SpilledChildren:
+            self._children = self._load_children(spilled)
+
+    @property
+    def timestamp_ns(self):
+        """
+        节点创建时的墙上时间(纳秒)
+        """
+        return self._created_ns + _WALL_CLOCK_OFFSET_NS
+
+    @timestamp_ns.setter
+    def timestamp_ns(self, value):
+        self._created_ns = value - _WALL_CLOCK_OFFSET_NS
+
+    @property
+    def timestamp(self):
+        """
+        节点创建的时间戳, 格式化的字符串
+        """
+        return _format_seconds(self.timestamp_ns // 1_000_000_000)
+
+    @timestamp.setter
+    def timestamp(self, value):
+        """
+        根据格式化的时间戳设置节点创建的时间, 用于从字典重建节点
+        """
+        self.timestamp_ns = _parse_seconds(value) * 1_000_000_000
+
+    def add_child_node(self, node):
+        """
+        直接加入子节点, 不改变节点类型和状态
+        """
+        if type(self._children) is _SpilledChildren:
+            self._page_in()
+        # 常见情况: 新建的节点没有统计值, 当前节点也已经不是叶子节点, 只需追加
+        if self._children is not None and node._children is None and node.status not in _STATS_KEYS:
+            self._children.append(node)
+            return node
+        owners = self._stats_owners()
+        case_stats, point_stats = _subtree_stats(node) if owners else (None, None)
+        with _status_lock:
+            if self._children is None:
+                self._children = [node]
+                # 当前节点不再是叶子节点, 移除它自身的测试点统计
+                key = _STATS_KEYS.get(self.status)
+                if owners and key is not None:
+                    point_stats[key] -= 1
+            else:
+                self._children.append(node)
+            for owner in owners:
+                owner.add_stats(case_stats, point_stats)
+        return node
+
+    def detach_children(self):
+        """
+        移除并返回全部子节点
+        """
+        self._page_in()
+        owners = self._stats_owners()
+        with _status_lock:
+            rv = self.children
+            self._children = None
+            if rv and owners:
+                if isinstance(self, ListNode):
+                    case_stats, point_stats = collections.Counter(self.case_stats), collections.Counter(self.point_stats)
+                else:
+                    case_stats, point_stats = collections.Counter(), collections.Counter()
+                    for child in rv:
+                        child_case_stats, child_point_stats = _subtree_stats(child)
+                        case_stats.update(child_case_stats)
+                        point_stats.update(child_point_stats)
+                # 当前节点重新成为叶子节点, 恢复它自身的测试点统计
+                key = _STATS_KEYS.get(self.status)
+                if key is not None:
+                    point_stats[key] -= 1
+                for owner in owners:
+                    owner.add_stats(case_stats, point_stats, sign=-1)
+        return rv
+
+    def add_child(self, header, status=StepResult.INFO, message="", node_type=NodeType.Other, node_class=None):
         """
         添加新的子节点并返回该子节点
+        @param node_class: 子节点的类型, 默认为ResultNode
         """
         # 初始化节点
-        new_node = ResultNode(header, message=message, parent=self, node_type=node_type)
+        new_node = (node_class or ResultNode)(header, message=message, parent=self, node_type=node_type)
 
         # 在case或step类型的节点中,只允许类型是step
         if self.type in [NodeType.Step, NodeType.Case]:
             new_node.type = NodeType.Step
-        self.children.append(new_node)  # 加入子节点
+        self.add_child_node(new_node)  # 加入子节点
         new_node.set_status(status)  # 初始化当前节点状态
         return new_node
 
+    def append_child(self, node):
+        """
+        将一个已经存在的节点(及其子树)挂载为当前节点的子节点, 并更新当前节点的状态
+        """
+        node.parent = self
+        if self.type in [NodeType.Step, NodeType.Case]:
+            node.type = NodeType.Step
+        self.add_child_node(node)
+        self.set_status(node.status)
+        return node
+
     def add(self, status, header, message=""):
         """
         简化的add方法，提供给事件驱动使用
         """
-        self.add_child(header, status, message, NodeType.Step)
-        if self.log:
-            self.log.info(header)
+        return self.add_child(header, status, message, NodeType.Step)
 
     def set_status(self, status):
         """
@@ -273,12 +697,64 @@ class ResultNode:
             return
         if status == StepResult.INFO:
             return
-        # 更改当前节点的状态
-        if self.status in [StepResult.INFO, StepResult.PASS]:
-            self.status = status
+        # 更改当前节点的状态, 多个线程同时更新同一个节点时, 比较和设置需要是原子的
+        with _status_lock:
+            old_status = self.status
+            if old_status in [StepResult.INFO, StepResult.PASS]:
+                self.status = status
+                self._update_stats(old_status, status)
         # 更新父节点状态
         self.parent.set_status(status)
 
+    def _stats_owners(self):
+        """
+        @return: 当前节点及其祖先中维护统计值的节点(ListNode)
+        """
+        rv = []
+        node = self
+        while node is not None:
+            if isinstance(node, ListNode):
+                rv.append(node)
+            node = node.parent
+        return rv
+
+    def _update_stats(self, old_status, new_status):
+        """
+        节点状态变化后更新统计值, 调用时需要持有_status_lock
+        """
+        old_key = _STATS_KEYS.get(old_status)
+        new_key = _STATS_KEYS.get(new_status)
+        if old_key == new_key:
+            return
+        count_case = self.type == NodeType.Case  # 测试用例节点计入测试用例统计
+        count_point = self._children is None  # 叶子节点计入测试点统计
+        if not (count_case or count_point):
+            return
+        for owner in self._stats_owners():
+            if count_case:
+                if old_key is not None:
+                    owner.case_stats[old_key] -= 1
+                if new_key is not None:
+                    owner.case_stats[new_key] += 1
+            if count_point:
+                if old_key is not None:
+                    owner.point_stats[old_key] -= 1
+                if new_key is not None:
+                    owner.point_stats[new_key] += 1
+
+    def get_case_path(self):
+        """
+        @return: (所属测试用例的名称, 从测试用例到该节点的步骤路径), 不在测试用例中时返回(None, "")
+        """
+        headers = list()
+        node = self
+        while node is not None:
+            if node.type == NodeType.Case:
+                return node.header, "/".join(reversed(headers))
+            headers.append(node.header)
+            node = node.parent
+        return None, ""
+
     @property
     def is_leaf(self):
         return any(self.children)
@@ -299,38 +775,36 @@ class ResultNode:
             ret["children"].append(child.to_dict())
         return ret
 
+    @staticmethod
+    def from_dict(obj, parent=None):
+        """
+        根据to_dict生成的字典重建结果节点
+        @param obj: to_dict方法生成的字典
+        @param parent: 父节点
+        @return:
+        """
+        node_type = NodeType(obj["type"])
+        node_class = {NodeType.TestList: ListNode, NodeType.Case: CaseNode}.get(node_type, ResultNode)
+        node = node_class(obj["header"], message=obj["message"], status=StepResult(obj["status"]),
+                          node_type=node_type)
+        node.timestamp = obj["timestamp"]
+        if obj.get("duration") is not None and isinstance(node, CaseNode):
+            node.duration = obj["duration"]
+        for child in obj["children"]:
+            node.add_child_node(ResultNode.from_dict(child, node))
+        # 子树重建完毕后再关联父节点, 避免子树的统计值在父节点挂载它时被重复累加
+        node.parent = parent
+        return node
+
     def to_text(self, indent=0):
         """
         将结果生成文本类型的结构, 以便转换成格式化文本信息
+            输出到文件时使用render模块中的write_text, 不需要生成整个字符串
         @param indent: 缩进层次
         @return:
         """
-        # 添加初始信息, 缩进层次和时间戳
-        ret = f"{self._get_intent(indent)}[{self.timestamp}]"
-
-        # 添加测试用例类别信息
-        if self.type == NodeType.Case:
-            ret += "[TestCase]"
-        if self.type == NodeType.TestList:
-            ret += "[TestList]"
-        ret += self.header
-
-        # 添加节点信息
-        if self.type in [NodeType.Case, NodeType.Step]:
-            ret += self._get_dot_line(ret, 120)
-            ret += self.status.name
-        ret += os.linesep  # 给出当前平台上的终止符, 例如，Windows使用’\r\n’，Linux使用’\n’而Mac使用’\r’。
-
-        # 添加详细信息
-        if self.message:
-            ret += self._get_intent(indent)
-            ret += f"描述: {self.message}{os.linesep}"
-
-        # 添加子节点信息
-        for child in self.children:
-            ret += child.to_text(indent + 1)
-
-        return ret
+        from core.result.render import iter_text
+        return "".join(iter_text(self, indent))
 
     @staticmethod
     def _get_dot_line(line, line_max):
@@ -410,6 +884,153 @@ class ResultNode:
             stats["stats_exception"] = 1
 
 
+# =====================================
+# 增量统计
+#   测试列表和根节点(ListNode)在各自的子树发生变化时累加统计值, 查询统计结果不需要遍历结果树:
+#   1. 节点状态变化时, 测试用例节点更新测试用例统计, 叶子节点更新测试点统计
+#   2. 挂载或移除子树时, 按子树的统计值整体加减; 子树中的ListNode直接使用已有的统计值
+#   3. 叶子节点添加第一个子节点后不再计入测试点统计
+#   统计的口径与递归统计相同, INFO和STOP状态不计入统计
+# =====================================
+_STATS_KEYS = {
+    StepResult.PASS: "stats_pass",
+    StepResult.FAIL: "stats_fail",
+    StepResult.ERROR: "stats_error",
+    StepResult.WARNING: "stats_warning",
+    StepResult.EXCEPTION: "stats_exception"
+}
+
+
+def _subtree_stats(node):
+    """
+    计算一个子树的测试用例统计和测试点统计
+    @return: (测试用例统计, 测试点统计)
+    """
+    case_stats = collections.Counter()
+    point_stats = collections.Counter()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, ListNode):
+            case_stats.update(current.case_stats)
+            point_stats.update(current.point_stats)
+            continue
+        key = _STATS_KEYS.get(current.status)
+        if key is not None:
+            if current.type == NodeType.Case:
+                case_stats[key] += 1
+            if current._children is None:
+                point_stats[key] += 1
+        children = current._children
+        if type(children) is _SpilledChildren:
+            # 溢出的子树使用保留的统计值, 不从磁盘读取
+            for key, value in children.case_stats:
+                case_stats[key] += value
+            for key, value in children.point_stats:
+                point_stats[key] += value
+        elif children:
+            stack.extend(children)
+    return case_stats, point_stats
+
+
+class ListNode(ResultNode):
+    """
+    测试列表和根节点使用的结果节点, 维护整个子树的统计值, 统计查询是常数时间
+    """
+    __slots__ = ("case_stats", "point_stats")
+
+    def __init__(self, header, message="", status=None, parent=None, node_type=NodeType.Other):
+        super().__init__(header, message, status, parent, node_type)
+        self.case_stats = dict.fromkeys(_STATS_KEYS.values(), 0)
+        self.point_stats = dict.fromkeys(_STATS_KEYS.values(), 0)
+        # 新建的节点是叶子节点, 计入自身的状态
+        key = _STATS_KEYS.get(self.status)
+        if key is not None:
+            self.point_stats[key] += 1
+
+    def add_stats(self, case_stats, point_stats, sign=1):
+        """
+        累加子树的统计值, 调用时需要持有_status_lock
+        @param sign: 1表示挂载子树, -1表示移除子树
+        """
+        for key, value in case_stats.items():
+            self.case_stats[key] += sign * value
+        for key, value in point_stats.items():
+            self.point_stats[key] += sign * value
+
+    def get_test_case_stats(self):
+        with _status_lock:
+            return collections.Counter(self.case_stats)
+
+    def get_test_point_stats(self):
+        with _status_lock:
+            return collections.Counter(self.point_stats)
+
+
+class CaseNode(ResultNode):
+    """
+    测试用例节点, 记录测试用例结束的时间, 用于计算执行时间
+    """
+    __slots__ = ("_ended_ns",)
+
+    def __init__(self, header, message="", status=None, parent=None, node_type=NodeType.Case):
+        super().__init__(header, message, status, parent, node_type)
+        self._ended_ns = None  # 结束时的单调时钟(纳秒), 没有结束时为None
+
+    def end(self, timestamp_ns=None):
+        """
+        记录测试用例结束
+        @param timestamp_ns: 结束时的墙上时间(纳秒), 为None时使用当前时间
+        """
+        self._ended_ns = time.monotonic_ns() if timestamp_ns is None else timestamp_ns - _WALL_CLOCK_OFFSET_NS
+
+    @property
+    def ended_ns(self):
+        """
+        结束时的墙上时间(纳秒), 没有结束时为None
+        """
+        return None if self._ended_ns is None else self._ended_ns + _WALL_CLOCK_OFFSET_NS
+
+    @property
+    def duration(self):
+        """
+        执行时间(秒), 没有结束时为None
+        """
+        return None if self._ended_ns is None else (self._ended_ns - self._created_ns) / 1_000_000_000
+
+    @duration.setter
+    def duration(self, value):
+        """
+        根据执行时间设置结束的时间, 用于从字典重建节点
+        """
+        self._ended_ns = self._created_ns + int(value * 1_000_000_000)
+
+    def to_dict(self):
+        ret = super().to_dict()
+        if self._ended_ns is not None:
+            ret["duration"] = round(self.duration, 3)
+        return ret
+
+
+class EventNode(ResultNode):
+    """
+    事件驱动使用的结果节点, 添加步骤时同时输出日志
+    """
+    __slots__ = ("log", "event_log")
+
+    def __init__(self, header, message="", status=None, parent=None, node_type=NodeType.Other):
+        super().__init__(header, message, status, parent, node_type)
+        self.log = None
+        self.event_log = None
+
+    def add(self, status, header, message=""):
+        node = super().add(status, header, message)
+        if self.event_log is not None:
+            self.event_log.add_node(node)
+        if self.log:
+            self.log.info(header)
+
+
 if __name__ == '__main__':
     import logging
 
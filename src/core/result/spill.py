@@ -0,0 +1,66 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/28 0028 21:12
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: spill.py
+
+"""
+    结果树的溢出文件: 保存执行完毕的测试用例的子树, 使长时间运行时内存中的结果树不随步骤数量增长
+"""
+import json
+import os
+import threading
+import weakref
+
+from core.tool.file_tool import FileTool
+
+
+class SpillFile:
+    """
+    溢出文件, 每次写入一段json(子节点的ResultNode.to_dict列表), 按写入时返回的位置读取
+        溢出的子节点引用溢出文件, 测试报告和其中的节点都释放后(或者调用close)关闭并删除文件
+    """
+    file_name = "results.spill"
+
+    def __init__(self, filename):
+        """
+        @param filename: 文件路径, 已经存在时清空; 溢出的内容只在本进程中有效
+        """
+        FileTool.check_and_create_directory(filename)
+        self.filename = filename
+        self._file = open(filename, mode="w+b")
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, self._release, self._file, filename)
+
+    @staticmethod
+    def _release(file, filename):
+        file.close()
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def write(self, obj):
+        """
+        @return: (位置, 长度)
+        """
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._file.seek(0, 2)
+            offset = self._file.tell()
+            self._file.write(data)
+        return offset, len(data)
+
+    def read(self, offset, length):
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return json.loads(data)
+
+    def close(self):
+        """
+        关闭并删除溢出文件, 之后不能再读取已经溢出的子节点
+        """
+        with self._lock:
+            self._finalizer()
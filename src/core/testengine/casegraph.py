@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/25 0025 20:12
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: casegraph.py
+
+"""
+    测试用例依赖关系图: 根据@case装饰器中的pre_tests和priority, 为整个测试用例树建立有向无环图
+"""
+
+# =====================================
+# 依赖关系的来源
+#   1. pre_tests: 前置测试用例必须先执行并且通过, 同名的测试用例全部作为前驱节点
+#   2. priority: 设置了skip_if_high_priority_failed的测试用例, 需要等待所有优先级更高(数值更小)的测试用例执行完毕
+#      为避免O(n^2)的边, 为每个优先级建立一个屏障节点, 屏障节点依赖本优先级的所有测试用例以及上一个优先级的屏障
+#
+# 调度方式
+#   1. 前驱节点全部执行完毕的节点进入就绪状态, 由测试引擎立即分发执行
+#   2. 前驱节点失败(或被跳过)时, 其所有后继节点在执行之前就被剪枝, 不再执行collect_resource和setup
+#   3. 处于环中的节点永远不会就绪, 在调度结束时统一标记为跳过
+# =====================================
+import heapq
+from enum import Enum
+
+
+class CaseState(Enum):
+    WAITING = 1  # 等待前驱节点执行完毕
+    READY = 2  # 已经就绪, 等待分发
+    PASSED = 3  # 执行通过
+    FAILED = 4  # 执行未通过
+    SKIPPED = 5  # 被剪枝, 没有执行
+
+
+class CaseNode:
+    """
+    依赖关系图中的节点, 对应测试用例树中的一个测试用例描述
+    """
+
+    def __init__(self, index, descriptor=None, name=""):
+        self.index = index  # 在测试用例树中按顺序展开后的序号
+        self.descriptor = descriptor  # 测试用例描述字典, 屏障节点为None
+        self.name = name
+        self.successors = list()
+        self.waiting = 0  # 尚未执行完毕的前驱节点数量
+        self.state = CaseState.WAITING
+        self.reason = ""  # 被剪枝的原因
+
+    @property
+    def is_barrier(self):
+        return self.descriptor is None
+
+    def __lt__(self, other):
+        return self.index < other.index
+
+
+class CaseGraph:
+    """
+    测试用例依赖关系图
+    """
+
+    def __init__(self, case_tree):
+        self.nodes = list()  # 按测试用例树的顺序展开的测试用例节点
+        self.barriers = list()
+        self._flatten(case_tree)
+        self._build_edges()
+
+    def _flatten(self, case_tree):
+        """
+        按执行顺序展开测试用例树, 跳过导入失败的测试用例
+        """
+        for test in case_tree.get('test_cases', []):
+            if "case_class" not in test:
+                continue
+            self.nodes.append(CaseNode(len(self.nodes), test, test['case_name']))
+        for sub_list in case_tree.get('sub_list', []):
+            self._flatten(sub_list)
+
+    @staticmethod
+    def _add_edge(source, target):
+        source.successors.append(target)
+        target.waiting += 1
+
+    def _build_edges(self):
+        name_index = dict()
+        priority_index = dict()
+        for node in self.nodes:
+            case_class = node.descriptor['case_class']
+            name_index.setdefault(node.name, []).append(node)
+            priority_index.setdefault(case_class.priority, []).append(node)
+
+        # 1. 前置测试用例
+        for node in self.nodes:
+            for pre_case in node.descriptor['case_class'].pre_tests:
+                if pre_case not in name_index:
+                    self.skip(node, f"{pre_case}没有执行")
+                    continue
+                for pre_node in name_index[pre_case]:
+                    if pre_node is not node:
+                        self._add_edge(pre_node, node)
+
+        # 2. 优先级屏障: 屏障节点[i]依赖优先级priorities[i]的全部测试用例以及屏障节点[i-1]
+        priorities = sorted(priority_index.keys())
+        for priority in priorities:
+            barrier = CaseNode(-1, name=f"优先级{priority}")
+            for node in priority_index[priority]:
+                self._add_edge(node, barrier)
+            if any(self.barriers):
+                self._add_edge(self.barriers[-1], barrier)
+            self.barriers.append(barrier)
+        for node in self.nodes:
+            case_class = node.descriptor['case_class']
+            if not case_class.skip_if_high_priority_failed:
+                continue
+            level = priorities.index(case_class.priority)
+            if level > 0:
+                self._add_edge(self.barriers[level - 1], node)
+
+    def skip(self, node, reason):
+        """
+        在执行之前将节点剪枝, 例如不满足测试类型或优先级的测试用例
+        """
+        if node.state in [CaseState.WAITING, CaseState.READY]:
+            node.state = CaseState.SKIPPED
+            node.reason = reason
+
+    def ready_nodes(self):
+        """
+        获取初始时就已经就绪的测试用例, 同时剪枝已经被跳过的节点的后继节点
+        @return: 就绪的测试用例节点列表
+        """
+        # 先取出所有被跳过的节点再传递结果, 避免传递过程中新剪枝的节点被重复处理
+        for node in [node for node in self.nodes if node.state == CaseState.SKIPPED]:
+            self._finish(node, False)
+        rv = list()
+        for node in self.nodes:
+            if node.state == CaseState.WAITING and node.waiting == 0:
+                node.state = CaseState.READY
+                rv.append(node)
+        return rv
+
+    def finish(self, node, passed):
+        """
+        测试用例执行完毕, 更新后继节点
+        @param node: 执行完毕的测试用例节点
+        @param passed: 测试用例是否通过
+        @return: 新就绪的测试用例节点列表
+        """
+        node.state = CaseState.PASSED if passed else CaseState.FAILED
+        return sorted(self._finish(node, passed))
+
+    def _finish(self, node, passed):
+        """
+        将节点的结果传递给后继节点:
+            1. 节点失败时, 立即剪枝所有后继节点, 不需要等待它们的其他前驱节点
+            2. 节点通过时, 前驱节点全部完成的后继节点进入就绪状态, 屏障节点直接视为通过
+        """
+        rv = list()
+        stack = [(node, passed)]
+        while stack:
+            current, current_passed = stack.pop()
+            for successor in current.successors:
+                successor.waiting -= 1
+                if successor.state != CaseState.WAITING:
+                    continue
+                if not current_passed:
+                    successor.state = CaseState.SKIPPED
+                    if current.is_barrier:
+                        successor.reason = f"{current.name}以上的测试用例没有全部通过"
+                    else:
+                        successor.reason = f"{current.name}的执行结果不成功"
+                    stack.append((successor, False))
+                elif successor.waiting == 0:
+                    if successor.is_barrier:
+                        successor.state = CaseState.PASSED
+                        stack.append((successor, True))
+                    else:
+                        successor.state = CaseState.READY
+                        rv.append(successor)
+        return rv
+
+    def unfinished_nodes(self):
+        """
+        调度结束后仍未执行的节点(存在循环依赖), 统一标记为跳过
+        """
+        rv = list()
+        for node in self.nodes:
+            if node.state == CaseState.WAITING:
+                self.skip(node, "存在循环依赖")
+                rv.append(node)
+        return rv
+
+    def topological_order(self):
+        """
+        假设所有测试用例都通过时的拓扑排序, 同一时刻就绪的测试用例按测试列表的顺序排列
+        处于环中的测试用例不会出现在结果中, 需要在开始调度之前调用
+        @return: 测试用例节点列表
+        """
+        waiting = {id(node): node.waiting for node in self.nodes + self.barriers}
+        ready = [(0 if node.is_barrier else 1, node.index, seq, node)
+                 for seq, node in enumerate(self.nodes + self.barriers) if waiting[id(node)] == 0]
+        heapq.heapify(ready)
+        seq = len(ready)
+        order = list()
+        while ready:
+            node = heapq.heappop(ready)[-1]
+            if not node.is_barrier:
+                order.append(node)
+            for successor in node.successors:
+                waiting[id(successor)] -= 1
+                if waiting[id(successor)] == 0:
+                    seq += 1
+                    heapq.heappush(ready, (0 if successor.is_barrier else 1, successor.index, seq, successor))
+        return order
@@ -44,18 +44,31 @@
 # 测试引擎执行测试用例的最小单位是 测试列表
 # =====================================
 import importlib
+import logging
 import os
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from enum import Enum
 
 from core.case.base import TestCaseBase
 from core.case.precondition import IsTestCaseType, IsTestCasePriority, IsPreCasePassed, IsHigherPriorityPassed
 from core.config.logic_module import ModuleManager, ModuleType
 from core.config.setting import static_setting, SettingBase
-from core.resource.error import ResourceNotMeetConstraintError, ResourceLoadError, ResourceNotRelease
+from core.resource.error import ResourceLoadError, ResourceNotRelease
 from core.resource.pool import ResourcePool
 from core.result.logger import logger
-from core.result.reporter import ResultReporter, StepResult
+from core.result.eventlog import EventLog
+from core.result.jsonlog import JsonLinesHandler
+from core.result.reporter import ResultReporter, ResultNode, StepResult, NodeType
+from core.result.spill import SpillFile
+from core.testengine.casegraph import CaseGraph, CaseState
+from core.testengine.checkpoint import CaseCheckpoint
+from core.testengine.history import CaseHistory
+from core.testengine.isolation import ProcessCaseExecutor
+from core.testengine.lifecycle import run_case_phases
+from core.testengine.shard import ShardCoordinator, connect_coordinator, flatten_case_tree, filter_case_tree, \
+    hash_split, duration_split, check_authkey, check_shard
 from core.testengine.testlist import TestList
 from core.tool.time_tool import TimeTool
 
@@ -72,6 +85,22 @@ class CaseRunnerSetting(SettingBase):
     log_path = os.path.join(dir_path, "log", "ats_logs")  # 一般log日志输出目录
     case_log = os.path.join(dir_path, "log", "case_logs")  # 测试用例输出的日志存放的路径
     log_level = "INFO"
+    max_workers = 1  # 并行执行测试用例的最大线程数, 1表示按测试列表顺序串行执行
+    schedule_mode = "list"  # 测试用例的调度方式: list-按测试列表顺序执行, dag-按依赖关系图调度执行
+    isolation = "thread"  # 测试用例的执行方式: thread-在执行器线程中执行, process-在独立的进程中执行
+    case_timeout = 0  # process方式下单个测试用例的最长执行时间(秒), 0表示不限制
+    setup_timeout = 0  # setup阶段的默认执行时间限制(秒), 0表示不限制
+    test_timeout = 0  # test阶段的默认执行时间限制(秒), 0表示不限制
+    cleanup_timeout = 0  # cleanup阶段的执行时间限制(秒), 0表示不限制
+    preload_modules = ["paramiko", "selenium", "product"]  # process方式下预先在进程服务中导入的模块
+    history_file = os.path.join(dir_path, "log", "case_history.json")  # 测试用例历史执行时间的记录文件
+    shard_authkey = ""  # 测试机与分片协调器之间的认证密钥, 使用动态分片时必须配置, 不要使用公开的值
+    shard_poll_interval = 0.5  # 没有可以执行的测试用例时, 测试机再次向协调器领取的间隔(秒)
+    event_log = False  # 是否将测试结果的每一次修改记录到测试用例日志目录中的事件日志(events.log)
+    spill_results = False  # 是否将执行完毕的测试用例的步骤写入测试用例日志目录中的溢出文件(results.spill), 长时间运行时使用
+    queue_logging = False  # 是否由单独的线程输出日志, 测试线程记录日志时只放入队列
+    json_log = False  # 是否将所有日志同时以json lines格式写入测试用例日志目录中的logs.jsonl, 并生成按测试用例和步骤查找的索引
+    debug_ring_buffer = 0  # 每个测试用例在内存中保留的最近的DEBUG日志条数, 测试用例执行失败时写入测试用例日志, 0表示不保留
 
 
 class CaseImportError(Exception):
@@ -104,16 +133,26 @@ class CaseRunner:
         self.running_thread = None
         self.case_tree = {}
         self.priority_list = []
-        self.pre_conditions = []
         self.module_manager = ModuleManager()
+        self.case_classes = dict()  # 测试用例类的完整路径 -> 测试用例类, 同一个测试用例只导入一次
+        self.plan_logger = logging.getLogger("CaseRunner.plan")  # 生成执行计划时使用, 不输出日志
+        self.plan_logger.disabled = True
 
+        if CaseRunnerSetting.queue_logging:
+            logger.start_queue()
         self.logger = logger.register("CaseRunner", filename=os.path.join(CaseRunnerSetting.log_path, "CaseRunner.log"),
                                       default_level=CaseRunnerSetting.log_level)
         self.result_report = ResultReporter(self.logger)  # 将logger实例共享给ResultReporter
         self.logger.info("执行器装载完毕")
 
         self.case_log_folder = None
-        self.case_result = dict()
+        self.case_result = dict()  # 测试用例的键 -> {'case_name': 测试用例名称, 'priority': 优先级, 'result': 是否通过}
+        self.process_executor = None
+        self.history = None
+        self.checkpoint = None
+        self.coordinator_address = None  # 动态分片时协调器的地址, 为None表示独立执行
+        self.retry_count = 0  # 本次执行已经使用的重试次数
+        self.retry_lock = threading.Lock()
 
     def load_resource(self, file_name, username):
         """
@@ -163,21 +202,30 @@ class CaseRunner:
     def load_test(self, test_name) -> TestCaseBase:
         """
         动态实例化测试用例
-        1. 为每个测试用例建立一个描述字典case_descriptor
-        2. 通过load_test动态地引用测试用例
-        3. 对测试用例实例化后, 存储关键信息
-        4. 遍历测试用例地子列表,递归调用_import_list_case方法,装载子列表地测试用例
+        @param test_name: 测试用例类的完整路径
         """
+        return self.load_case_class(test_name)(self.result_report)
 
+    def load_case_class(self, test_name):
+        """
+        动态引用测试用例类, 按完整路径缓存, 同一个测试用例出现在多个测试列表中时只导入一次
+        测试用例树中只保存测试用例类, 在前置条件判断通过之后才实例化
+        @param test_name: 测试用例类的完整路径
+        """
+        case_class = self.case_classes.get(test_name)
+        if case_class is not None:
+            return case_class
         case_module_name = ".".join(test_name.split(".")[0: -1])
         case_name = test_name.split(".")[-1]
         # 动态引用测试用例
         try:
             case_module = importlib.import_module(case_module_name)
-            return getattr(case_module, case_name)(self.result_report)
+            case_class = getattr(case_module, case_name)
         except Exception as ex:
             # 导入测试用例失败，抛出异常
             raise CaseImportError("导入测试用例 [%s] [失败]!" % test_name, ex)
+        self.case_classes[test_name] = case_class
+        return case_class
 
     def set_test_list(self, test_list: TestList):
         """
@@ -194,9 +242,117 @@ class CaseRunner:
             self.priority_list = self.test_list.setting.priority_to_run
         self.logger.info("测试列表装载完毕")
 
-    def start(self):
+    # =====================================
+    # 执行计划(dry run):
+    #   1. 只根据测试列表的配置和@case装饰器的属性判断前置条件, 不实例化测试用例, 不调用collect_resource, 不连接设备
+    #   2. 假设所有执行的测试用例都通过, 剪枝不满足测试类型、优先级以及前置测试用例没有执行的测试用例
+    #   3. list方式按测试列表的顺序执行, 前置测试用例必须排在前面; dag方式按依赖关系图的拓扑顺序执行
+    #   4. 根据历史执行时间估算总耗时
+    # =====================================
+    def plan(self):
+        """
+        生成执行计划
+        @return: {"order": 按执行顺序排列的测试用例, "skipped": 不会执行的测试用例及原因,
+                  "estimated_duration": 有历史记录的测试用例的总耗时(秒), "unknown_duration": 没有历史记录的测试用例数量}
+        """
+        if self.test_list is None:
+            raise TestEngineNotReadyError("测试引擎未准备就绪，【测试列表】未装载")
+        graph = CaseGraph(self.case_tree)
+        topological_order = graph.topological_order()
+        order = topological_order if CaseRunnerSetting.schedule_mode == "dag" else list(graph.nodes)
+        # 1. 测试类型和优先级, 判断的过程记录在不输出日志的测试报告中
+        static_conditions = self.__init_static_precondition()
+        for node in graph.nodes:
+            reason = self.__pre_check(node.descriptor['case_class'], static_conditions,
+                                      ResultReporter(self.plan_logger))
+            if reason is not None:
+                graph.skip(node, reason)
+        # 2. 前置测试用例: 依赖关系图传递剪枝, 不在拓扑排序中的测试用例处于环中, list方式还要求前置测试用例已经执行
+        graph.ready_nodes()
+        ordered = {id(node) for node in topological_order}
+        for node in graph.nodes:
+            if id(node) not in ordered:
+                graph.skip(node, "存在循环依赖")
+                if CaseRunnerSetting.schedule_mode == "dag":
+                    order.append(node)
+        planned = set()
+        for node in order:
+            if node.state == CaseState.SKIPPED:
+                continue
+            if CaseRunnerSetting.schedule_mode != "dag":
+                for pre_case in node.descriptor['case_class'].pre_tests:
+                    if pre_case not in planned:
+                        graph.skip(node, f"{pre_case}没有执行")
+                        break
+            if node.state != CaseState.SKIPPED:
+                planned.add(node.name)
+        # 3. 估算耗时
+        history = CaseHistory(CaseRunnerSetting.history_file)
+        rv = {"order": [], "skipped": [], "estimated_duration": 0.0, "unknown_duration": 0}
+        for node in order:
+            if node.state == CaseState.SKIPPED:
+                rv["skipped"].append({"case_key": node.descriptor['case_key'], "case_name": node.name,
+                                      "reason": node.reason})
+                continue
+            estimate = history.estimate(node.descriptor['case_class'])
+            if estimate is None:
+                rv["unknown_duration"] += 1
+            else:
+                rv["estimated_duration"] += estimate
+            rv["order"].append({"case_key": node.descriptor['case_key'], "case_name": node.name,
+                                "priority": node.descriptor['case_class'].priority, "estimate": estimate})
+        return rv
+
+    # =====================================
+    # 测试分片:
+    #   1. set_shard: 静态分片, 只保留测试用例树中属于本分片的测试用例
+    #   2. start_worker: 作为测试机, 从协调器领取测试用例执行并传回结果
+    #   3. run_coordinator: 作为协调器, 向测试机分发测试用例并合并结果, 不需要装载测试资源
+    # =====================================
+    def set_shard(self, index, count, policy="hash"):
+        """
+        静态分片, 需要在装载测试列表之后调用
+        @param index: 分片序号, 从0开始
+        @param count: 分片数量
+        @param policy: 分片方式: hash-按测试用例键的哈希值, duration-按历史执行时间均衡
+                       相互依赖(pre_tests)的测试用例总是分配到同一个分片
+        """
+        if self.test_list is None:
+            raise TestEngineNotReadyError("测试引擎未准备就绪，【测试列表】未装载")
+        check_shard(index, count)
+        if policy == "duration":
+            keys = duration_split(self.case_tree, index, count, CaseHistory(CaseRunnerSetting.history_file))
+        else:
+            keys = hash_split(self.case_tree, index, count)
+        self.case_tree = filter_case_tree(self.case_tree, keys)
+        self.logger.info(f"测试分片{index}/{count}: 共{len(keys)}个测试用例")
+
+    def start_worker(self, address):
+        """
+        作为测试机开始执行, 测试用例由协调器分发
+        @param address: 协调器地址(host, port)
+        """
+        check_authkey(CaseRunnerSetting.shard_authkey)
+        self.coordinator_address = address
+        self.start()
+
+    def run_coordinator(self, address):
+        """
+        作为协调器向测试机分发测试用例, 所有测试用例执行完毕后将结果合并到测试报告
+        @param address: 监听地址(host, port)
+        """
+        if self.test_list is None:
+            raise TestEngineNotReadyError("测试引擎未准备就绪，【测试列表】未装载")
+        coordinator = ShardCoordinator(self.case_tree, address, CaseRunnerSetting.shard_authkey)
+        self.logger.info(f"分片协调器开始监听: {coordinator.address}")
+        coordinator.serve()
+        coordinator.merge_into(self.result_report)
+        self.case_result.update(coordinator.case_result)
+
+    def start(self, run_dir=None):
         """
         测试引擎开始执行
+        @param run_dir: 测试用例日志目录, 为None时新建一个以时间戳命名的目录
         """
         # 检查 配置、资源、和测试列表
         if self.status == RunningStatus.Running:
@@ -208,10 +364,45 @@ class CaseRunner:
 
         # 初始化操作
         self.status = RunningStatus.Running
-        self.case_log_folder = os.path.join(CaseRunnerSetting.case_log, TimeTool.get_time_stamp())
+        self.case_log_folder = run_dir or os.path.join(CaseRunnerSetting.case_log, TimeTool.get_time_stamp())
+        self.checkpoint = CaseCheckpoint(self.case_log_folder)
+        self.retry_count = 0
+        self.history = CaseHistory(CaseRunnerSetting.history_file)
+        if CaseRunnerSetting.event_log:
+            self.result_report.set_event_log(EventLog(os.path.join(self.case_log_folder, EventLog.file_name)))
+        if CaseRunnerSetting.json_log:
+            logger.start_json_log(os.path.join(self.case_log_folder, JsonLinesHandler.file_name))
+        if CaseRunnerSetting.spill_results:
+            self.result_report.spill = SpillFile(os.path.join(self.case_log_folder, SpillFile.file_name))
+        if CaseRunnerSetting.isolation == "process":
+            # 重量级的模块和测试用例模块只在进程服务中导入一次, 测试用例进程由此派生
+            self.process_executor = ProcessCaseExecutor(CaseRunnerSetting.preload_modules + self.__get_case_modules())
         self.running_thread = threading.Thread(target=self.__main_test_thread)
         self.running_thread.start()
 
+    def resume(self, run_dir):
+        """
+        从检查点继续执行: 检查点中已经执行完毕的测试用例不再执行, 其结果直接合并回测试报告
+        @param run_dir: 被中断的那次执行的测试用例日志目录
+        """
+        if not os.path.exists(os.path.join(run_dir, CaseCheckpoint.file_name)):
+            raise TestEngineNotReadyError(f"测试引擎未准备就绪，{run_dir}中没有检查点文件")
+        self.start(run_dir)
+
+    def __get_case_modules(self, testlist=None):
+        """
+        获取测试用例树中所有测试用例所在的模块
+        """
+        if testlist is None:
+            testlist = self.case_tree
+        rv = list()
+        for test in testlist.get('test_cases', []):
+            if "case_class" in test and test['case_class'].__module__ not in rv:
+                rv.append(test['case_class'].__module__)
+        for sub_list in testlist.get('sub_list', []):
+            rv.extend(m for m in self.__get_case_modules(sub_list) if m not in rv)
+        return rv
+
     def wait_for_test_done(self):
         self.running_thread.join()
 
@@ -224,32 +415,48 @@ class CaseRunner:
     #       不满足: 中止测试,抛出异常交由测试引擎处理
     #       满足: 执行后续步骤
     # =====================================
-    def run_case_lcm(self, test: TestCaseBase):
+    def run_case_lcm(self, test: TestCaseBase, reporter: ResultReporter = None):
         """
         执行测试用例生命周期管理
         这个方法应该在子线程被运行
+        @param test: 测试用例实例
+        @param reporter: 记录该测试用例结果的测试报告, 为None时使用执行器的测试报告
+        @return: 测试用例是否执行通过
         """
-        self.__init_precondition(test)
+        if reporter is None:
+            reporter = self.result_report
+        pre_conditions = self.__init_precondition(test)
         # 判断前置条件是否全部通过
-        if not self.__pre_check(test):
-            return
+        if self.__pre_check(test, pre_conditions, reporter) is not None:
+            return False
+        return self.__execute_case(test, reporter)
+
+    def __execute_case(self, test: TestCaseBase, reporter: ResultReporter):
+        """
+        前置条件判断通过后, 装载逻辑模块并执行测试用例
+        @return: 测试用例是否执行通过
+        """
         # 逻辑模块的装载执行和测试用例执行
         self.module_manager.run_module(ModuleType.PRE)  # 预装载
         self.module_manager.run_module(ModuleType.PARALLEL)  # 并行执行
-        self.__run_case(test)  # 运行模块,执行单个测试用例
+        passed = self.__run_case(test, reporter)  # 运行模块,执行单个测试用例
         self.module_manager.stop_module()  # 停止模块
         self.module_manager.run_module(ModuleType.POST)  # 执行后置模块
+        return passed
 
-    def _import_list_case(self, case_tree_node, test_list, log_path=None):
+    def _import_list_case(self, case_tree_node, test_list, log_path=None, list_key=None, list_path=""):
         """
         递归导入测试列表中的测试用例
         @param case_tree_node:构建测试列表和测试用例的信息
         @oaram test_list: 测试列表
+        @param list_key: 测试列表在测试用例树中的路径, 子列表的序号保证同名的子列表也不会重复
+        @param list_path: 上级测试列表在测试报告中的路径, 用于测试用例索引的键
         """
         # 测试日志文件路径载入
         case_log_path = test_list.test_list_name
         if log_path:
             case_log_path = os.path.join(log_path, case_log_path)
+        list_path = f"{list_path}/{test_list.test_list_name}"
 
         # 构建测试列表和测试用例的信息
         case_tree_node["list_name"] = test_list.test_list_name
@@ -257,7 +464,7 @@ class CaseRunner:
         case_tree_node['sub_list'] = []
 
         # 遍历测试列表中的测试用例, 并加入测试用例树
-        for testcase in test_list.test_cases:
+        for index, testcase in enumerate(test_list.test_cases):
             if testcase.strip() == "":  # 去除空格后, 没有字符串, 则遍历下一个
                 continue
             # 规定每条测试用例用 逗号 来分割测试用例的[包路径名]和[配置文件名]
@@ -267,12 +474,15 @@ class CaseRunner:
             if len(case_entry) > 1:
                 case_setting_file = case_entry[1]
             # 导入测试用例
-            case_descriptor = {}
+            # 测试用例的键: 测试列表的路径和测试用例在列表中的序号, 用于检查点的记录
+            case_descriptor = {'case_key': f"{list_key or test_list.test_list_name}#{index}"}
             try:
                 # 初始化
-                case_descriptor['case'] = self.load_test(case_name)
+                case_descriptor['case_class'] = self.load_case_class(case_name)
+                case_descriptor['case_path'] = case_name
                 case_descriptor['case_name'] = case_name.split(".")[-1]
                 case_descriptor['log_path'] = case_log_path
+                case_descriptor['list_path'] = list_path
                 case_descriptor['setting_file'] = case_setting_file
                 # 设置测试用例配置文件路径
                 if test_list.setting.case_setting_path:
@@ -280,7 +490,7 @@ class CaseRunner:
                 else:
                     case_descriptor['setting_path'] = CaseRunnerSetting.default_case_setting_path
                 # 设置当前测试用例的优先级,并加入优先级清单中, 默认设置为 999(最高)
-                case_priority = getattr(case_descriptor['case'], "priority", 999)
+                case_priority = getattr(case_descriptor['case_class'], "priority", 999)
                 if case_priority not in self.priority_list:
                     self.priority_list.append(case_priority)
             except CaseImportError as cie:
@@ -291,59 +501,159 @@ class CaseRunner:
             case_tree_node['test_cases'].append(case_descriptor)
 
         # 遍历测试列表中的子测试列表, 并加入测试用例树
-        for sub_list in test_list.sub_list:
+        for sub_index, sub_list in enumerate(test_list.sub_list):
             sub_list_dict = {}
             case_tree_node['sub_list'].append(sub_list_dict)
             # 递归调用
-            self._import_list_case(sub_list_dict, sub_list, log_path=case_log_path)
+            self._import_list_case(sub_list_dict, sub_list, log_path=case_log_path,
+                                   list_key=f"{list_key or test_list.test_list_name}/{sub_index}.{sub_list.test_list_name}",
+                                   list_path=list_path)
 
     # =====================================
     # 前置条件判断:
     #   针对每个测试用例创建前置条件, 配置不同, 前置条件不同
     # =====================================
     def __init_precondition(self, test: TestCaseBase):
-        # 实现前置条件判断
-        self.pre_conditions.clear()
+        """
+        实现前置条件判断, 每个测试用例使用独立的前置条件列表, 以便并行执行
+        @param test:
+        @return: 前置条件列表
+        """
+        pre_conditions = list()
+        # 并行执行时其他线程会同时写入执行结果, 前置条件使用执行结果的快照
+        case_result = dict(self.case_result)
         # 判断是否是指定类型
-        self.pre_conditions.append(IsTestCaseType(self.test_list.setting.run_type))
+        pre_conditions.append(IsTestCaseType(self.test_list.setting.run_type))
         # 判断是否是指定优先级
         if any(self.test_list.setting.priority_to_run):
-            self.pre_conditions.append(IsTestCasePriority(self.test_list.setting.priority_to_run))
+            pre_conditions.append(IsTestCasePriority(self.test_list.setting.priority_to_run))
         # 判断是否是某个期望的结果
         if any(test.pre_tests):
-            self.pre_conditions.append(IsPreCasePassed(self.case_result))
+            pre_conditions.append(IsPreCasePassed(case_result))
         # 判断高优先级测试用例是否全部通过
-        self.pre_conditions.append(IsHigherPriorityPassed(test.priority, self.case_result))
+        pre_conditions.append(IsHigherPriorityPassed(test.priority, case_result))
+        return pre_conditions
+
+    def __init_static_precondition(self):
+        """
+        与执行结果无关的前置条件(测试类型, 优先级), 可以在执行之前判断
+        @return: 前置条件列表
+        """
+        pre_conditions = [IsTestCaseType(self.test_list.setting.run_type)]
+        if any(self.test_list.setting.priority_to_run):
+            pre_conditions.append(IsTestCasePriority(self.test_list.setting.priority_to_run))
+        return pre_conditions
 
-    def __pre_check(self, test: TestCaseBase):
+    @staticmethod
+    def __pre_check(test, pre_conditions, reporter: ResultReporter):
         """
         运行所有检查前置条件的实例化对象, 并检查前置条件是否全部执行通过
-        @param test:
-        @return:
+        @param test: 测试用例类或实例, 前置条件只使用@case装饰器设置在类上的属性
+        @param pre_conditions: 前置条件列表
+        @param reporter: 测试报告
+        @return: 不满足的前置条件的描述, 全部满足时返回None
         """
-        for condition in self.pre_conditions:
-            if not condition.is_meet(test, self.result_report):
-                self.result_report.add(StepResult.INFO, f"{test.__class__.__name__}不能执行！")
-                return False
-        return True
+        case_class = test if isinstance(test, type) else type(test)
+        for condition in pre_conditions:
+            if not condition.is_meet(test, reporter):
+                reporter.add(StepResult.INFO, f"{case_class.__name__}不能执行！")
+                return condition.get_description()
+        return None
+
+    @staticmethod
+    def __case_log_name(test):
+        """
+        测试用例日志实例的名称, 包含测试用例的键, 同一个测试用例在测试列表中出现多次并且并行执行时也不重复
+        """
+        return f"{test['case_name']}({test['case_key']})"
 
-    def __get_case_log(self, path, case_name):
+    def __get_case_log(self, test):
         """
         为每一个注册用例注册一个日志实例, 输出到相应的测试用例目录中
-        @param path:
-        @param case_name:
+            同名测试用例的多次执行写入同一个日志文件, 日志文件按注册次数计数, 最后一次执行完毕时才关闭
+        @param test: 测试用例描述字典
         @return:
         """
-        log_path = os.path.join(self.case_log_folder, path, f"{case_name}.log")
-        return logger.register(case_name, filename=log_path, is_test=True)
+        log_path = os.path.join(self.case_log_folder, test['log_path'], f"{test['case_name']}.log")
+        return logger.register(self.__case_log_name(test), filename=log_path, is_test=True,
+                               ring_buffer=CaseRunnerSetting.debug_ring_buffer)
 
     def __main_test_thread(self):
         try:
-            # 递归执行子列表
-            self.__run_test_list(self.case_tree)
+            if self.coordinator_address is not None:
+                # 从协调器领取测试用例执行, 协调器已经按依赖关系分发, 不使用本地的调度方式
+                self.__run_shard_worker()
+            elif CaseRunnerSetting.schedule_mode == "dag":
+                # 按依赖关系图调度执行
+                self.__run_case_graph()
+            else:
+                # 递归执行子列表
+                self.__run_test_list(self.case_tree)
         finally:
+            self.__save_history()
+            if self.result_report.event_log is not None:
+                self.result_report.event_log.close()
+            logger.flush()
+            logger.stop_json_log()
+            logger.wait_archives()
             self.status = RunningStatus.Idle
 
+    def __save_history(self):
+        """
+        保存本次执行的测试用例耗时, 保存失败不影响测试结果
+        """
+        try:
+            self.history.save()
+        except Exception as ex:
+            self.logger.exception(ex)
+
+    def __order_cases(self, items, case_of=lambda item: item):
+        """
+        根据测试列表的排序策略, 决定测试用例提交到线程池的顺序
+            file: 按测试列表中的顺序
+            lpt: 历史耗时最长的测试用例最先执行, 没有历史记录的按优先级排在后面
+        @param items: 待排序的列表
+        @param case_of: 从列表元素中获取测试用例实例的方法
+        """
+        if self.test_list.setting.order_policy == "lpt":
+            return self.history.lpt_order(items, case_of)
+        return items
+
+    def __run_shard_worker(self):
+        """
+        作为测试机, 循环从协调器领取测试用例并传回执行结果
+            与协调器的连接断开时停止执行, 已经领取但没有传回结果的测试用例由协调器重新分发给其他测试机
+        """
+        descriptors = {test['case_key']: test for test in flatten_case_tree(self.case_tree)}
+        try:
+            conn = connect_coordinator(self.coordinator_address, CaseRunnerSetting.shard_authkey)
+        except (EOFError, OSError) as ex:
+            self.logger.error(f"连接协调器{self.coordinator_address}失败: {ex}")
+            return
+        try:
+            while True:
+                conn.send(("next",))
+                message = conn.recv()
+                if message[0] == "done":
+                    break
+                if message[0] == "wait":
+                    time.sleep(CaseRunnerSetting.shard_poll_interval)
+                    continue
+                _, key, case_result = message
+                # 其他测试机上已经完成的测试用例结果, 用于前置条件的判断
+                self.case_result.update(case_result)
+                test = descriptors[key]
+                reporter = self.result_report.fork()
+                self.__run_test(test, reporter)
+                # 先合并到本机的测试报告, 传回失败时本机仍然保留执行结果
+                nodes = [child.to_dict() for child in reporter.root.children]
+                self.result_report.merge(reporter)
+                conn.send(("result", key, self.case_result[key], nodes))
+        except (EOFError, OSError) as ex:
+            self.logger.error(f"与协调器的连接断开, 停止执行: {ex!r}")
+        finally:
+            conn.close()
+
     def __run_test_list(self, testlist):
         """
         递归执行子测试列表
@@ -353,18 +663,15 @@ class CaseRunner:
         self.result_report.add_list(testlist['list_name'])
 
         # 执行子测试用例
-        for test in testlist['test_cases']:
-            test["case"].get_setting(test["setting_path"], test["setting_file"])
-            # 1. 为每个测试用例注册一个日志实例, 输出到相应的测试用例目录中
-            self.result_report.case_logger = self.__get_case_log(test['log_path'], test['case_name'])
-            # 2. 测试结果初始化
-            self.case_result[test["case_name"]] = {'priority': test["case"].priority,
-                                                   'result': False}
-            # 3. 执行测试用例生命周期管理
-            self.run_case_lcm(test['case'])
-            self.result_report.case_logger = None
-            # 4. 释放用例的日志文件
-            logger.unregister(test['case_name'])
+        if CaseRunnerSetting.max_workers > 1:
+            self.__run_cases_parallel(testlist['test_cases'])
+        else:
+            for test in testlist['test_cases']:
+                if "case_class" not in test:  # 导入失败的测试用例
+                    continue
+                reporter = self.result_report.fork()
+                self.__run_test(test, reporter)
+                self.result_report.merge(reporter)
 
         # 递归调用子测试用例
         for test_list in testlist['sub_list']:
@@ -372,67 +679,258 @@ class CaseRunner:
 
         self.result_report.end_list()
 
-    def __run_case(self, test: TestCaseBase):
+    # =====================================
+    # 测试用例的并行执行:
+    #   1. 相互独立的测试用例(没有前置测试用例, 也不依赖高优先级测试用例的结果)提交到线程池中并发执行
+    #   2. 每个测试用例使用独立的测试报告(fork)和测试用例日志, 执行完毕后按测试列表的顺序合并回主测试报告
+    #   3. 有依赖的测试用例作为屏障, 等待之前提交的测试用例全部执行完毕后再执行
+    #   4. 两个屏障之间的测试用例按照测试列表的排序策略提交, 合并时仍按测试列表的顺序
+    # =====================================
+    def __run_cases_parallel(self, test_cases):
         """
-        测试用例执行线程
-            1. 执行collect_resource方法,使用ResourcePool实例提供资源
-                    资源满足: 继续
-                    不满足: 捕获异常
-            2. 执行后续方法, 主线程使用join等待线程执行完毕
-            3. 发送中止信号给逻辑模块装载线程
+        使用线程池并行执行测试列表中的测试用例
+        @param test_cases: 测试用例描述列表
+        @return:
         """
-        self.result_report.add_test(test.__class__.__name__)
-        _continue = True
+        with ThreadPoolExecutor(max_workers=CaseRunnerSetting.max_workers) as executor:
+            batch = list()
+            for test in test_cases:
+                if "case_class" not in test:  # 导入失败的测试用例
+                    continue
+                reporter = self.result_report.fork()
+                if self.__is_independent(test["case_class"]):
+                    batch.append((test, reporter))
+                    continue
+                # 有依赖关系的测试用例, 需要等待之前的测试用例执行完毕
+                self.__merge_results(self.__submit_cases(executor, batch))
+                batch = list()
+                self.__run_test(test, reporter)
+                self.result_report.merge(reporter)
+            self.__merge_results(self.__submit_cases(executor, batch))
+
+    def __submit_cases(self, executor, batch):
+        """
+        按照排序策略将相互独立的测试用例提交到线程池
+        @param batch: (测试用例描述, 测试报告)的列表
+        @return: 按测试列表顺序排列的(future, reporter)列表
+        """
+        futures = dict()
+        for test, reporter in self.__order_cases(batch, lambda item: item[0]["case_class"]):
+            futures[id(reporter)] = executor.submit(self.__run_test, test, reporter)
+        return [(futures[id(reporter)], reporter) for _, reporter in batch]
 
-        # 收集资源, 资源收集失败则返回
+    def __merge_results(self, pending):
+        """
+        按照提交的顺序等待测试用例执行完毕, 并将其结果合并到主测试报告
+        @param pending: (future, reporter)的列表
+        """
+        for future, reporter in pending:
+            future.result()
+            self.result_report.merge(reporter)
+
+    # =====================================
+    # 基于依赖关系图的调度:
+    #   1. 根据pre_tests和priority为整个测试用例树建立依赖关系图(CaseGraph)
+    #   2. 不满足测试类型和优先级的测试用例, 以及前驱节点失败的测试用例, 在执行之前就被剪枝
+    #   3. 前驱节点全部执行完毕的测试用例立即分发到线程池中执行
+    #   4. 全部执行完毕后, 按照测试列表的顺序将各测试用例的结果合并到主测试报告
+    # =====================================
+    def __run_case_graph(self):
+        """
+        按照依赖关系图调度执行整个测试用例树
+        """
+        graph = CaseGraph(self.case_tree)
+        reporters = dict()  # 测试用例描述的id -> 记录该测试用例结果的测试报告
+        static_conditions = self.__init_static_precondition()
+        for node in graph.nodes:
+            # 判断的过程只在不满足条件时保留, 满足条件的测试用例在执行时还会完整地判断一次
+            reporter = self.result_report.fork()
+            reason = self.__pre_check(node.descriptor['case_class'], static_conditions, reporter)
+            if reason is None:
+                reporter = self.result_report.fork()
+            else:
+                graph.skip(node, reason)
+            reporters[id(node.descriptor)] = reporter
+
+        with ThreadPoolExecutor(max_workers=CaseRunnerSetting.max_workers) as executor:
+            running = dict()
+            ready = graph.ready_nodes()
+            while ready or running:
+                for node in self.__order_cases(ready, lambda item: item.descriptor['case_class']):
+                    future = executor.submit(self.__run_test, node.descriptor, reporters[id(node.descriptor)])
+                    running[future] = node
+                ready = list()
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ready.extend(graph.finish(running.pop(future), future.result()))
+
+        # 记录被剪枝的测试用例
+        graph.unfinished_nodes()
+        for node in graph.nodes:
+            if node.state == CaseState.SKIPPED:
+                self.__skip_test(node, reporters[id(node.descriptor)])
+        self.__merge_test_list(self.case_tree, reporters)
+
+    def __skip_test(self, node, reporter: ResultReporter):
+        """
+        记录没有执行的测试用例, 前置条件判断时已经记录了判断过程的不再重复记录
+        @param node: 被剪枝的依赖关系图节点
+        @param reporter: 记录该测试用例结果的测试报告
+        """
+        case_class = node.descriptor['case_class']
+        if node.reason and not reporter.root.children:
+            reporter.add(StepResult.INFO, node.reason)
+            reporter.add(StepResult.INFO, f"{case_class.__name__}不能执行！")
+        self.case_result[node.descriptor['case_key']] = {'case_name': node.name,
+                                                        'priority': case_class.priority,
+                                                        'result': False}
+
+    def __merge_test_list(self, testlist, reporters):
+        """
+        按照测试列表的顺序, 递归地将测试用例的结果合并到主测试报告
+        @param testlist: 测试用例树的节点
+        @param reporters: 测试用例描述的id -> 测试报告
+        """
+        self.result_report.add_list(testlist['list_name'])
+        for test in testlist['test_cases']:
+            if id(test) in reporters:
+                self.result_report.merge(reporters[id(test)])
+        for test_list in testlist['sub_list']:
+            self.__merge_test_list(test_list, reporters)
+        self.result_report.end_list()
+
+    @staticmethod
+    def __is_independent(test: TestCaseBase):
+        """
+        判断测试用例是否可以与其他测试用例并行执行
+        """
+        return not any(test.pre_tests) and not test.skip_if_high_priority_failed
+
+    def __run_test(self, test, reporter: ResultReporter):
+        """
+        执行测试列表中的一个测试用例
+        @param test: 测试用例描述字典
+        @param reporter: 记录该测试用例结果的测试报告
+        @return: 测试用例是否执行通过
+        """
+        reporter.list_path = test['list_path']  # 测试用例在fork产生的测试报告中执行, 按测试列表的路径加入索引
+        record = self.checkpoint.get(test['case_key'])
+        if record is not None:
+            return self.__restore_test(record, reporter)
+        case_class = test['case_class']
+        case_key = test['case_key']
+        # 1. 为每个测试用例注册一个日志实例, 输出到相应的测试用例目录中
+        case_logger = self.__get_case_log(test)
+        reporter.case_logger = case_logger
+        # 2. 测试结果初始化, 按测试用例的键记录, 同一个测试用例的多次执行互不覆盖
+        self.case_result[case_key] = {'case_name': test['case_name'],
+                                      'priority': case_class.priority,
+                                      'result': False}
+        case_node = None
         try:
-            self.result_report.add_step_group("收集测试资源")
-            test.collect_resource(self.resource_pool)
-        except ResourceNotMeetConstraintError as rnmce:
-            self.result_report.add(StepResult.EXCEPTION, "测试资源不满足条件", str(rnmce))
-            _continue = False
-        except Exception as e:
-            self.result_report.add(StepResult.EXCEPTION, "捕获异常！", str(e))
-            _continue = False
+            # 3. 前置条件判断通过后才实例化测试用例, 执行测试用例生命周期管理, 执行完毕后不再持有测试用例实例
+            passed = False
+            if self.__pre_check(case_class, self.__init_precondition(case_class), reporter) is None:
+                case = case_class(reporter)
+                case.get_setting(test["setting_path"], test["setting_file"])
+                case.logger = case_logger
+                passed = self.__execute_case(case, reporter)
+                self.case_result[case_key]['result'] = passed
+                # 本次执行的测试用例节点在fork产生的测试报告的根节点下
+                case_node = next((child for child in reversed(reporter.root.children)
+                                  if child.type == NodeType.Case), None)
+            # 4. 记录检查点
+            self.checkpoint.record(case_key, test['case_name'], self.case_result[case_key],
+                                   [child.to_dict() for child in reporter.root.children])
+            return passed
         finally:
-            self.result_report.end_step_group()
-        if not _continue:
-            self.result_report.end_test()
-            return
-        # 执行SETUP
-        try:
-            self.result_report.add_step_group("SETUP")
-            test.setup()
-            self.result_report.end_step_group()
-        except Exception as e:
-            self.result_report.add(StepResult.EXCEPTION, "捕获异常!", str(e))
-            self.result_report.end_step_group()
-            self.__call_cleanup(test)
-            return
-        # 执行TEST
-        try:
-            self.result_report.add_step_group("TEST")
-            test.test()
-            self.result_report.end_step_group()
-        except Exception as e:
-            self.result_report.add(StepResult.EXCEPTION, "捕获异常!", str(e))
-            self.result_report.end_step_group()
-            self.__call_cleanup(test)
-            return
-        # 执行CLEANUP
-        self.__call_cleanup(test)
+            reporter.case_logger = None
+            # 5. 释放用例的日志文件, 执行结果为失败或异常时写入环形缓冲区中的DEBUG日志, 前置条件不满足时不写入
+            logger.unregister(self.__case_log_name(test), dump=case_node is not None and
+                              case_node.status in (StepResult.FAIL, StepResult.EXCEPTION))
 
-    def __call_cleanup(self, test: TestCaseBase):
+    def __restore_test(self, record, reporter: ResultReporter):
         """
-        执行清除操作
+        从检查点恢复已经执行完毕的测试用例的结果
+        @param record: 检查点记录
+        @param reporter: 记录该测试用例结果的测试报告
+        @return: 测试用例是否执行通过
+        """
+        for node in record['nodes']:
+            reporter.attach(ResultNode.from_dict(node))
+        self.case_result[record['key']] = dict(record['case_result'], case_name=record['case_name'])
+        return record['case_result']['result']
+
+    def __run_case(self, test: TestCaseBase, reporter: ResultReporter):
         """
+        执行测试用例的各个阶段(collect_resource -> setup -> test -> cleanup), 并记录执行结果
+            thread: 在当前线程中执行
+            process: 在独立的测试用例进程中执行, 超时或崩溃只会终止该进程
+        """
+        timeouts = {"SETUP": CaseRunnerSetting.setup_timeout,
+                    "TEST": CaseRunnerSetting.test_timeout,
+                    "CLEANUP": CaseRunnerSetting.cleanup_timeout}
+        start_time = time.monotonic()
+        if self.test_list.setting.max_retries > 0:
+            passed = self.__run_case_attempts(test, reporter, timeouts)
+        else:
+            passed = self.__run_case_once(test, reporter, timeouts)
+        self.history.record(test, time.monotonic() - start_time)
+        return passed
+
+    def __run_case_once(self, test: TestCaseBase, reporter: ResultReporter, timeouts):
+        if CaseRunnerSetting.isolation == "process":
+            return self.process_executor.run(test, reporter, self.resource_pool, CaseRunnerSetting.case_timeout,
+                                             timeouts)
+        return run_case_phases(test, reporter, self.resource_pool, timeouts=timeouts)
+
+    # =====================================
+    # 测试用例的重试:
+    #   1. 每次执行使用独立的测试报告(fork), 执行结果为异常(EXCEPTION, 包括超时)或停止(STOP)时重试,
+    #      retry_on_fail为True时测试点失败(FAIL)也重试
+    #   2. 单个测试用例最多重试max_retries次, 整个测试列表最多重试retry_budget次
+    #   3. 只执行了一次时, 结果与不重试时相同; 重试过的测试用例, 每次执行的结果作为测试用例节点的子节点,
+    #      测试用例的状态和case_result取最后一次执行的结果
+    # =====================================
+    def __run_case_attempts(self, test: TestCaseBase, reporter: ResultReporter, timeouts):
+        """
+        执行测试用例, 不成功时按照测试列表的重试策略重新执行
+        @return: 最后一次执行是否通过
+        """
+        attempts = list()
+        passed = False
         try:
-            self.result_report.add(StepResult.INFO, "CLEANUP")
-            test.cleanup()
-        except Exception as e:
-            self.result_report.add(StepResult.EXCEPTION, "EXCEPTION!", str(e))
+            while True:
+                attempt_reporter = reporter.fork()
+                attempt_reporter.case_logger = reporter.case_logger
+                test.reporter = attempt_reporter
+                passed = self.__run_case_once(test, attempt_reporter, timeouts)
+                attempts.extend(attempt_reporter.root.children)
+                status = attempts[-1].status if any(attempts) else StepResult.INFO
+                if passed or len(attempts) > self.test_list.setting.max_retries or \
+                        not self.__need_retry(status) or not self.__acquire_retry():
+                    break
+                self.logger.info(f"{test.__class__.__name__}执行结果为{status.name}, 进行第{len(attempts)}次重试")
         finally:
-            self.result_report.pop()
-            self.case_result[test.__class__.__name__]['result'] = \
-                self.result_report.recent_case.status == StepResult.PASS
-            self.result_report.end_test()
+            test.reporter = reporter
+        if len(attempts) == 1:
+            reporter.attach(attempts[0])
+        elif any(attempts):
+            reporter.attach_attempts(test.__class__.__name__, attempts)
+        return passed
+
+    def __need_retry(self, status):
+        if status in [StepResult.EXCEPTION, StepResult.STOP]:
+            return True
+        return status == StepResult.FAIL and self.test_list.setting.retry_on_fail
+
+    def __acquire_retry(self):
+        """
+        从整个测试列表的重试次数中申请一次重试
+        @return: 是否还有剩余的重试次数
+        """
+        with self.retry_lock:
+            if 0 < self.test_list.setting.retry_budget <= self.retry_count:
+                return False
+            self.retry_count += 1
+            return True
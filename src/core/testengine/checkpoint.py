@@ -0,0 +1,79 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/27 0027 15:02
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: checkpoint.py
+
+"""
+    测试执行的检查点: 每个测试用例执行完毕后追加记录其结果, 进程异常退出后可以从检查点继续执行
+"""
+
+# =====================================
+# 检查点文件
+#   1. 存放在本次执行的测试用例日志目录中(checkpoint.jsonl), 每行一个json对象
+#   2. 每条记录包含测试用例的键(测试列表路径#序号)、case_result中的记录以及结果子树
+#   3. 只追加不修改, 每次写入后调用fsync, 进程在任意时刻退出最多丢失正在写入的一行
+#
+# 继续执行
+#   已经有记录的测试用例不再执行, 直接将记录中的结果子树合并回测试报告
+# =====================================
+import json
+import os
+import threading
+
+from core.tool.file_tool import FileTool
+
+
+class CaseCheckpoint:
+    """
+    测试用例检查点日志
+    """
+    file_name = "checkpoint.jsonl"
+
+    def __init__(self, run_dir):
+        """
+        @param run_dir: 本次执行的测试用例日志目录
+        """
+        self.filename = os.path.join(run_dir, self.file_name)
+        self.records = dict()  # 测试用例的键 -> 检查点记录
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        读取已有的检查点记录, 忽略最后一行没有写完整的记录
+        """
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.records[record['key']] = record
+
+    def get(self, key):
+        """
+        @return: 测试用例的检查点记录, 没有执行完毕时返回None
+        """
+        return self.records.get(key)
+
+    def record(self, key, case_name, case_result, nodes):
+        """
+        追加一个测试用例的执行结果
+        @param key: 测试用例的键
+        @param case_name: 测试用例名称
+        @param case_result: 该测试用例在case_result中的记录
+        @param nodes: 该测试用例的结果子树(ResultNode.to_dict的列表)
+        """
+        record = {"key": key, "case_name": case_name, "case_result": case_result, "nodes": nodes}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            FileTool.check_and_create_directory(self.filename)
+            with open(self.filename, mode="a", encoding="utf-8") as file:
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+            self.records[key] = record
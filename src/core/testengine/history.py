@@ -0,0 +1,113 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/27 0027 10:18
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: history.py
+
+"""
+    测试用例的历史执行时间: 记录每个测试用例以往的执行耗时, 用于并行执行时的排序
+"""
+
+# =====================================
+# 存储方式
+#   1. 以测试用例ID(testcase_id)为键, 没有ID时使用测试用例类的完整路径
+#   2. 耗时使用指数加权平均, 最近的执行结果占更大的比重
+#   3. 整个测试用例树执行完毕后一次性写回json文件
+#
+# LPT(longest processing time first)排序
+#   有历史记录的测试用例按耗时从长到短排在前面, 没有历史记录的测试用例按优先级排在后面,
+#   使耗时最长的测试用例最先开始执行, 缩短所有线程中最后一个测试用例的等待时间
+# =====================================
+import json
+import os
+import threading
+
+from core.tool.file_tool import FileTool
+
+
+class CaseHistory:
+    """
+    测试用例历史执行时间
+    """
+    alpha = 0.3  # 指数加权平均中最近一次耗时的权重
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = dict()  # 测试用例键 -> {"duration": 平均耗时(秒), "runs": 执行次数}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def case_key(test):
+        """
+        获取测试用例在历史记录中的键
+        @param test: 测试用例实例或测试用例类
+        """
+        case_class = test if isinstance(test, type) else type(test)
+        testcase_id = getattr(case_class, "testcase_id", None)
+        if testcase_id:
+            return str(testcase_id)
+        return f"{case_class.__module__}.{case_class.__qualname__}"
+
+    def load(self):
+        """
+        读取历史记录, 文件不存在或损坏时从空记录开始
+        """
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, encoding="utf-8") as file:
+                self.records = json.load(file)
+        except (OSError, ValueError):
+            self.records = dict()
+
+    def save(self):
+        """
+        保存历史记录, 先写入临时文件再替换, 避免中途退出时损坏原有记录
+        """
+        FileTool.check_and_create_directory(self.filename)
+        temp_file = self.filename + ".tmp"
+        with self._lock:
+            with open(temp_file, mode="w", encoding="utf-8") as file:
+                json.dump(self.records, file, indent=4, ensure_ascii=False)
+        os.replace(temp_file, self.filename)
+
+    def estimate(self, test):
+        """
+        获取测试用例的预计耗时
+        @return: 预计耗时(秒), 没有历史记录时返回None
+        """
+        record = self.records.get(self.case_key(test))
+        return None if record is None else record["duration"]
+
+    def record(self, test, duration):
+        """
+        记录测试用例本次的执行耗时
+        @param test: 测试用例实例
+        @param duration: 耗时(秒)
+        """
+        key = self.case_key(test)
+        with self._lock:
+            record = self.records.get(key)
+            if record is None:
+                self.records[key] = {"duration": duration, "runs": 1}
+            else:
+                record["duration"] = self.alpha * duration + (1 - self.alpha) * record["duration"]
+                record["runs"] += 1
+
+    def lpt_order(self, tests, case_of=lambda test: test):
+        """
+        按照LPT的顺序排列测试用例, 排序是稳定的
+        @param tests: 待排序的列表
+        @param case_of: 从列表元素中获取测试用例实例的方法
+        @return: 排序后的新列表
+        """
+        def sort_key(item):
+            test = case_of(item)
+            duration = self.estimate(test)
+            if duration is None:
+                return 1, test.priority, 0
+            return 0, 0, -duration
+
+        return sorted(tests, key=sort_key)
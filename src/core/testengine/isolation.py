@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/26 0026 21:40
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: isolation.py
+
+"""
+    测试用例的进程隔离: 每个测试用例在独立的进程中执行, 内存泄漏或卡死只影响该进程
+"""
+
+# =====================================
+# 执行方式
+#   1. 优先使用forkserver: 进程服务预先导入重量级的模块(paramiko, selenium, 产品包和测试用例模块),
+#      测试用例进程由进程服务派生, 不需要重复导入; 不支持forkserver的平台(Windows)退化为spawn
+#   2. 测试用例进程通过管道实时传回执行阶段、日志和结果节点, 由执行器合并到测试报告
+#      结果节点以事件日志的记录(新建、结束)逐条传回, 执行器立即重放到测试报告,
+#      因此测试用例进程超时或崩溃时, 已经执行的步骤仍然保留, 失败原因记录在最后一个没有结束的节点下
+#   3. 执行器按照墙上时间判断超时, 超时后只终止该测试用例进程, 测试引擎继续执行后续测试用例
+#   4. 启动进程时需要pickle测试资源池等参数, 启动失败(如资源池不能被pickle)时只记录该测试用例异常
+#
+# 管道消息格式
+#   ("phase", 阶段名称)
+#   ("log", 日志等级, 日志内容)
+#   ("event", 操作, 序号, 父节点序号, 节点类型, 节点状态, 标题, 内容, 时间戳纳秒, 是否打开), 与事件日志的记录相同
+#   ("result", 是否通过)
+#   ("error", 异常信息)
+# =====================================
+import importlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+
+from core.result.eventlog import EventLog, OP_NODE, OP_END, OP_ATTACH
+from core.result.reporter import ResultReporter, ResultNode, StepResult, NodeType
+from core.testengine.lifecycle import run_case_phases
+
+
+class _PipeSender:
+    """
+    测试用例进程中多个线程(测试线程, 看门狗线程)共用管道的发送端, 每条消息完整发送
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.conn.send(message)
+
+
+class _PipeEventLog(EventLog):
+    """
+    测试用例进程中测试报告的事件日志, 记录通过管道发送给执行器
+    """
+
+    def __init__(self, sender):
+        # 不打开文件, 只使用EventLog的序号管理
+        self.sender = sender
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._open_nodes = dict()
+
+    def add_node(self, node, is_open=False):
+        """
+        记录新建的节点, 同时发送是否还会添加子节点, 执行器据此判断节点是否已经结束
+        """
+        with self._lock:
+            self._seq += 1
+            parent = self._seq_of(node.parent)
+            if is_open:
+                self._open_nodes[id(node)] = (self._seq, node)
+            self._send(OP_NODE, self._seq, parent, int(node.type), int(node.status), str(node.header),
+                       str(node.message), node.timestamp_ns, is_open)
+
+    def _write(self, op, seq, parent, node_type, status, header, message, timestamp_ns=None):
+        self._send(op, seq, parent, node_type, status, header, message, timestamp_ns)
+
+    def _send(self, op, seq, parent, node_type, status, header, message, timestamp_ns=None, is_open=False):
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        self.sender.send(("event", op, seq, parent, node_type, status, header, message, timestamp_ns, is_open))
+
+    def close(self):
+        with self._lock:
+            self._open_nodes.clear()
+
+
+class _ResultReplayer:
+    """
+    将测试用例进程传回的事件重放到执行器的测试报告
+    """
+
+    def __init__(self, reporter: ResultReporter):
+        self.reporter = reporter
+        self.target = reporter.recent_node  # 测试用例进程中的根节点对应的节点
+        self.nodes = dict()  # 测试用例进程中的节点序号 -> 测试报告中的节点
+        self.open_nodes = dict()  # 还没有结束的节点, 按添加的顺序
+
+    def replay(self, op, seq, parent, node_type, status, header, message, timestamp_ns, is_open):
+        if op == OP_NODE:
+            if parent == 0:
+                self.nodes[seq] = self.target
+                return
+            node = self.reporter.replay_node(self.nodes.get(parent, self.target), header, message,
+                                             StepResult(status), NodeType(node_type), timestamp_ns, is_open)
+            if is_open:
+                self.nodes[seq] = node
+                self.open_nodes[seq] = node
+        elif op == OP_END:
+            node = self.nodes.pop(seq, None)
+            if node is None or node is self.target:
+                return
+            self.reporter.replay_end(node, timestamp_ns)
+            # 结束的节点之下仍然打开的节点随之结束
+            for key, open_node in list(self.open_nodes.items()):
+                current = open_node
+                while current is not None and current is not node:
+                    current = current.parent
+                if current is node:
+                    del self.open_nodes[key]
+                    self.nodes.pop(key, None)
+        elif op == OP_ATTACH:
+            with self.reporter.context(self.nodes.get(parent, self.target)):
+                self.reporter.attach(ResultNode.from_dict(json.loads(message)))
+
+    @property
+    def recent_open_node(self):
+        """
+        最后添加的还没有结束的节点, 没有时为None
+        """
+        return next(reversed(self.open_nodes.values()), None)
+
+
+class _PipeLogHandler(logging.Handler):
+    """
+    将测试用例进程中的日志通过管道发送给执行器
+    """
+
+    def __init__(self, sender):
+        super().__init__()
+        self.sender = sender
+
+    def emit(self, record):
+        try:
+            self.sender.send(("log", record.levelno, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+def _case_process_main(conn, case_path, setting_args, resource_pool, timeouts=None):
+    """
+    测试用例进程的入口
+    @param conn: 发送消息的管道
+    @param case_path: 测试用例类的完整路径
+    @param setting_args: 测试用例配置的(路径, 文件名), 没有配置时为None
+    @param resource_pool: 测试资源池
+    @param timeouts: 各阶段的执行时间限制
+    """
+    sender = _PipeSender(conn)
+    log = logging.getLogger(case_path)
+    log.handlers = [_PipeLogHandler(sender)]
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    reporter = ResultReporter(log, _PipeEventLog(sender))
+    reporter.case_logger = log
+    try:
+        module_name, class_name = case_path.rsplit(".", 1)
+        test = getattr(importlib.import_module(module_name), class_name)(reporter)
+        test.logger = log
+        if setting_args is not None:
+            test.get_setting(*setting_args)
+        passed = run_case_phases(test, reporter, resource_pool,
+                                 on_phase=lambda phase: sender.send(("phase", phase)), timeouts=timeouts)
+        sender.send(("result", passed))
+    except Exception:
+        sender.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class ProcessCaseExecutor:
+    """
+    在独立进程中执行测试用例
+    """
+
+    def __init__(self, preload_modules=None):
+        """
+        @param preload_modules: 需要在进程服务中预先导入的模块, 导入失败的模块会被忽略
+        """
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload(list(preload_modules or []))
+        else:
+            self.context = multiprocessing.get_context("spawn")
+
+    def run(self, test, reporter: ResultReporter, resource_pool, timeout=0, phase_timeouts=None):
+        """
+        在新的进程中执行测试用例, 并将结果合并到测试报告
+        @param test: 执行器中的测试用例实例, 只用来获取测试用例类和配置
+        @param reporter: 记录该测试用例结果的测试报告
+        @param resource_pool: 测试资源池, 需要能够被pickle
+        @param timeout: 最长执行时间(秒), 0表示不限制
+        @param phase_timeouts: 各阶段的执行时间限制, 由测试用例进程中的看门狗线程判断
+        @return: 测试用例是否执行通过
+        """
+        case_path = f"{test.__class__.__module__}.{test.__class__.__qualname__}"
+        setting_args = None
+        if test.setting is not None:
+            setting_args = (test.setting.setting_path, test.setting.file_name)
+
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=_case_process_main,
+                                       args=(sender, case_path, setting_args, resource_pool, phase_timeouts),
+                                       name=f"Case-{test.__class__.__name__}", daemon=True)
+        try:
+            process.start()
+        except Exception:
+            receiver.close()
+            sender.close()
+            return self._record_failure(test, reporter, _ResultReplayer(reporter), None, "测试用例进程启动失败",
+                                        traceback.format_exc())
+        sender.close()  # 子进程退出后, 接收端才能收到EOF
+
+        deadline = time.monotonic() + timeout if timeout else None
+        replayer = _ResultReplayer(reporter)
+        phase = None
+        message = None
+        timed_out = False
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0 and not timed_out:
+                    process.kill()
+                    process.join()
+                    timed_out = True
+                if timed_out:
+                    remaining = 0  # 继续读取进程终止前已经发送的消息
+                if not receiver.poll(remaining):
+                    if timed_out:
+                        break
+                    continue
+                try:
+                    message = receiver.recv()
+                except EOFError:
+                    break
+                if message[0] == "phase":
+                    phase = message[1]
+                elif message[0] == "log":
+                    if reporter.case_logger is not None:
+                        reporter.case_logger.log(message[1], message[2])
+                elif message[0] == "event":
+                    replayer.replay(*message[1:])
+                else:
+                    break
+        finally:
+            receiver.close()
+            process.join()
+
+        if message is not None and message[0] == "result":
+            return message[1]
+        if timed_out:
+            return self._record_failure(test, reporter, replayer, phase, "测试用例执行超时",
+                                        f"超过{timeout}秒没有执行完毕, 测试用例进程已被终止")
+        if message is not None and message[0] == "error":
+            return self._record_failure(test, reporter, replayer, phase, "捕获异常!", message[1])
+        return self._record_failure(test, reporter, replayer, phase, "测试用例进程异常退出",
+                                    f"进程退出码: {process.exitcode}")
+
+    @staticmethod
+    def _record_failure(test, reporter: ResultReporter, replayer, phase, headline, message):
+        """
+        测试用例进程没有正常返回结果时, 在测试报告中记录失败的阶段和原因
+            已经传回的步骤保留, 失败原因记录在最后一个没有结束的节点下, 并结束该测试用例
+        """
+        recent_node = replayer.recent_open_node
+        if recent_node is not None:
+            with reporter.context(recent_node):
+                reporter.add(StepResult.EXCEPTION, headline, message)
+                reporter.end_test()
+            return False
+        reporter.add_test(test.__class__.__name__)
+        if phase is not None:
+            reporter.add_step_group(phase)
+        reporter.add(StepResult.EXCEPTION, headline, message)
+        reporter.end_test()
+        return False
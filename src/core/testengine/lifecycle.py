@@ -0,0 +1,230 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/26 0026 21:05
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: lifecycle.py
+
+"""
+    测试用例的生命周期: collect_resource -> setup -> test -> cleanup
+    不依赖于测试引擎的状态, 既可以在执行器线程中运行, 也可以在独立的测试用例进程中运行
+"""
+
+# =====================================
+# 执行时间限制
+#   1. @case(timeout=...)限制collect_resource, setup, test三个阶段的总执行时间
+#   2. CaseRunnerSetting中的setup_timeout, test_timeout限制单个阶段的执行时间, 两者同时设置时取剩余时间较短的一个
+#   3. cleanup使用独立的cleanup_timeout, 不受测试用例总执行时间的影响, 任何阶段(包括collect_resource)超时后都会执行
+#   4. 有时间限制的阶段在看门狗线程中执行, 超时后记录EXCEPTION节点, 不再等待该线程(线程无法被强制终止),
+#      依次执行cleanup和release_resource, 释放连接使阻塞的线程尽快退出, 然后继续执行下一个测试用例
+#   5. 超时与进程隔离执行时的超时一样记录为EXCEPTION(而不是STOP), 在JUnit报告中为error, 在结果对比中计为失败
+#   6. 超时的看门狗线程与测试报告和测试用例日志分离, 之后写入的步骤和日志全部丢弃, 不会混入后续阶段或测试用例
+# =====================================
+import logging
+import threading
+import time
+import weakref
+
+from core.case.base import TestCaseBase
+from core.resource.error import ResourceNotMeetConstraintError
+from core.result.reporter import ResultReporter, StepResult
+
+
+class CaseTimeoutError(Exception):
+    """
+    测试用例的某个阶段超过了限制的执行时间
+    """
+
+    def __init__(self, phase, timeout):
+        super().__init__(f"{phase}阶段超过{timeout:.1f}秒没有执行完毕")
+        self.phase = phase
+        self.timeout = timeout
+
+
+def run_case_phases(test: TestCaseBase, reporter: ResultReporter, resource_pool, on_phase=None, timeouts=None):
+    """
+    执行测试用例的各个阶段
+        1. 执行collect_resource方法,使用ResourcePool实例提供资源
+                资源满足: 继续
+                不满足: 捕获异常
+        2. 依次执行setup, test, 任何一个阶段发生异常都直接执行cleanup
+    @param test: 测试用例实例
+    @param reporter: 记录该测试用例结果的测试报告
+    @param resource_pool: 测试资源池
+    @param on_phase: 每个阶段开始时的回调, 参数为阶段名称
+    @param timeouts: 各阶段的执行时间限制(秒), 如{"SETUP": 60, "TEST": 600, "CLEANUP": 60}, 0或缺省表示不限制
+    @return: 测试用例是否执行通过
+    """
+    reporter.add_test(test.__class__.__name__)
+    budget = _PhaseBudget(test, timeouts)
+    _continue = True
+    timed_out = False
+
+    # 收集资源, 资源收集失败则返回, 超时则执行cleanup并释放资源
+    try:
+        _notify(on_phase, "COLLECT_RESOURCE")
+        reporter.add_step_group("收集测试资源")
+        _call_with_watchdog(reporter, lambda: test.collect_resource(resource_pool),
+                            "COLLECT_RESOURCE", budget.get("COLLECT_RESOURCE"), test.logger)
+    except CaseTimeoutError as cte:
+        reporter.add(StepResult.EXCEPTION, "执行超时", str(cte))
+        timed_out = True
+    except ResourceNotMeetConstraintError as rnmce:
+        reporter.add(StepResult.EXCEPTION, "测试资源不满足条件", str(rnmce))
+        _continue = False
+    except Exception as e:
+        reporter.add(StepResult.EXCEPTION, "捕获异常！", str(e))
+        _continue = False
+    finally:
+        reporter.end_step_group()
+    if timed_out:
+        return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"), timed_out=True)
+    if not _continue:
+        reporter.end_test()
+        return False
+    # 执行SETUP
+    try:
+        _notify(on_phase, "SETUP")
+        reporter.add_step_group("SETUP")
+        _call_with_watchdog(reporter, test.setup, "SETUP", budget.get("SETUP"), test.logger)
+        reporter.end_step_group()
+    except CaseTimeoutError as cte:
+        reporter.add(StepResult.EXCEPTION, "执行超时", str(cte))
+        reporter.end_step_group()
+        return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"), timed_out=True)
+    except Exception as e:
+        reporter.add(StepResult.EXCEPTION, "捕获异常!", str(e))
+        reporter.end_step_group()
+        return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"))
+    # 执行TEST
+    try:
+        _notify(on_phase, "TEST")
+        reporter.add_step_group("TEST")
+        _call_with_watchdog(reporter, test.test, "TEST", budget.get("TEST"), test.logger)
+        reporter.end_step_group()
+    except CaseTimeoutError as cte:
+        reporter.add(StepResult.EXCEPTION, "执行超时", str(cte))
+        reporter.end_step_group()
+        return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"), timed_out=True)
+    except Exception as e:
+        reporter.add(StepResult.EXCEPTION, "捕获异常!", str(e))
+        reporter.end_step_group()
+        return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"))
+    # 执行CLEANUP
+    return call_cleanup(test, reporter, on_phase, budget.get("CLEANUP"))
+
+
+def call_cleanup(test: TestCaseBase, reporter: ResultReporter, on_phase=None, timeout=0, timed_out=False):
+    """
+    执行清除操作
+    @param timeout: cleanup的执行时间限制(秒), 0表示不限制
+    @param timed_out: 之前的阶段是否超时, 超时的测试用例在cleanup之后还需要释放资源
+    @return: 测试用例是否执行通过
+    """
+    passed = False
+    try:
+        _notify(on_phase, "CLEANUP")
+        reporter.add(StepResult.INFO, "CLEANUP")
+        _call_with_watchdog(reporter, test.cleanup, "CLEANUP", timeout, test.logger)
+    except CaseTimeoutError as cte:
+        reporter.add(StepResult.EXCEPTION, "执行超时", str(cte))
+        timed_out = True
+    except Exception as e:
+        reporter.add(StepResult.EXCEPTION, "EXCEPTION!", str(e))
+    finally:
+        if timed_out:
+            release_resource(test, reporter)
+        reporter.pop()
+        passed = reporter.recent_case.status == StepResult.PASS
+        reporter.end_test()
+    return passed
+
+
+def release_resource(test: TestCaseBase, reporter: ResultReporter):
+    """
+    调用测试用例的release_resource方法, 释放超时的测试用例占用的资源
+    """
+    try:
+        test.release_resource()
+    except Exception as e:
+        reporter.add(StepResult.EXCEPTION, "释放测试资源失败", str(e))
+
+
+class _PhaseBudget:
+    """
+    计算每个阶段可以使用的执行时间
+    """
+
+    def __init__(self, test: TestCaseBase, timeouts=None):
+        self.timeouts = timeouts or dict()
+        case_timeout = getattr(test, "timeout", None)
+        self.deadline = time.monotonic() + case_timeout if case_timeout else None
+
+    def get(self, phase):
+        """
+        @return: 该阶段的执行时间限制(秒), 0表示不限制
+        """
+        limit = self.timeouts.get(phase) or 0
+        if self.deadline is None or phase == "CLEANUP":
+            return limit
+        remaining = max(self.deadline - time.monotonic(), 0.001)
+        return min(limit, remaining) if limit else remaining
+
+
+class _DetachedThreadFilter(logging.Filter):
+    """
+    丢弃已经超时的看门狗线程输出的日志
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.threads = weakref.WeakSet()  # 线程结束后自动移除
+
+    def filter(self, record):
+        return threading.current_thread() not in self.threads
+
+
+_detached_filter = _DetachedThreadFilter()
+
+
+def _call_with_watchdog(reporter: ResultReporter, func, phase, timeout, case_logger=None):
+    """
+    在看门狗线程中执行测试用例的一个阶段
+    @param reporter: 测试报告, 看门狗线程从调用线程当前的节点继续记录, 阻塞线程中未结束的步骤集合不影响调用线程
+    @param func: 阶段对应的方法
+    @param phase: 阶段名称
+    @param timeout: 执行时间限制(秒), 0表示不限制, 直接在当前线程中执行
+    @param case_logger: 测试用例的日志实例, 超时后丢弃看门狗线程输出的日志
+    """
+    if not timeout:
+        return func()
+    recent_node = reporter.recent_node
+    outcome = dict()
+    detached = threading.Event()
+
+    def target():
+        try:
+            with reporter.context(recent_node, detached=detached):
+                outcome['value'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, name=f"Watchdog-{phase}", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        # 线程无法被强制终止, 与测试报告和日志分离, 之后的记录全部丢弃
+        detached.set()
+        _detached_filter.threads.add(thread)
+        for log in {case_logger, reporter.case_logger, reporter.logger}:
+            if log is not None:
+                log.addFilter(_detached_filter)
+        raise CaseTimeoutError(phase, timeout)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
+
+
+def _notify(on_phase, phase):
+    if on_phase is not None:
+        on_phase(phase)
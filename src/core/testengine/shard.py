@@ -0,0 +1,313 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/27 0027 20:36
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: shard.py
+
+"""
+    测试分片: 将一个测试列表拆分到多台测试机上执行
+"""
+
+# =====================================
+# 静态分片(--shard i/N)
+#   每台测试机装载同一个测试列表, 按确定的规则只执行属于自己的测试用例, 不需要相互通信
+#   分配的单位是依赖组: 通过pre_tests(直接或间接)相互依赖的测试用例属于同一组(连通分量), 整组分配给同一个分片,
+#   因此前置测试用例总是和依赖它的测试用例在同一台测试机上执行; 没有依赖的测试用例单独一组
+#       hash: 按组中第一个测试用例的键计算crc32, 与测试用例的执行时间无关, 测试列表变化时大部分测试用例的归属不变
+#       duration: 按组的历史执行时间之和贪心地分配给当前总耗时最少的分片, 各分片的总耗时接近
+#   优先级(skip_if_high_priority_failed)只在各分片内部判断
+#
+# 动态分片(协调器)
+#   1. 协调器装载测试列表, 按依赖关系图的拓扑顺序维护待执行的测试用例队列
+#   2. 测试机通过socket向协调器领取下一个测试用例, 前驱节点没有执行完毕的测试用例暂不分发,
+#      分发时附带已经完成的测试用例结果, 测试机据此判断前置条件
+#   3. 测试机执行完毕后将case_result中的记录和结果子树发回协调器
+#   4. 所有测试用例执行完毕后, 协调器按测试列表的顺序将结果子树合并成一个测试报告
+#
+# 通信安全
+#   连接中的对象通过pickle传递, 通过认证的一方可以在对方执行任意代码, 因此:
+#   1. 必须配置只有协调器和测试机知道的认证密钥(CaseRunnerSetting.shard_authkey), 没有配置时拒绝监听和连接
+#   2. 地址没有指定主机时只监听本机(127.0.0.1), 需要其他测试机连接时显式指定监听的地址
+#
+# 通信消息(multiprocessing.connection, 对象通过pickle传递)
+#   测试机 -> 协调器: ("next",) / ("result", 测试用例的键, case_result记录, 结果子树)
+#   协调器 -> 测试机: ("case", 测试用例的键, 已完成的case_result) / ("wait",) / ("done",)
+# =====================================
+import threading
+import zlib
+from multiprocessing.connection import Listener, Client
+
+from core.result.reporter import ResultReporter, ResultNode
+from core.testengine.casegraph import CaseGraph
+
+DEFAULT_HOST = "127.0.0.1"  # 地址没有指定主机时使用的主机
+
+
+class ShardError(Exception):
+    def __init__(self, msg):
+        super().__init__(msg)
+
+
+def check_authkey(authkey):
+    """
+    检查协调器与测试机之间的认证密钥
+    @param authkey: 认证密钥(str或bytes)
+    @return: bytes形式的认证密钥
+    """
+    if isinstance(authkey, str):
+        authkey = authkey.encode("utf-8")
+    if not authkey:
+        raise ShardError("没有配置分片认证密钥(shard_authkey), 不能监听或者连接分片协调器")
+    return authkey
+
+
+def flatten_case_tree(case_tree):
+    """
+    按执行顺序展开测试用例树, 跳过导入失败的测试用例
+    @return: 测试用例描述列表
+    """
+    rv = [test for test in case_tree.get('test_cases', []) if "case_class" in test]
+    for sub_list in case_tree.get('sub_list', []):
+        rv.extend(flatten_case_tree(sub_list))
+    return rv
+
+
+def dependency_groups(case_tree):
+    """
+    按pre_tests将测试用例分组, 直接或间接相互依赖的测试用例属于同一组, 前置测试用例对应所有同名的测试用例
+    @return: 按组中第一个测试用例的顺序排列的组列表, 每组是按测试用例树的顺序排列的测试用例描述列表
+    """
+    tests = flatten_case_tree(case_tree)
+    parents = list(range(len(tests)))  # 并查集
+
+    def find(position):
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    def union(first, second):
+        first, second = find(first), find(second)
+        if first != second:
+            parents[max(first, second)] = min(first, second)  # 以顺序靠前的测试用例作为组的代表
+
+    name_index = dict()  # 测试用例名称 -> 该名称的测试用例的位置列表
+    for position, test in enumerate(tests):
+        name_index.setdefault(test['case_name'], []).append(position)
+    for position, test in enumerate(tests):
+        for pre_case in test['case_class'].pre_tests:
+            for pre_position in name_index.get(pre_case, []):
+                union(position, pre_position)
+
+    groups = dict()  # 代表的位置 -> 组
+    for position, test in enumerate(tests):
+        groups.setdefault(find(position), []).append(test)
+    return list(groups.values())
+
+
+def check_shard(index, count):
+    """
+    检查分片序号和分片数量
+    @param index: 分片序号, 从0开始
+    @param count: 分片数量
+    """
+    if count < 1 or not 0 <= index < count:
+        raise ShardError(f"分片不正确: {index}/{count}, 分片数量至少为1, 序号从0开始并且小于分片数量")
+
+
+def parse_shard(shard):
+    """
+    将分片描述"i/N"解析为(i, N)
+    """
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise ShardError(f"分片格式不正确: {shard}, 格式为i/N") from None
+    check_shard(index, count)
+    return index, count
+
+
+def hash_split(case_tree, index, count):
+    """
+    按依赖组中第一个测试用例键的crc32值分片
+    @param index: 分片序号, 从0开始
+    @param count: 分片数量
+    @return: 属于该分片的测试用例键的集合
+    """
+    check_shard(index, count)
+    return {test['case_key'] for group in dependency_groups(case_tree)
+            if zlib.crc32(group[0]['case_key'].encode("utf-8")) % count == index
+            for test in group}
+
+
+def duration_split(case_tree, index, count, history):
+    """
+    按历史执行时间均衡地分片: 依赖组按总耗时从长到短依次分配给当前总耗时最少的分片
+    没有历史记录的测试用例使用已知耗时的平均值
+    @param history: CaseHistory实例
+    @return: 属于该分片的测试用例键的集合
+    """
+    check_shard(index, count)
+    groups = dependency_groups(case_tree)
+    estimates = {test['case_key']: history.estimate(test['case_class']) for group in groups for test in group}
+    known = [duration for duration in estimates.values() if duration is not None]
+    default = sum(known) / len(known) if known else 1.0
+    durations = [sum(default if estimates[test['case_key']] is None else estimates[test['case_key']]
+                     for test in group) for group in groups]
+    # 组中第一个测试用例的键作为第二排序条件, 保证每台测试机计算出相同的分配结果
+    ordered = sorted(range(len(groups)), key=lambda position: (-durations[position], groups[position][0]['case_key']))
+    loads = [0.0] * count
+    rv = set()
+    for position in ordered:
+        shard = loads.index(min(loads))
+        loads[shard] += durations[position]
+        if shard == index:
+            rv.update(test['case_key'] for test in groups[position])
+    return rv
+
+
+def filter_case_tree(case_tree, keys):
+    """
+    生成只包含指定测试用例的测试用例树, 测试列表的结构保持不变
+    @param keys: 需要保留的测试用例键的集合
+    """
+    return {'list_name': case_tree['list_name'],
+            'test_cases': [test for test in case_tree['test_cases'] if test.get('case_key') in keys],
+            'sub_list': [filter_case_tree(sub_list, keys) for sub_list in case_tree['sub_list']]}
+
+
+def parse_address(address):
+    """
+    将"host:port"解析为(host, port), 只指定了端口("port"或":port")时主机为本机
+    """
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port)
+
+
+class ShardCoordinator:
+    """
+    动态分片的协调器
+    """
+
+    def __init__(self, case_tree, address, authkey):
+        """
+        @param case_tree: 协调器装载的测试用例树, 与测试机装载的测试列表相同
+        @param address: 监听地址(host, port)
+        @param authkey: 连接认证密钥, 不能为空
+        """
+        self.case_tree = case_tree
+        self.listener = Listener(address, authkey=check_authkey(authkey))
+        self.address = self.listener.address
+
+        graph = CaseGraph(case_tree)
+        order = graph.topological_order()
+        ordered = {id(node) for node in order}
+        self.pending = order + [node for node in graph.nodes if id(node) not in ordered]  # 处于环中的测试用例排在最后
+        # 前驱节点: 屏障节点展开为其依赖的全部测试用例
+        self.predecessors = {id(node): set() for node in graph.nodes + graph.barriers}
+        for node in graph.barriers + graph.nodes:
+            for successor in node.successors:
+                self.predecessors[id(successor)].add(node)
+        self.finished = set()  # 已经完成的节点id, 包括屏障节点
+        self.key_nodes = {node.descriptor['case_key']: node for node in graph.nodes}
+
+        self.case_result = dict()
+        self.results = dict()  # 测试用例的键 -> 结果子树
+        self._lock = threading.Lock()
+        self._all_done = threading.Event()
+        if not self.key_nodes:
+            self._all_done.set()
+
+    def serve(self):
+        """
+        接受测试机的连接并分发测试用例, 所有测试用例执行完毕后返回
+        """
+        accept_thread = threading.Thread(target=self.__accept, daemon=True)
+        accept_thread.start()
+        self._all_done.wait()
+        self.listener.close()
+
+    def __accept(self):
+        while not self._all_done.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError:  # 监听已关闭
+                return
+            threading.Thread(target=self.__serve_worker, args=(conn,), daemon=True).start()
+
+    def __serve_worker(self, conn):
+        """
+        处理一台测试机的请求, 测试机断开时将其正在执行的测试用例放回队列, 由其他测试机重新执行
+        """
+        running = None
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "next":
+                    reply = self.__next_case()
+                    running = reply[1] if reply[0] == "case" else None
+                    conn.send(reply)
+                elif message[0] == "result":
+                    self.__finish_case(*message[1:])
+                    running = None
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if running is not None:
+                with self._lock:
+                    self.pending.insert(0, self.key_nodes[running])
+
+    def __is_ready(self, node):
+        """
+        判断节点的前驱节点是否全部执行完毕, 屏障节点在其前驱节点全部完成时记为完成
+        """
+        for predecessor in self.predecessors[id(node)]:
+            if id(predecessor) in self.finished:
+                continue
+            if not predecessor.is_barrier or not self.__is_ready(predecessor):
+                return False
+            self.finished.add(id(predecessor))
+        return True
+
+    def __next_case(self):
+        with self._lock:
+            if len(self.results) == len(self.key_nodes):
+                return ("done",)
+            for node in self.pending:
+                if self.__is_ready(node):
+                    self.pending.remove(node)
+                    return "case", node.descriptor['case_key'], dict(self.case_result)
+            return ("wait",)
+
+    def __finish_case(self, key, case_result, nodes):
+        with self._lock:
+            self.case_result[key] = case_result
+            self.results[key] = nodes
+            self.finished.add(id(self.key_nodes[key]))
+            if len(self.results) == len(self.key_nodes):
+                self._all_done.set()
+
+    def merge_into(self, reporter: ResultReporter, testlist=None):
+        """
+        按照测试列表的顺序将各测试机传回的结果子树合并到测试报告
+        """
+        if testlist is None:
+            testlist = self.case_tree
+        reporter.add_list(testlist['list_name'])
+        for test in testlist['test_cases']:
+            for node in self.results.get(test.get('case_key'), []):
+                reporter.attach(ResultNode.from_dict(node))
+        for sub_list in testlist['sub_list']:
+            self.merge_into(reporter, sub_list)
+        reporter.end_list()
+
+
+def connect_coordinator(address, authkey):
+    """
+    测试机连接协调器
+    @param authkey: 连接认证密钥, 不能为空
+    @return: 连接实例
+    """
+    return Client(address, authkey=check_authkey(authkey))
@@ -69,10 +69,9 @@ class TestList:
             # 加入子列表
             for sublist in testlist_obj['sublist']:
                 full_path = os.path.join(os.path.dirname(self.filepath), sublist)
-                temp_list = TestList(full_path)
                 try:
-                    temp_list.load()
-                    self.sub_list.append(temp_list)
+                    # 实例化时已经读取了子列表, 不再重复读取
+                    self.sub_list.append(TestList(full_path))
                 except:
                     pass
 
@@ -115,6 +114,10 @@ class TestList:
         follow_priority = True  # 测试用例不按照优先级来执行
         run_type = TestType.ALL  # 测试类型标识符, 该字段与[测试用例类型]字段进行"与"操作, 若为0, 则跳过测试用例的执行
         priority_to_run = []  # 指定运行哪些优先级的测试用例
+        order_policy = "file"  # 并行执行时的排序策略: file-按测试列表顺序, lpt-按历史耗时从长到短, 没有历史记录的按优先级
+        max_retries = 0  # 单个测试用例执行不成功时的最大重试次数, 0表示不重试
+        retry_budget = 0  # 整个测试列表的重试总次数, 0表示不限制
+        retry_on_fail = False  # 测试点失败(FAIL)时是否重试, 否则只重试异常(EXCEPTION, 包括超时)和停止(STOP)的测试用例
 
 
 if __name__ == "__main__":
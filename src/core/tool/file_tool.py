@@ -4,6 +4,7 @@
 # @Author: yangxin
 # @Email: 2827709585@qq.com
 # @File: file_tool.py
+import hashlib
 import os
 import zipfile
 
@@ -53,6 +54,50 @@ class FileTool(object):
                 os.rmdir(path)
         zip.close()
 
+    @staticmethod
+    def archive_directory(dir_path, output_file, compression=zipfile.ZIP_DEFLATED, skip_prefix=None):
+        """
+        将目标文件夹压缩成zip包并且输出到output_file, 压缩成功后再删除被压缩的文件
+            1. 文件逐块读取压缩, 占用的内存与文件大小无关
+            2. 先写入output_file.part, 完成后重命名, 因此output_file总是完整的
+            3. 同时生成output_file.sha256校验文件, 格式与sha256sum相同
+        @param compression: zipfile的压缩方式, 默认使用DEFLATED;
+                            ZIP_LZMA的压缩包更小, 但很多解压工具无法打开, 需要时显式指定
+        @param skip_prefix: 文件名以此开头的文件(例如之前生成的压缩包和校验文件)不压缩也不删除
+        @return: zip包的sha256
+        """
+        temp_file = output_file + ".part"
+        checksum_file = output_file + ".sha256"
+        archived = list()
+        with zipfile.ZipFile(temp_file, "w", compression) as zip_file:
+            for path, dirnames, filenames in os.walk(dir_path):
+                target_path = os.path.relpath(path, dir_path)
+                for filename in filenames:
+                    source = os.path.join(path, filename)
+                    # 跳过本身文件, 正在生成的其他压缩包以及之前生成的压缩包
+                    if source in (output_file, checksum_file) or filename.endswith(".part") or \
+                            (skip_prefix and filename.startswith(skip_prefix)):
+                        continue
+                    zip_file.write(source, os.path.normpath(os.path.join(target_path, filename)))
+                    archived.append(source)
+
+        sha256 = hashlib.sha256()
+        with open(temp_file, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        os.replace(temp_file, output_file)
+        with open(checksum_file, "w") as file:
+            file.write(f"{digest}  {os.path.basename(output_file)}\n")
+
+        # 删除源文件以及清空后的子文件夹
+        for source in archived:
+            os.remove(source)
+        for path, dirnames, filenames in os.walk(dir_path, topdown=False):
+            if path != dir_path and not os.listdir(path):
+                os.rmdir(path)
+        return digest
+
     @staticmethod
     def check_and_create_directory(filename):
         """
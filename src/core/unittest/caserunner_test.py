@@ -0,0 +1,444 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/01 0001 11:05
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: caserunner_test.py
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import pytest
+
+from core.case.base import TestCaseBase
+from core.case.decorator import case
+from core.result.logger import logger
+from core.result.reporter import StepResult, NodeType
+from core.resource.pool import ResourcePool
+from core.testengine.caserunner import CaseRunner
+from core.testengine.checkpoint import CaseCheckpoint
+from core.testengine.shard import ShardCoordinator, ShardError, connect_coordinator
+from core.testengine.testlist import TestList
+
+
+# =====================================
+# 测试用的测试用例, 测试列表中以本模块的路径引用
+# =====================================
+class DemoCase(TestCaseBase):
+    delay = 0.3
+    outcome = StepResult.PASS
+    executed = list()  # 执行过的测试用例名称
+
+    def collect_resource(self, pool):
+        pass
+
+    def setup(self):
+        self.reporter.add(StepResult.INFO, "setup")
+
+    def test(self):
+        DemoCase.executed.append(type(self).__name__)
+        self.logger.debug(f"{type(self).__name__} debug")
+        module_logger.info(f"{type(self).__name__} running")
+        time.sleep(self.delay)
+        self.reporter.add(self.outcome, f"{type(self).__name__} step")
+
+    def cleanup(self):
+        pass
+
+
+@case(priority=1)
+class CaseA(DemoCase):
+    pass
+
+
+@case(priority=1)
+class CaseB(DemoCase):
+    pass
+
+
+@case(priority=2)
+class CaseFail(DemoCase):
+    outcome = StepResult.FAIL
+
+
+@case(priority=2, pre_tests=["CaseFail"])
+class CaseAfterFail(DemoCase):
+    pass
+
+
+@case(priority=3, pre_tests=["CaseA"])
+class CaseAfterA(DemoCase):
+    pass
+
+
+@case(priority=1)
+class CaseFlaky(DemoCase):
+    """
+    第一次执行失败, 之后执行通过
+    """
+    delay = 0
+
+    def test(self):
+        self.outcome = StepResult.FAIL if "CaseFlaky" not in DemoCase.executed else StepResult.PASS
+        super().test()
+
+
+module_logger = logging.getLogger("DemoModule")  # 注册为for_test的模块日志之前, 只输出到logging
+
+
+def case_path(case_class):
+    return f"{__name__}.{case_class.__name__}"
+
+
+@pytest.fixture
+def module_log(tmp_path):
+    """
+    一个输出到测试用例目录的模块日志
+    """
+    global module_logger
+    module_logger = logger.register("DemoModule", filename=str(tmp_path / "module.log"), console=False,
+                                    for_test=True)
+    yield logger.logger_info["DemoModule"]
+    logger.unregister("DemoModule")
+
+
+@pytest.fixture(autouse=True)
+def clear_executed():
+    DemoCase.executed.clear()
+
+
+def load(test_list_file):
+    runner = CaseRunner()
+    runner.resource_pool = ResourcePool()
+    runner.set_test_list(TestList(test_list_file))
+    return runner
+
+
+def run(runner_setting, make_test_list, cases, sub_lists=()):
+    runner = load(make_test_list(cases, sub_lists))
+    runner.start()
+    runner.wait_for_test_done()
+    return runner
+
+
+def serve_coordinator(runner_setting, test_list_file):
+    """
+    在后台线程中启动分片协调器
+    @return: 协调器实例, 执行协调器的线程
+    """
+    coordinator = ShardCoordinator(load(test_list_file).case_tree, ("127.0.0.1", 0),
+                                   runner_setting.shard_authkey.encode("utf-8"))
+    thread = threading.Thread(target=coordinator.serve, daemon=True)
+    thread.start()
+    return coordinator, thread
+
+
+def case_results(case_result):
+    """
+    @return: 测试用例名称 -> 是否通过, 同名的测试用例取最后记录的结果
+    """
+    return {value['case_name']: value['result'] for value in case_result.values()}
+
+
+def case_headers(node):
+    rv = list()
+    for child in node.children:
+        if child.type == NodeType.Case:
+            rv.append(child.header)
+        else:
+            rv.extend(case_headers(child))
+    return rv
+
+
+class TestParallelRunner:
+
+    def test_parallel_cases(self, runner_setting, make_test_list, module_log, monkeypatch):
+        """
+        并行执行时结果与串行相同, 按测试列表的顺序合并, 模块日志输出到各测试用例目录且不残留句柄
+        """
+        cases = [case_path(c) for c in (CaseA, CaseB, CaseFail, CaseAfterFail, CaseAfterA)]
+        monkeypatch.setattr(runner_setting, "max_workers", 2)
+        start = time.monotonic()
+        runner = run(runner_setting, make_test_list, cases, [[case_path(CaseA)]])
+        elapsed = time.monotonic() - start
+
+        # 前置条件不满足的测试用例只记录判断的过程
+        assert case_headers(runner.result_report.root) == ["CaseA", "CaseB", "CaseFail", "CaseAfterA", "CaseA"]
+        assert case_results(runner.case_result) == \
+               {"CaseA": True, "CaseB": True, "CaseFail": False, "CaseAfterFail": False, "CaseAfterA": True}
+        # CaseA, CaseB, CaseFail并行执行
+        assert elapsed < 5 * DemoCase.delay
+        assert module_log.get('case_targets') == {}
+        assert 'case_handler' not in module_log
+        # 测试用例日志输出到测试列表的目录中, 之后执行的测试用例重新生成模块日志
+        with open(os.path.join(runner.case_log_folder, "main", "DemoModule.log")) as file:
+            assert "CaseAfterA running" in file.read()
+        with open(os.path.join(runner.case_log_folder, "main", "sub0", "DemoModule.log")) as file:
+            assert "CaseA running" in file.read()
+
+    def test_duplicate_case(self, runner_setting, make_test_list, module_log, monkeypatch):
+        """
+        同一个测试用例在测试列表中出现两次并且并行执行, 日志不重复输出, 执行结果互不覆盖, 日志文件全部关闭
+        """
+        monkeypatch.setattr(runner_setting, "max_workers", 3)
+        monkeypatch.setattr(CaseB, "outcome", StepResult.FAIL)
+        runner = run(runner_setting, make_test_list, [case_path(c) for c in (CaseA, CaseA, CaseB)])
+
+        assert DemoCase.executed.count("CaseA") == 2
+        assert {key: value['result'] for key, value in runner.case_result.items()} == \
+               {"main#0": True, "main#1": True, "main#2": False}
+        assert case_headers(runner.result_report.root) == ["CaseA", "CaseA", "CaseB"]
+        with open(os.path.join(runner.case_log_folder, "main", "CaseA.log")) as file:
+            assert file.read().count("[Test Case] CaseA") == 2
+        with open(os.path.join(runner.case_log_folder, "main", "DemoModule.log")) as file:
+            assert file.read().count("CaseA running") == 2
+        assert logger._case_files._refs == {}
+        assert module_log.get('case_targets') == {}
+
+
+class TestCaseGraph:
+
+    def test_dag_schedule(self, runner_setting, make_test_list, monkeypatch):
+        """
+        按依赖关系图执行时, 结果与按测试列表执行相同, 没有依赖关系的测试用例并行执行
+        """
+        monkeypatch.setattr(runner_setting, "schedule_mode", "dag")
+        monkeypatch.setattr(runner_setting, "max_workers", 3)
+        cases = [case_path(c) for c in (CaseA, CaseB, CaseFail, CaseAfterFail, CaseAfterA)]
+        start = time.monotonic()
+        runner = run(runner_setting, make_test_list, cases)
+        elapsed = time.monotonic() - start
+
+        assert case_headers(runner.result_report.root) == ["CaseA", "CaseB", "CaseFail", "CaseAfterA"]
+        assert case_results(runner.case_result) == \
+               {"CaseA": True, "CaseB": True, "CaseFail": False, "CaseAfterFail": False, "CaseAfterA": True}
+        assert DemoCase.executed.index("CaseAfterA") > DemoCase.executed.index("CaseA")
+        assert elapsed < 4 * DemoCase.delay
+
+
+class TestCaseLoading:
+
+    def test_import_once(self, runner_setting, make_test_list):
+        """
+        同一个测试用例出现在多个测试列表中时只导入一次, 测试用例树中不保存实例
+        """
+        runner = load(make_test_list([case_path(CaseA), case_path(CaseB)], [[case_path(CaseA)]]))
+        assert list(runner.case_classes) == [case_path(CaseA), case_path(CaseB)]
+        main_case, sub_case = runner.case_tree['test_cases'][0], runner.case_tree['sub_list'][0]['test_cases'][0]
+        assert main_case['case_class'] is sub_case['case_class'] is CaseA
+        assert 'case' not in main_case
+        assert (main_case['list_path'], sub_case['list_path']) == ("/main", "/main/sub0")
+
+
+class TestResume:
+
+    def test_resume_from_checkpoint(self, runner_setting, make_test_list):
+        """
+        继续执行时检查点中已经执行完毕的测试用例不再执行, 结果合并回测试报告
+        """
+        test_list_file = make_test_list([case_path(c) for c in (CaseA, CaseFail, CaseAfterFail, CaseB)])
+        runner = load(test_list_file)
+        runner.start()
+        runner.wait_for_test_done()
+        # 模拟在第二个测试用例执行完毕后中断
+        checkpoint_file = os.path.join(runner.case_log_folder, CaseCheckpoint.file_name)
+        with open(checkpoint_file, encoding="utf-8") as file:
+            lines = file.readlines()
+        with open(checkpoint_file, "w", encoding="utf-8") as file:
+            file.writelines(lines[:2])
+        DemoCase.executed.clear()
+
+        resumed = load(test_list_file)
+        resumed.resume(runner.case_log_folder)
+        resumed.wait_for_test_done()
+        assert DemoCase.executed == ["CaseB"]
+        assert case_headers(resumed.result_report.root) == case_headers(runner.result_report.root)
+        assert resumed.case_result == runner.case_result
+
+
+class TestRetry:
+
+    def test_retry_flaky(self, runner_setting, make_test_list, monkeypatch):
+        runner = load(make_test_list([case_path(CaseFlaky)]))
+        monkeypatch.setattr(runner.test_list.setting, "max_retries", 2)
+        monkeypatch.setattr(runner.test_list.setting, "retry_on_fail", True)
+        runner.start()
+        runner.wait_for_test_done()
+        case_node = runner.result_report.find_case("/main/CaseFlaky")
+        assert [child.header for child in case_node.children] == ["第1次执行", "第2次执行"]
+        assert [child.status for child in case_node.children] == [StepResult.FAIL, StepResult.PASS]
+        assert case_node.status == StepResult.PASS
+        assert case_results(runner.case_result)["CaseFlaky"] is True
+
+    def test_no_retry_on_fail(self, runner_setting, make_test_list, monkeypatch):
+        """
+        默认只重试异常和超时, 测试点失败不重试
+        """
+        runner = load(make_test_list([case_path(CaseFlaky)]))
+        monkeypatch.setattr(runner.test_list.setting, "max_retries", 2)
+        runner.start()
+        runner.wait_for_test_done()
+        assert DemoCase.executed == ["CaseFlaky"]
+        assert case_results(runner.case_result)["CaseFlaky"] is False
+
+    def test_retry_budget(self, runner_setting, make_test_list, monkeypatch):
+        """
+        整个测试列表的重试次数用完后不再重试
+        """
+        runner = load(make_test_list([case_path(CaseFail), case_path(CaseFlaky)]))
+        monkeypatch.setattr(runner.test_list.setting, "max_retries", 2)
+        monkeypatch.setattr(runner.test_list.setting, "retry_budget", 2)
+        monkeypatch.setattr(runner.test_list.setting, "retry_on_fail", True)
+        monkeypatch.setattr(CaseFail, "delay", 0)
+        runner.start()
+        runner.wait_for_test_done()
+        assert DemoCase.executed == ["CaseFail"] * 3 + ["CaseFlaky"]
+        assert case_results(runner.case_result)["CaseFlaky"] is False
+
+
+class TestPlan:
+
+    def test_skip_reason(self, runner_setting, make_test_list, monkeypatch):
+        """
+        不满足优先级的测试用例记录不满足的前置条件, 依赖它的测试用例也不会执行
+        """
+        runner = load(make_test_list([case_path(c) for c in (CaseA, CaseFail, CaseAfterFail, CaseAfterA)]))
+        monkeypatch.setattr(runner.test_list.setting, "priority_to_run", [1, 3])
+        plan = runner.plan()
+        assert [item['case_name'] for item in plan['order']] == ["CaseA", "CaseAfterA"]
+        skipped = {item['case_name']: item['reason'] for item in plan['skipped']}
+        assert skipped["CaseFail"] == "测试用例的优先级必须是[1, 3]"
+        assert skipped.keys() == {"CaseFail", "CaseAfterFail"}
+
+    def test_dag_skip_reason(self, runner_setting, make_test_list, monkeypatch):
+        """
+        按依赖关系图执行时, 不满足优先级的测试用例只记录一次判断的过程
+        """
+        monkeypatch.setattr(runner_setting, "schedule_mode", "dag")
+        runner = load(make_test_list([case_path(c) for c in (CaseA, CaseFail)]))
+        monkeypatch.setattr(runner.test_list.setting, "priority_to_run", [1])
+        runner.start()
+        runner.wait_for_test_done()
+        headers = [child.header for child in runner.result_report.root.children[0].children]
+        assert headers[headers.index("CaseA") + 1:] == \
+               ["测试用例的类型必须是ALL", "测试用例的优先级必须是[1],当前测试用例优先级是2", "CaseFail不能执行！"]
+        assert case_results(runner.case_result)["CaseFail"] is False
+
+
+class TestDebugRingBuffer:
+
+    def test_dump_failed_only(self, runner_setting, make_test_list, module_log, monkeypatch):
+        """
+        只有执行失败的测试用例写入DEBUG日志, 前置条件不满足的测试用例不写入
+        """
+        monkeypatch.setattr(runner_setting, "debug_ring_buffer", 10)
+        runner = run(runner_setting, make_test_list, [case_path(c) for c in (CaseA, CaseFail, CaseAfterFail)])
+
+        def read(case_name):
+            with open(os.path.join(runner.case_log_folder, "main", f"{case_name}.log")) as file:
+                return file.read()
+
+        assert "CaseA debug" not in read("CaseA")
+        assert read("CaseFail").count("CaseFail debug") == 1
+        assert "========" not in read("CaseAfterFail")
+
+
+class TestStaticShard:
+
+    def test_shards_keep_pre_tests(self, runner_setting, make_test_list):
+        """
+        各分片分别执行, 依赖其他测试用例的测试用例与前置测试用例在同一个分片中, 不会因此被跳过
+        """
+        test_list_file = make_test_list([case_path(c) for c in (CaseA, CaseB, CaseFail, CaseAfterFail, CaseAfterA)])
+        results = dict()
+        for index in range(2):
+            runner = load(test_list_file)
+            runner.set_shard(index, 2)
+            runner.start()
+            runner.wait_for_test_done()
+            results.update(case_results(runner.case_result))
+        assert results == {"CaseA": True, "CaseB": True, "CaseFail": False, "CaseAfterFail": False,
+                           "CaseAfterA": True}
+
+    def test_invalid_shard(self, runner_setting, make_test_list):
+        runner = load(make_test_list([case_path(CaseA)]))
+        for index, count in ((3, 2), (0, 0), (-1, 2)):
+            with pytest.raises(ShardError):
+                runner.set_shard(index, count)
+
+
+class TestShardWorker:
+
+    def test_worker_with_dag(self, runner_setting, make_test_list, monkeypatch):
+        """
+        测试机按协调器的分发执行, 不受本地调度方式的影响
+        """
+        monkeypatch.setattr(runner_setting, "schedule_mode", "dag")
+        monkeypatch.setattr(runner_setting, "shard_poll_interval", 0.05)
+        test_list_file = make_test_list([case_path(c) for c in (CaseA, CaseFail, CaseAfterFail, CaseAfterA)])
+        coordinator, thread = serve_coordinator(runner_setting, test_list_file)
+        worker = load(test_list_file)
+        worker.start_worker(coordinator.address)
+        worker.wait_for_test_done()
+        thread.join(10)
+
+        assert not thread.is_alive()
+        assert sorted(coordinator.results) == ["main#0", "main#1", "main#2", "main#3"]
+        assert case_results(coordinator.case_result) == \
+               {"CaseA": True, "CaseFail": False, "CaseAfterFail": False, "CaseAfterA": True}
+
+    def test_requeue_disconnected(self, runner_setting, make_test_list, monkeypatch):
+        """
+        测试机领取测试用例后断开, 测试用例重新分发给其他测试机
+        """
+        monkeypatch.setattr(runner_setting, "shard_poll_interval", 0.05)
+        test_list_file = make_test_list([case_path(c) for c in (CaseA, CaseB)])
+        coordinator, thread = serve_coordinator(runner_setting, test_list_file)
+        lost = connect_coordinator(coordinator.address, runner_setting.shard_authkey.encode("utf-8"))
+        lost.send(("next",))
+        assert lost.recv()[:2] == ("case", "main#0")
+        lost.close()
+        worker = load(test_list_file)
+        worker.start_worker(coordinator.address)
+        worker.wait_for_test_done()
+        thread.join(10)
+
+        assert not thread.is_alive()
+        assert sorted(coordinator.results) == ["main#0", "main#1"]
+        assert case_headers(worker.result_report.root) == ["CaseA", "CaseB"]
+
+    def test_worker_without_authkey(self, runner_setting, make_test_list, monkeypatch):
+        """
+        没有配置认证密钥时不能作为测试机开始执行
+        """
+        monkeypatch.setattr(runner_setting, "shard_authkey", "")
+        worker = load(make_test_list([case_path(CaseA)]))
+        with pytest.raises(ShardError):
+            worker.start_worker(("127.0.0.1", 1))
+        assert worker.running_thread is None
+
+    def test_coordinator_lost(self, runner_setting, make_test_list, caplog):
+        """
+        协调器断开时测试机停止执行, 保留已经执行完毕的结果
+        """
+        listener = Listener(("127.0.0.1", 0), authkey=runner_setting.shard_authkey.encode("utf-8"))
+
+        def lose_after_first_case():
+            conn = listener.accept()
+            conn.recv()
+            conn.send(("case", "main#0", {}))
+            conn.close()
+            listener.close()
+
+        thread = threading.Thread(target=lose_after_first_case, daemon=True)
+        thread.start()
+        worker = load(make_test_list([case_path(c) for c in (CaseA, CaseB)]))
+        with caplog.at_level(logging.ERROR, logger="CaseRunner"):
+            worker.start_worker(listener.address)
+            worker.wait_for_test_done()
+
+        assert list(worker.case_result) == ["main#0"]
+        assert case_headers(worker.result_report.root) == ["CaseA"]
+        assert any("与协调器的连接断开" in record.getMessage() for record in caplog.records)
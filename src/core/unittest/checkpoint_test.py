@@ -0,0 +1,32 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 15:45
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: checkpoint_test.py
+import os
+
+from core.testengine.checkpoint import CaseCheckpoint
+
+
+class TestCaseCheckpoint:
+
+    def test_record_and_load(self, tmp_path):
+        checkpoint = CaseCheckpoint(str(tmp_path / "run"))
+        checkpoint.record("main#0", "CaseA", {'priority': 1, 'result': True}, [{"header": "CaseA"}])
+        checkpoint.record("main#1", "CaseB", {'priority': 1, 'result': False}, [])
+        loaded = CaseCheckpoint(str(tmp_path / "run"))
+        assert loaded.get("main#0")['case_result'] == {'priority': 1, 'result': True}
+        assert loaded.get("main#1")['case_name'] == "CaseB"
+        assert loaded.get("main#2") is None
+
+    def test_incomplete_line(self, tmp_path):
+        """
+        进程在写入时退出, 最后一行不完整的记录被忽略
+        """
+        checkpoint = CaseCheckpoint(str(tmp_path))
+        checkpoint.record("main#0", "CaseA", {'priority': 1, 'result': True}, [])
+        with open(os.path.join(str(tmp_path), CaseCheckpoint.file_name), "a", encoding="utf-8") as file:
+            file.write('{"key": "main#1", "case_na')
+        loaded = CaseCheckpoint(str(tmp_path))
+        assert list(loaded.records) == ["main#0"]
@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/01 0001 10:12
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: conftest.py
+import json
+import os
+import secrets
+import sys
+
+import pytest
+
+# 单元测试以core包的形式导入被测模块, 与start.py相同, 将src目录加入搜索路径
+package_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(package_path, "..", ".."))
+
+
+@pytest.fixture
+def make_test_list(tmp_path):
+    """
+    在临时目录中生成测试列表文件
+    """
+
+    def make(cases, sub_lists=()):
+        """
+        @param cases: 测试用例类的完整路径列表
+        @param sub_lists: 子测试列表, 每个元素是一个测试用例类的完整路径列表
+        @return: 主测试列表的文件路径
+        """
+        sub_names = list()
+        for index, sub_cases in enumerate(sub_lists):
+            sub_name = f"sub{index}.testlist"
+            with open(tmp_path / sub_name, "w") as file:
+                json.dump({"name": f"sub{index}", "description": "", "setting_path": "",
+                           "cases": sub_cases, "sublist": []}, file)
+            sub_names.append(sub_name)
+        filename = str(tmp_path / "main.testlist")
+        with open(filename, "w") as file:
+            json.dump({"name": "main", "description": "", "setting_path": "",
+                       "cases": cases, "sublist": sub_names}, file)
+        return filename
+
+    return make
+
+
+@pytest.fixture
+def runner_setting(tmp_path, monkeypatch):
+    """
+    测试引擎的日志和历史记录输出到临时目录, 分片认证密钥使用随机值
+    """
+    from core.testengine.caserunner import CaseRunnerSetting
+    monkeypatch.setattr(CaseRunnerSetting, "log_path", str(tmp_path / "ats_logs"))
+    monkeypatch.setattr(CaseRunnerSetting, "case_log", str(tmp_path / "case_logs"))
+    monkeypatch.setattr(CaseRunnerSetting, "history_file", str(tmp_path / "case_history.json"))
+    monkeypatch.setattr(CaseRunnerSetting, "shard_authkey", secrets.token_hex(16))
+    return CaseRunnerSetting
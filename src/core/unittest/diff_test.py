@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 11:10
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: diff_test.py
+import json
+import logging
+
+from core.result.diff import diff_results, load_result
+from core.result.eventlog import EventLog
+from core.result.reporter import ResultReporter, StepResult
+
+
+def make_root(cases, event_log=None):
+    """
+    @param cases: [(测试用例名称, [(步骤状态, 步骤标题)], 执行时间)]
+    """
+    reporter = ResultReporter(logging.getLogger("DiffTest"), event_log)
+    reporter.add_list("main")
+    for case_name, steps, duration in cases:
+        reporter.add_test(case_name)
+        for status, header in steps:
+            reporter.add(status, header)
+        reporter.end_test()
+        reporter.find_case(f"/main/{case_name}").duration = duration
+    return reporter.root
+
+
+OLD = [("CaseA", [(StepResult.PASS, "s1"), (StepResult.PASS, "s2")], 1.0),
+       ("CaseB", [(StepResult.FAIL, "s1")], 1.0),
+       ("CaseC", [(StepResult.PASS, "s1")], 10.0),
+       ("CaseRemoved", [(StepResult.PASS, "s1")], 1.0)]
+NEW = [("CaseA", [(StepResult.PASS, "s1"), (StepResult.FAIL, "s2"), (StepResult.PASS, "s3")], 1.0),
+       ("CaseB", [(StepResult.PASS, "s1")], 1.0),
+       ("CaseC", [(StepResult.PASS, "s1")], 15.0),
+       ("CaseAdded", [(StepResult.PASS, "s1")], 1.0)]
+
+
+class TestDiffResults:
+
+    def test_changes(self):
+        diff = diff_results(make_root(OLD), make_root(NEW))
+        assert [change.key for change in diff.newly_failing] == ["/main/CaseA"]
+        assert [change.key for change in diff.newly_passing] == ["/main/CaseB"]
+        assert [change.key for change in diff.added] == ["/main/CaseAdded"]
+        assert [change.key for change in diff.removed] == ["/main/CaseRemoved"]
+        assert [change.key for change in diff.duration_regressions] == ["/main/CaseC"]
+        case_a = diff.step_changes[0]
+        assert case_a.key == "/main/CaseA"
+        assert case_a.steps_added == ["/s3"]
+        assert case_a.steps_changed == [("/s2", StepResult.PASS, StepResult.FAIL)]
+        assert "新增失败(1)" in diff.to_text()
+
+    def test_no_changes(self):
+        diff = diff_results(make_root(OLD), make_root(OLD))
+        assert not diff.has_changes
+        assert diff.to_text() == "没有差异"
+
+    def test_same_name_cases(self):
+        """
+        同一个测试列表中重名的测试用例按出现的顺序区分
+        """
+        old = make_root([("CaseA", [(StepResult.PASS, "s1")], 1.0), ("CaseA", [(StepResult.PASS, "s1")], 1.0)])
+        new = make_root([("CaseA", [(StepResult.PASS, "s1")], 1.0), ("CaseA", [(StepResult.FAIL, "s1")], 1.0)])
+        diff = diff_results(old, new)
+        assert [change.key for change in diff.newly_failing] == ["/main/CaseA#2"]
+
+    def test_timeout_is_failing(self):
+        """
+        执行超时记录为EXCEPTION, 计为新增失败
+        """
+        old = make_root([("CaseA", [(StepResult.PASS, "s1")], 1.0)])
+        new = make_root([("CaseA", [(StepResult.PASS, "s1"), (StepResult.EXCEPTION, "执行超时")], 1.0)])
+        diff = diff_results(old, new)
+        assert [change.key for change in diff.newly_failing] == ["/main/CaseA"]
+
+    def test_load_result(self, tmp_path):
+        """
+        json文件和事件日志都可以作为比较的输入
+        """
+        json_file = str(tmp_path / "old.json")
+        with open(json_file, "w", encoding="utf-8") as file:
+            json.dump(make_root(OLD).to_dict(), file)
+        event_file = str(tmp_path / EventLog.file_name)
+        event_log = EventLog(event_file)
+        make_root(NEW, event_log)
+        event_log.close()
+        diff = diff_results(load_result(json_file), load_result(event_file))
+        assert [change.key for change in diff.newly_failing] == ["/main/CaseA"]
+        assert diff.to_dict()["removed"][0]["old_status"] == "PASS"
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 10:25
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: eventlog_test.py
+import logging
+import os
+
+from core.result.eventlog import EventLog, iter_records, replay, OP_SESSION
+from core.result.reporter import ResultReporter, ResultNode, StepResult
+
+from reporter_test import run_case
+
+
+def without_duration(obj):
+    """
+    结束记录的时间戳与节点结束的时间不完全相同, 比较时去掉执行时间
+    """
+    obj.pop("duration", None)
+    for child in obj["children"]:
+        without_duration(child)
+    return obj
+
+
+def record_run(filename):
+    """
+    串行执行、fork合并以及挂载结果子树, 都记录在事件日志中
+    """
+    reporter = ResultReporter(logging.getLogger("EventLogTest"), EventLog(filename))
+    reporter.add_list("main")
+    run_case(reporter, "CaseA", StepResult.PASS)
+    fork = reporter.fork()
+    run_case(fork, "CaseB", StepResult.FAIL)
+    reporter.merge(fork)
+    other = ResultReporter(logging.getLogger("EventLogTest"))
+    run_case(other, "CaseC", StepResult.PASS)
+    reporter.attach(ResultNode.from_dict(other.root.children[0].to_dict()))
+    reporter.event_log.close()
+    return reporter
+
+
+class TestReplay:
+
+    def test_same_tree(self, tmp_path):
+        filename = str(tmp_path / EventLog.file_name)
+        reporter = record_run(filename)
+        root = replay(filename)
+        assert [child.header for child in root.children[0].children] == ["CaseA", "CaseB", "CaseC"]
+        assert without_duration(root.to_dict()) == without_duration(reporter.root.to_dict())
+        assert root.get_test_case_stats() == reporter.root.get_test_case_stats()
+        case_node = root.children[0].children[0]
+        assert abs(case_node.duration - reporter.root.children[0].children[0].duration) < 0.01
+
+    def test_last_session(self, tmp_path):
+        """
+        继续执行时在同一个文件中开始新的会话, 只重建最后一次会话
+        """
+        filename = str(tmp_path / EventLog.file_name)
+        record_run(filename)
+        reporter = ResultReporter(logging.getLogger("EventLogTest"), EventLog(filename))
+        reporter.add_list("resumed")
+        reporter.event_log.close()
+        assert [child.header for child in replay(filename).children] == ["resumed"]
+
+    def test_incomplete_record(self, tmp_path):
+        """
+        进程崩溃时最后一条记录可能不完整, 读取时忽略, 之后写完整时可以继续读取
+        """
+        filename = str(tmp_path / EventLog.file_name)
+        record_run(filename)
+        with open(filename, mode="rb") as file:
+            data = file.read()
+        with open(filename, mode="wb") as file:
+            file.write(data[:-3])
+        with open(filename, mode="rb") as file:
+            records = list(iter_records(file))
+            assert records[0].op == OP_SESSION
+            position = file.tell()
+        assert position < len(data) - 3
+        assert replay(filename) is not None
+        with open(filename, mode="ab") as file:
+            file.write(data[-3:])
+        with open(filename, mode="rb") as file:
+            file.seek(position)
+            assert len(list(iter_records(file))) == 1
+            assert file.tell() == os.path.getsize(filename)
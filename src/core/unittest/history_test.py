@@ -0,0 +1,64 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 15:20
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: history_test.py
+from core.case.decorator import case
+from core.testengine.history import CaseHistory
+
+
+@case(priority=1)
+class ShortCase:
+    pass
+
+
+@case(priority=1)
+class LongCase:
+    pass
+
+
+@case(priority=2, testcase_id="TC-002")
+class NewLowCase:
+    pass
+
+
+@case(priority=1)
+class NewHighCase:
+    pass
+
+
+class TestCaseHistory:
+
+    def test_lpt_order(self, tmp_path):
+        """
+        有历史记录的测试用例按耗时从长到短排在前面, 没有历史记录的按优先级排在后面
+        """
+        history = CaseHistory(str(tmp_path / "history.json"))
+        history.record(ShortCase, 1.0)
+        history.record(LongCase, 5.0)
+        ordered = history.lpt_order([NewLowCase, ShortCase, NewHighCase, LongCase])
+        assert ordered == [LongCase, ShortCase, NewHighCase, NewLowCase]
+
+    def test_moving_average(self, tmp_path):
+        history = CaseHistory(str(tmp_path / "history.json"))
+        history.record(LongCase, 10.0)
+        history.record(LongCase, 20.0)
+        assert history.estimate(LongCase) == CaseHistory.alpha * 20.0 + (1 - CaseHistory.alpha) * 10.0
+        assert history.estimate(ShortCase) is None
+
+    def test_save_and_load(self, tmp_path):
+        filename = str(tmp_path / "history" / "history.json")
+        history = CaseHistory(filename)
+        history.record(NewLowCase, 3.0)
+        history.record(ShortCase, 1.0)
+        history.save()
+        loaded = CaseHistory(filename)
+        # 有测试用例ID时以ID为键
+        assert loaded.records["TC-002"] == {"duration": 3.0, "runs": 1}
+        assert loaded.estimate(ShortCase) == 1.0
+
+    def test_broken_file(self, tmp_path):
+        filename = tmp_path / "history.json"
+        filename.write_text("{broken")
+        assert CaseHistory(str(filename)).records == {}
@@ -0,0 +1,106 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/01 0001 14:20
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: isolation_test.py
+import logging
+import os
+import threading
+import time
+
+from core.case.base import TestCaseBase
+from core.result.reporter import ResultReporter, StepResult, NodeType
+from core.testengine.isolation import ProcessCaseExecutor
+
+
+# =====================================
+# 测试用的测试用例, 在测试用例进程中以本模块的路径导入
+# =====================================
+class IsolatedCase(TestCaseBase):
+
+    def collect_resource(self, pool):
+        pass
+
+    def setup(self):
+        self.reporter.add(StepResult.PASS, "setup done")
+
+    def test(self):
+        self.reporter.add(StepResult.PASS, "first step")
+
+    def cleanup(self):
+        pass
+
+
+class HangCase(IsolatedCase):
+
+    def test(self):
+        self.reporter.add(StepResult.PASS, "before hang")
+        time.sleep(60)
+
+
+class CrashCase(IsolatedCase):
+
+    def test(self):
+        self.reporter.add(StepResult.PASS, "before crash")
+        os._exit(3)
+
+
+def run_isolated(case_class, timeout=0, resource_pool=None):
+    reporter = ResultReporter(logging.getLogger("IsolationTest"))
+    passed = ProcessCaseExecutor().run(case_class(reporter), reporter, resource_pool, timeout)
+    return passed, reporter
+
+
+def find(node, header):
+    for child in node.children:
+        if child.header == header:
+            return child
+    raise AssertionError(f"{node.header}中没有{header}")
+
+
+class TestProcessCaseExecutor:
+
+    def test_passed(self):
+        passed, reporter = run_isolated(IsolatedCase)
+        case_node = find(reporter.root, "IsolatedCase")
+        assert passed
+        assert case_node.type == NodeType.Case
+        assert case_node.status == StepResult.PASS
+        assert case_node.duration is not None
+        assert find(find(case_node, "TEST"), "first step").status == StepResult.PASS
+        assert reporter.search_result("IsolatedCase") == StepResult.PASS
+
+    def test_timeout_keeps_steps(self):
+        """
+        超时终止时保留已经传回的步骤, 失败原因记录在正在执行的阶段下
+        """
+        passed, reporter = run_isolated(HangCase, timeout=2)
+        assert not passed
+        assert len(reporter.root.children) == 1
+        case_node = find(reporter.root, "HangCase")
+        assert find(find(case_node, "SETUP"), "setup done").status == StepResult.PASS
+        test_group = find(case_node, "TEST")
+        assert [child.header for child in test_group.children] == ["before hang", "测试用例执行超时"]
+        assert case_node.status == StepResult.EXCEPTION
+        assert case_node.duration is not None
+
+    def test_crash_keeps_steps(self):
+        passed, reporter = run_isolated(CrashCase)
+        assert not passed
+        case_node = find(reporter.root, "CrashCase")
+        test_group = find(case_node, "TEST")
+        assert [child.header for child in test_group.children] == ["before crash", "测试用例进程异常退出"]
+        assert "3" in test_group.children[-1].message
+
+    def test_unpicklable_pool(self):
+        """
+        测试资源池不能被pickle时, 只记录该测试用例异常, 不抛出异常
+        """
+        passed, reporter = run_isolated(IsolatedCase, resource_pool=threading.Lock())
+        assert not passed
+        case_node = find(reporter.root, "IsolatedCase")
+        failure = find(case_node, "测试用例进程启动失败")
+        assert failure.status == StepResult.EXCEPTION
+        assert case_node.status == StepResult.EXCEPTION
+        assert case_node.duration is not None
@@ -0,0 +1,142 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 16:30
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: lifecycle_test.py
+import logging
+import threading
+import time
+
+from core.case.base import TestCaseBase
+from core.result.reporter import ResultReporter, StepResult
+from core.testengine.lifecycle import run_case_phases
+
+
+class PhaseCase(TestCaseBase):
+    setup_delay = 0
+    test_delay = 0
+
+    def __init__(self, reporter):
+        super().__init__(reporter)
+        self.calls = list()
+        self.unblock = threading.Event()
+
+    def collect_resource(self, pool):
+        self.calls.append("collect")
+
+    def setup(self):
+        self.calls.append("setup")
+        self.unblock.wait(self.setup_delay)
+
+    def test(self):
+        self.calls.append("test")
+        self.reporter.add(StepResult.PASS, "test started")
+        self.unblock.wait(self.test_delay)
+        self.reporter.add(StepResult.PASS, "test finished")
+        if self.logger is not None:
+            self.logger.info("test finished")
+
+    def cleanup(self):
+        self.calls.append("cleanup")
+
+    def release_resource(self):
+        self.calls.append("release")
+
+
+class SlowTestCase(PhaseCase):
+    test_delay = 10
+
+
+class SlowCollectCase(PhaseCase):
+
+    def collect_resource(self, pool):
+        super().collect_resource(pool)
+        self.unblock.wait(10)
+
+
+class CaseTimeoutCase(PhaseCase):
+    setup_delay = 0.6
+    test_delay = 0.6
+    timeout = 1
+
+
+def run(case_class, timeouts=None, case_logger=None):
+    reporter = ResultReporter(logging.getLogger("LifecycleTest"))
+    reporter.case_logger = case_logger
+    test = case_class(reporter)
+    start = time.monotonic()
+    passed = run_case_phases(test, reporter, None, timeouts=timeouts)
+    elapsed = time.monotonic() - start
+    test.unblock.set()
+    return passed, reporter.root.children[0], test, elapsed
+
+
+def headers(node):
+    return [child.header for child in node.children]
+
+
+class TestPhaseTimeout:
+
+    def test_without_timeout(self):
+        passed, case_node, test, _ = run(PhaseCase, {"TEST": 5})
+        assert passed
+        assert test.calls == ["collect", "setup", "test", "cleanup"]
+
+    def test_phase_timeout(self):
+        """
+        TEST阶段超时记录EXCEPTION, 继续执行cleanup并释放资源, 阻塞的线程中之后的步骤不影响结果
+        """
+        passed, case_node, test, elapsed = run(SlowTestCase, {"TEST": 0.3})
+        assert not passed
+        assert elapsed < 2
+        assert case_node.status == StepResult.EXCEPTION
+        test_group = case_node.children[2]
+        assert headers(test_group) == ["test started", "执行超时"]
+        assert "TEST阶段" in test_group.children[-1].message
+        assert test.calls == ["collect", "setup", "test", "cleanup", "release"]
+
+    def test_case_timeout(self):
+        """
+        @case(timeout=...)限制各阶段的总时间, 每个阶段单独都没有超时
+        """
+        passed, case_node, test, elapsed = run(CaseTimeoutCase)
+        assert not passed
+        assert elapsed < 2
+        assert case_node.status == StepResult.EXCEPTION
+        assert test.calls == ["collect", "setup", "test", "cleanup", "release"]
+
+    def test_collect_resource_timeout(self):
+        """
+        collect_resource超时后仍然执行cleanup, 使用cleanup自己的时间限制
+        """
+        passed, case_node, test, elapsed = run(SlowCollectCase, {"COLLECT_RESOURCE": 0.3, "CLEANUP": 5})
+        assert not passed
+        assert elapsed < 2
+        assert case_node.status == StepResult.EXCEPTION
+        assert headers(case_node.children[0]) == ["执行超时"]
+        assert test.calls == ["collect", "cleanup", "release"]
+
+    def test_detach_after_timeout(self):
+        """
+        超时的看门狗线程之后写入的步骤和日志被丢弃
+        """
+        records = list()
+        case_logger = logging.getLogger("LifecycleTest.case")
+        case_logger.setLevel(logging.INFO)
+        handler = logging.Handler()
+        handler.emit = records.append
+        case_logger.addHandler(handler)
+        try:
+            passed, case_node, test, _ = run(SlowTestCase, {"TEST": 0.3}, case_logger)
+            watchdog = [thread for thread in threading.enumerate() if thread.name == "Watchdog-TEST"]
+            for thread in watchdog:
+                thread.join(5)
+            case_logger.info("after timeout")
+        finally:
+            case_logger.removeHandler(handler)
+        assert headers(case_node.children[2]) == ["test started", "执行超时"]
+        assert all(child.header != "test finished" for child in case_node.children)
+        messages = [record.getMessage() for record in records]
+        assert "after timeout" in messages
+        assert "test finished" not in messages
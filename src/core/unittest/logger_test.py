@@ -0,0 +1,273 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/01 0001 10:30
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: logger_test.py
+import logging
+import os
+import threading
+import zipfile
+
+from core.result.jsonlog import JsonLinesHandler, read_logs
+from core.result.logger import LoggerManager, _CaseFileHandler
+from core.result.reporter import ResultReporter, StepResult
+
+
+def _read(filename):
+    with open(filename) as file:
+        return file.read()
+
+
+class TestCaseFanOut:
+
+    def test_concurrent_cases(self, tmp_path):
+        """
+        两个测试用例同时注册和注销, 模块的日志输出到两个测试用例目录, 注销后不残留句柄
+        """
+        manager = LoggerManager()
+        module = manager.register("FanOutModule", filename=str(tmp_path / "module" / "module.log"),
+                                  console=False, for_test=True)
+        barrier = threading.Barrier(2)
+
+        def run_case(name):
+            manager.register(name, filename=str(tmp_path / name / f"{name}.log"), console=False, is_test=True)
+            barrier.wait()
+            module.info("both running")
+            barrier.wait()
+            manager.unregister(name)
+
+        threads = [threading.Thread(target=run_case, args=(name,)) for name in ("FanOutCase1", "FanOutCase2")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        module.info("no case running")
+
+        info = manager.logger_info["FanOutModule"]
+        assert info['case_targets'] == {}
+        assert 'case_handler' not in info
+        assert not any(isinstance(handler, _CaseFileHandler) for handler in module.handlers)
+        for name in ("FanOutCase1", "FanOutCase2"):
+            text = _read(tmp_path / name / "FanOutModule.log")
+            assert text.count("both running") == 2
+            assert "no case running" not in text
+        manager.unregister("FanOutModule")
+
+    def test_sequential_cases(self, tmp_path):
+        """
+        测试用例依次执行时, 模块的日志只输出到正在执行的测试用例目录
+        """
+        manager = LoggerManager()
+        module = manager.register("SeqModule", filename=str(tmp_path / "module.log"), console=False, for_test=True)
+        for name in ("SeqCase1", "SeqCase2"):
+            manager.register(name, filename=str(tmp_path / name / f"{name}.log"), console=False, is_test=True)
+            module.info(f"during {name}")
+            manager.unregister(name)
+        assert _read(tmp_path / "SeqCase1" / "SeqModule.log").strip().endswith("during SeqCase1")
+        assert "SeqCase1" not in _read(tmp_path / "SeqCase2" / "SeqModule.log")
+        assert "during SeqCase2" in _read(tmp_path / "module.log")
+        manager.unregister("SeqModule")
+
+    def test_shared_directory(self, tmp_path):
+        """
+        同一个目录中并行执行的测试用例, 模块日志只写入一次, 先结束的测试用例不影响其他测试用例的输出
+        """
+        manager = LoggerManager()
+        module = manager.register("SharedModule", filename=str(tmp_path / "module.log"), console=False, for_test=True)
+        manager.register("SharedCase1", filename=str(tmp_path / "list" / "SharedCase1.log"), console=False,
+                         is_test=True)
+        manager.register("SharedCase2", filename=str(tmp_path / "list" / "SharedCase2.log"), console=False,
+                         is_test=True)
+        module.info("both running")
+        manager.unregister("SharedCase1")
+        module.info("case2 running")
+        # 第三个测试用例在第二个结束之前开始, 不清空正在使用的文件
+        manager.register("SharedCase3", filename=str(tmp_path / "list" / "SharedCase3.log"), console=False,
+                         is_test=True)
+        module.info("case2 and case3 running")
+        manager.unregister("SharedCase2")
+        manager.unregister("SharedCase3")
+        module.info("no case running")
+
+        text = _read(tmp_path / "list" / "SharedModule.log")
+        assert text.count("both running") == 1
+        assert text.count("case2 running") == 1
+        assert text.count("case2 and case3 running") == 1
+        assert "no case running" not in text
+        manager.unregister("SharedModule")
+
+
+class TestArchive:
+
+    @staticmethod
+    def archives(path):
+        return sorted(name for name in os.listdir(path) if name.endswith(".zip"))
+
+    def test_nested_directories(self, tmp_path):
+        """
+        子目录和父目录先后注销时依次压缩, 父目录的压缩包不包含子目录中的压缩包
+        """
+        manager = LoggerManager()
+        case_logger = manager.register("ZipCase", filename=str(tmp_path / "list" / "sub" / "ZipCase.log"),
+                                       console=False, is_test=True, zip=True)
+        list_logger = manager.register("ZipList", filename=str(tmp_path / "list" / "list.log"), console=False,
+                                       zip=True)
+        case_logger.info("case log")
+        list_logger.info("list log")
+        manager.unregister("ZipCase")
+        manager.unregister("ZipList")
+        manager.wait_archives()
+
+        sub_archives = self.archives(tmp_path / "list" / "sub")
+        assert len(sub_archives) == 1
+        with zipfile.ZipFile(tmp_path / "list" / "sub" / sub_archives[0]) as zip_file:
+            assert zip_file.namelist() == ["ZipCase.log"]
+        assert os.path.exists(tmp_path / "list" / "sub" / (sub_archives[0] + ".sha256"))
+        list_archives = self.archives(tmp_path / "list")
+        assert len(list_archives) == 1
+        with zipfile.ZipFile(tmp_path / "list" / list_archives[0]) as zip_file:
+            assert zip_file.namelist() == ["list.log"]
+        assert not os.path.exists(tmp_path / "list" / "list.log")
+
+    def test_same_directory(self, tmp_path):
+        """
+        同一秒内压缩同一个目录时, 不覆盖之前的压缩包
+        """
+        manager = LoggerManager()
+        for name in ("ZipCase1", "ZipCase2"):
+            case_logger = manager.register(name, filename=str(tmp_path / "list" / f"{name}.log"), console=False,
+                                           is_test=True, zip=True)
+            case_logger.info(name)
+            manager.unregister(name)
+        manager.wait_archives()
+
+        names = list()
+        for archive in self.archives(tmp_path / "list"):
+            with zipfile.ZipFile(tmp_path / "list" / archive) as zip_file:
+                names.extend(zip_file.namelist())
+        assert sorted(names) == ["ZipCase1.log", "ZipCase2.log"]
+
+    def test_wait_for_running_cases(self, tmp_path):
+        """
+        同一目录中的其他测试用例仍在执行时推迟压缩, 全部注销后压缩完整的日志, 使用DEFLATED压缩
+        """
+        manager = LoggerManager()
+        module_logger = manager.register("ZipModule", filename=str(tmp_path / "module.log"), console=False,
+                                         for_test=True)
+        loggers = {name: manager.register(name, filename=str(tmp_path / "list" / f"{name}.log"), console=False,
+                                          is_test=True, zip=True) for name in ("ZipCaseA", "ZipCaseB")}
+        loggers["ZipCaseA"].info("A line")
+        loggers["ZipCaseB"].info("B first line")
+        manager.unregister("ZipCaseA")
+        manager.wait_archives()
+        assert self.archives(tmp_path / "list") == []
+        loggers["ZipCaseB"].info("B second line")
+        module_logger.info("module line")
+        manager.unregister("ZipCaseB")
+        manager.wait_archives()
+        manager.unregister("ZipModule")
+
+        archives = self.archives(tmp_path / "list")
+        assert len(archives) == 1
+        with zipfile.ZipFile(tmp_path / "list" / archives[0]) as zip_file:
+            assert sorted(zip_file.namelist()) == ["ZipCaseA.log", "ZipCaseB.log", "ZipModule.log"]
+            assert {info.compress_type for info in zip_file.infolist()} == {zipfile.ZIP_DEFLATED}
+            text = zip_file.read("ZipCaseB.log").decode()
+            assert "B first line" in text and "B second line" in text
+            assert "module line" in zip_file.read("ZipModule.log").decode()
+        assert not os.path.exists(tmp_path / "list" / "ZipCaseB.log")
+
+
+class TestRingBuffer:
+
+    @staticmethod
+    def run_case(tmp_path, dump):
+        manager = LoggerManager()
+        case_logger = manager.register("RingCase", filename=str(tmp_path / "RingCase.log"), console=False,
+                                       is_test=True, ring_buffer=3)
+        for index in range(5):
+            case_logger.debug(f"debug {index}")
+        case_logger.info("info line")
+        manager.unregister("RingCase", dump=dump)
+        return _read(tmp_path / "RingCase.log")
+
+    def test_dump(self, tmp_path):
+        """
+        写入最近的低于输出等级的记录, 已经输出的记录不重复写入
+        """
+        text = self.run_case(tmp_path, dump=True)
+        assert text.count("info line") == 1
+        assert "debug 1" not in text
+        assert [f"debug {index}" in text for index in (2, 3, 4)] == [True] * 3
+
+    def test_no_dump(self, tmp_path):
+        text = self.run_case(tmp_path, dump=False)
+        assert "info line" in text
+        assert "debug" not in text
+
+
+class TestQueueMode:
+
+    def test_write_in_listener(self, tmp_path):
+        """
+        队列模式下日志由监听线程写入, flush之后全部写入文件, 切换回直接输出后继续写入
+        """
+        manager = LoggerManager()
+        queued = manager.register("QueuedModule", filename=str(tmp_path / "module.log"), console=False, for_test=True)
+        manager.start_queue()
+        manager.register("QueuedCase", filename=str(tmp_path / "case" / "QueuedCase.log"), console=False,
+                         is_test=True)
+        assert not any(isinstance(handler, logging.FileHandler) for handler in queued.handlers)
+        for index in range(100):
+            queued.info(f"queued {index}")
+        manager.flush()
+        assert _read(tmp_path / "case" / "QueuedModule.log").count("queued") == 100
+        manager.unregister("QueuedCase")
+        manager.stop_queue()
+        queued.info("direct")
+        text = _read(tmp_path / "module.log")
+        assert text.count("queued") == 100
+        assert "direct" in text
+        manager.unregister("QueuedModule")
+
+
+class TestJsonLog:
+
+    def test_read_by_case(self, tmp_path):
+        """
+        按测试用例和步骤读取结构化日志, 队列模式下使用记录日志的线程所在的节点
+        """
+        filename = str(tmp_path / JsonLinesHandler.file_name)
+        manager = LoggerManager()
+        json_logger = manager.register("JsonModule", console=False)
+        manager.start_queue()
+        manager.start_json_log(filename)
+        reporter = ResultReporter(logging.getLogger("JsonReporter"))
+
+        def run_case(name):
+            with reporter.context():
+                reporter.add_test(name)
+                reporter.add_step_group("TEST")
+                json_logger.info(f"{name} in test")
+                reporter.end_step_group()
+                json_logger.info(f"{name} after test")
+                reporter.add(StepResult.PASS, "step")
+                reporter.end_test()
+
+        for name in ("JsonCase1", "JsonCase2"):
+            thread = threading.Thread(target=run_case, args=(name,))
+            thread.start()
+            thread.join()
+        manager.stop_json_log()
+        manager.stop_queue()
+
+        assert [record["msg"] for record in read_logs(filename, case="JsonCase2")] == \
+               ["JsonCase2 in test", "JsonCase2 after test"]
+        records = list(read_logs(filename, case="JsonCase1", step="TEST"))
+        assert [(record["case"], record["step"], record["msg"]) for record in records] == \
+               [("JsonCase1", "TEST", "JsonCase1 in test")]
+        first, last = records[0]["mono"], list(read_logs(filename, case="JsonCase2"))[-1]["mono"]
+        assert [record["msg"] for record in read_logs(filename, start=first + 1, end=last - 1)] == \
+               ["JsonCase1 after test", "JsonCase2 in test"]
+        manager.unregister("JsonModule")
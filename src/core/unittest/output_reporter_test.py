@@ -0,0 +1,134 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 14:05
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: output_reporter_test.py
+import json
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from core.result.output_reporter import StepReporter, NodeEntry, ResultType
+
+
+@pytest.fixture
+def step_reporter(tmp_path):
+    reporter = StepReporter(logging.getLogger("StepReporterTest"), str(tmp_path))
+    yield reporter
+    reporter.close()
+
+
+class TestBackgroundFlush:
+
+    def test_coalesce_updates(self, step_reporter, monkeypatch):
+        """
+        多次修改合并为一次写入, 关闭时写入最后的结果
+        """
+        writes = list()
+        update_file = step_reporter.update_file
+        monkeypatch.setattr(step_reporter, "update_file", lambda: writes.append(1) or update_file())
+        monkeypatch.setattr(step_reporter, "flush_interval", 60)
+        with step_reporter.start_node("list", "") as test_list:
+            with test_list.start_case("case") as case:
+                for index in range(10):
+                    with case.start(f"step {index}", "") as step:
+                        step.passed("ok")
+        assert writes == []
+        step_reporter.close()
+        assert writes == [1]
+        with open(step_reporter.json_path) as file:
+            obj = json.load(file)
+        assert obj["children"][0]["children"][0]["result"] == ResultType.PASS.value
+
+    def test_flush_on_changes(self, step_reporter, monkeypatch):
+        """
+        变化次数达到flush_changes时不等待flush_interval
+        """
+        monkeypatch.setattr(step_reporter, "flush_interval", 60)
+        monkeypatch.setattr(step_reporter, "flush_changes", 5)
+        test_list = step_reporter.start_node("list", "")
+        for index in range(5):
+            test_list.start_node(f"node {index}")
+        deadline = time.monotonic() + 5
+        while not os.path.exists(step_reporter.txt_path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(step_reporter.txt_path) as file:
+            assert "list" in file.read()
+
+
+    def test_snapshot_under_lock(self, step_reporter):
+        """
+        测试线程修改结果树期间, 后台写入等待修改完成后再取快照
+        """
+        case = step_reporter.start_node("list", "").start_case("case")
+        written = threading.Event()
+        with case.lock:
+            step = case.start("step", "")
+            threading.Thread(target=lambda: step_reporter.update_file() or written.set(), daemon=True).start()
+            assert not written.wait(0.2)
+            step.result = ResultType.FAIL
+        assert written.wait(5)
+        with open(step_reporter.json_path) as file:
+            assert json.load(file)["children"][0]["children"][0]["result"] == ResultType.FAIL.value
+
+
+class TestSingleton:
+
+    @pytest.fixture(autouse=True)
+    def reset_instance(self, monkeypatch):
+        monkeypatch.setattr(StepReporter, "instance", None)
+        yield
+        if StepReporter.instance is not None:
+            StepReporter.instance.close()
+
+    def test_cached_instance(self, tmp_path):
+        logger = logging.getLogger("StepReporterTest")
+        reporter = StepReporter.get_instance(logger, str(tmp_path))
+        assert StepReporter.get_instance(logger) is reporter
+        reporter.start_node("list", "")
+        StepReporter.get_instance(logger).start_node("list", "")
+        flushers = [thread for thread in threading.enumerate() if thread.name == "StepReporterFlusher"]
+        assert flushers == [reporter._flusher]
+
+    def test_default_path(self, runner_setting):
+        reporter = StepReporter.get_instance(logging.getLogger("StepReporterTest"))
+        assert reporter.json_path == os.path.join(runner_setting.log_path, "step_result.json")
+        reporter.start_node("list", "")
+        reporter.close()
+        assert os.path.exists(reporter.txt_path)
+
+
+class TestCachedResult:
+
+    def test_update_dirty_only(self):
+        root = NodeEntry("root")
+        case = root.start_case("case")
+        steps = [case.start(f"step {index}", "") for index in range(3)]
+        for step in steps:
+            step.result = ResultType.PASS
+        case.update_result()
+        assert case.result == ResultType.PASS
+        assert not case._dirty and not steps[0]._dirty
+
+        # 修改一个步骤的结果, 只有该步骤的祖先节点需要重新汇总
+        steps[1].result = ResultType.FAIL
+        assert case._dirty and root._dirty
+        assert not steps[0]._dirty
+        case.update_result()
+        assert case.result == ResultType.FAIL
+
+    def test_nested_steps(self):
+        root = NodeEntry("root")
+        case = root.start_case("case")
+        step = case.start("step", "")
+        sub_step = step.start("sub step", "")
+        sub_step.result = ResultType.PASS
+        case.update_result()
+        assert step.result == ResultType.PASS
+        step.start("blocked sub step", "").result = ResultType.BLOCK
+        case.update_result()
+        assert (step.result, case.result) == (ResultType.BLOCK, ResultType.BLOCK)
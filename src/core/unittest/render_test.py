@@ -0,0 +1,78 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/02 0002 09:40
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: render_test.py
+import io
+import json
+import logging
+import xml.etree.ElementTree as ElementTree
+
+from core.result.render import write_text, write_json, write_junit, write_report
+from core.result.reporter import ResultReporter, ResultNode, StepResult
+from core.testengine.lifecycle import run_case_phases
+
+from lifecycle_test import SlowTestCase
+from reporter_test import make_tree, run_case
+
+
+class TestStreamWriter:
+
+    def test_text(self):
+        root = make_tree().root
+        buffer = io.StringIO()
+        write_text(root, buffer)
+        text = buffer.getvalue()
+        assert "[TestList]main" in text
+        assert "[TestCase]CasePass" in text
+        assert "描述: message" in text
+
+    def test_json_same_as_to_dict(self):
+        """
+        流式输出的JSON与to_dict的结构相同, 可以重建结果树
+        """
+        root = make_tree().root
+        buffer = io.StringIO()
+        write_json(root, buffer)
+        obj = json.loads(buffer.getvalue())
+        assert obj == json.loads(json.dumps(root.to_dict()))
+        assert ResultNode.from_dict(obj).to_text() == root.to_text()
+
+    def test_junit(self):
+        reporter = make_tree()
+        reporter.add_list("sub")
+        run_case(reporter, "CaseSub", StepResult.STOP)
+        buffer = io.StringIO()
+        write_junit(reporter.root, buffer)
+        suites = ElementTree.fromstring(buffer.getvalue())
+        assert suites.get("failures") == "1"
+        main, sub = suites.findall("testsuite")
+        assert (main.get("name"), main.get("tests"), main.get("failures")) == ("Root/main", "3", "1")
+        failure = main.find("testcase[@name='CaseFail']/failure")
+        assert failure.get("message") == "step"
+        assert sub.get("name") == "Root/main/sub"
+        assert sub.find("testcase/skipped") is not None
+
+    def test_junit_timeout(self):
+        """
+        执行超时的测试用例在JUnit报告中为error, 不是skipped
+        """
+        reporter = ResultReporter(logging.getLogger("RenderTest"))
+        reporter.add_list("main")
+        test = SlowTestCase(reporter)
+        run_case_phases(test, reporter, None, timeouts={"TEST": 0.3})
+        test.unblock.set()
+        buffer = io.StringIO()
+        write_junit(reporter.root, buffer)
+        suite = ElementTree.fromstring(buffer.getvalue()).find("testsuite")
+        assert (suite.get("errors"), suite.get("skipped")) == ("1", "0")
+        error = suite.find("testcase[@name='SlowTestCase']/error")
+        assert error.get("message") == "执行超时"
+
+    def test_write_report(self, tmp_path):
+        root = make_tree().root
+        filename = str(tmp_path / "report.json")
+        write_report(root, filename, "json")
+        with open(filename, encoding="utf-8") as file:
+            assert ResultNode.from_dict(json.load(file)).to_dict() == root.to_dict()
@@ -0,0 +1,260 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/01 0001 15:40
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: reporter_test.py
+import gc
+import logging
+import os
+import sys
+import threading
+
+from core.case.precondition import IsPreCasePassed
+from core.result.reporter import ResultReporter, StepResult, ResultNode, NodeType, ListNode, CaseNode
+from core.result.spill import SpillFile
+
+
+def run_case(reporter, case_name, status):
+    reporter.add_test(case_name)
+    reporter.add(status, "step")
+    reporter.end_test()
+
+
+def make_tree():
+    """
+    一个测试列表中有通过和失败的测试用例, 以及一个带步骤集合的测试用例
+    """
+    reporter = ResultReporter(logging.getLogger("ReporterTest"))
+    reporter.add_list("main")
+    run_case(reporter, "CasePass", StepResult.PASS)
+    run_case(reporter, "CaseFail", StepResult.FAIL)
+    reporter.add_test("CaseGroup")
+    reporter.add_step_group("TEST")
+    reporter.add(StepResult.PASS, "sub step 1")
+    reporter.add(StepResult.WARNING, "sub step 2")
+    reporter.end_step_group()
+    reporter.add(StepResult.EXCEPTION, "last step", "message")
+    reporter.end_test()
+    return reporter
+
+
+class TestThreadCursor:
+
+    def test_concurrent_cases(self):
+        """
+        多个线程同时在同一个测试报告中记录, 每个线程的步骤只出现在自己的测试用例中
+        """
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.add_list("main")
+        list_node = reporter.recent_node
+        barrier = threading.Barrier(4)
+
+        def run(name):
+            with reporter.context(list_node):
+                reporter.add_test(name)
+                barrier.wait()
+                for index in range(50):
+                    reporter.add(StepResult.PASS, f"{name} step {index}")
+                reporter.end_test()
+
+        threads = [threading.Thread(target=run, args=(f"Case{index}",)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(child.header for child in list_node.children) == ["Case0", "Case1", "Case2", "Case3"]
+        for case_node in list_node.children:
+            assert [child.header for child in case_node.children] == \
+                   [f"{case_node.header} step {index}" for index in range(50)]
+        # 调用线程的游标不受其他线程影响
+        assert reporter.recent_node is list_node
+
+    def test_context_restores_cursor(self):
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.add_list("main")
+        reporter.add_test("CaseX")
+        case_node = reporter.recent_node
+        with reporter.context():
+            assert reporter.recent_node is reporter.root
+            assert reporter.recent_case is None
+        assert reporter.recent_node is case_node
+        assert reporter.recent_case is case_node
+
+
+class TestResultNode:
+
+    def test_compact_node(self):
+        node = ResultNode("step " + "header")
+        assert not hasattr(node, "__dict__")
+        assert node.header is sys.intern("step header")
+        assert node.children == ()
+
+    def test_dict_round_trip(self):
+        reporter = make_tree()
+        obj = reporter.root.to_dict()
+        rebuilt = ResultNode.from_dict(obj)
+        assert rebuilt.to_dict() == obj
+        assert isinstance(rebuilt.children[0], ListNode)
+        case_node = rebuilt.children[0].children[0]
+        assert isinstance(case_node, CaseNode)
+        assert case_node.duration == obj["children"][0]["children"][0]["duration"]
+        assert rebuilt.children[0].timestamp == reporter.root.children[0].timestamp
+
+
+class TestIncrementalStats:
+
+    @staticmethod
+    def counted(node):
+        """
+        遍历结果树重新统计
+        """
+        return (ResultNode.get_test_case_stats(node), ResultNode.get_test_point_stats(node))
+
+    @staticmethod
+    def stats(node):
+        return node.get_test_case_stats(), node.get_test_point_stats()
+
+    def test_same_as_counted(self):
+        reporter = make_tree()
+        case_stats, point_stats = self.stats(reporter.root)
+        assert (case_stats, point_stats) == self.counted(reporter.root)
+        assert case_stats["stats_pass"] == 1
+        assert case_stats["stats_fail"] == 1
+        # 测试用例的状态只从INFO和PASS变化, 之后的异常步骤不改变WARNING
+        assert case_stats["stats_warning"] == 1
+        assert point_stats["stats_warning"] == 1
+        assert point_stats["stats_exception"] == 1
+
+    def test_merge_attach_and_rebuild(self):
+        reporter = make_tree()
+        fork = reporter.fork()
+        run_case(fork, "CaseForked", StepResult.ERROR)
+        reporter.merge(fork)
+        reporter.attach(ResultNode.from_dict(make_tree().root.children[0].to_dict()))
+        assert self.stats(reporter.root) == self.counted(reporter.root)
+        assert self.stats(fork.root) == self.counted(fork.root)
+        rebuilt = ResultNode.from_dict(reporter.root.to_dict())
+        assert self.stats(rebuilt) == self.stats(reporter.root)
+
+
+class TestCaseIndex:
+
+    @staticmethod
+    def make_reporter():
+        """
+        /main/CaseX通过, /main/sub/CaseX失败
+        """
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.add_list("main")
+        run_case(reporter, "CaseX", StepResult.PASS)
+        reporter.add_list("sub")
+        run_case(reporter, "CaseX", StepResult.FAIL)
+        reporter.end_list()
+        return reporter
+
+    def test_index_on_end(self):
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.add_list("main")
+        reporter.add_test("CaseX")
+        assert reporter.find_case("CaseX") is None  # 执行中的测试用例不在索引中
+        reporter.add(StepResult.PASS, "step")
+        reporter.end_test()
+        assert reporter.find_case("/main/CaseX").status == StepResult.PASS
+        assert reporter.search_result("CaseX") == StepResult.PASS
+
+    def test_same_name_in_lists(self):
+        reporter = self.make_reporter()
+        assert reporter.search_result("/main/CaseX") == StepResult.PASS
+        assert reporter.search_result("/main/sub/CaseX") == StepResult.FAIL
+        # 按名称查找时, 返回最近执行完毕的测试用例
+        assert reporter.search_result("CaseX") == StepResult.FAIL
+        # 指定了测试列表的路径时, 优先查找同一个测试列表中的测试用例
+        fork = reporter.fork()
+        fork.list_path = "/main"
+        assert fork.search_result("CaseX") == StepResult.PASS
+
+    def test_fork(self):
+        reporter = self.make_reporter()
+        fork = reporter.fork()
+        fork.list_path = "/main/other"
+        run_case(fork, "CaseY", StepResult.PASS)
+        # fork产生的测试报告共享索引, 合并之前即可查找
+        assert reporter.search_result("/main/other/CaseY") == StepResult.PASS
+
+    def test_attach(self):
+        """
+        挂载的结果子树中的测试用例按挂载的位置加入索引
+        """
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.add_list("attached")
+        case_node = ResultNode("CaseZ", status=StepResult.PASS, node_type=NodeType.Case)
+        reporter.attach(case_node)
+        assert reporter.find_case("/attached/CaseZ") is case_node
+        assert reporter.find_case("CaseZ") is case_node
+
+
+class PreCase:
+    pre_tests = ["CaseX"]
+
+
+class TestIsPreCasePassed:
+
+    def test_read_from_index(self):
+        reporter = TestCaseIndex.make_reporter()
+        fork = reporter.fork()
+        fork.list_path = "/main"
+        # 结果集中只保留了最后执行的同名测试用例的结果, 索引按测试列表区分
+        assert IsPreCasePassed({"main#0": {'case_name': "CaseX", 'priority': 1, 'result': False}}).is_meet(PreCase, fork)
+        fork.list_path = "/main/sub"
+        assert not IsPreCasePassed({"main#0": {'case_name': "CaseX", 'priority': 1, 'result': False}}).is_meet(PreCase, fork)
+
+    def test_fall_back_to_results(self):
+        """
+        在其他测试机上执行的测试用例只有结果集中的记录
+        """
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        assert IsPreCasePassed({"main#0": {'case_name': "CaseX", 'priority': 1, 'result': True}}).is_meet(PreCase, reporter)
+        assert not IsPreCasePassed({}).is_meet(PreCase, reporter)
+
+
+class TestSpillFile:
+
+    @staticmethod
+    def make_reporter(filename):
+        """
+        与测试引擎相同, 在单独的线程中执行, 线程结束后不再持有当前节点
+        """
+        reporter = ResultReporter(logging.getLogger("ReporterTest"))
+        reporter.spill = SpillFile(filename)
+
+        def run():
+            reporter.add_list("main")
+            run_case(reporter, "CaseX", StepResult.PASS)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return reporter
+
+    def test_released_with_reporter(self, tmp_path):
+        """
+        测试报告释放之前可以读取溢出的子节点, 释放之后删除溢出文件
+        """
+        filename = str(tmp_path / SpillFile.file_name)
+        reporter = self.make_reporter(filename)
+        case_node = reporter.find_case("/main/CaseX")
+        assert case_node.is_spilled
+        assert [child.header for child in case_node.children] == ["step"]
+        assert os.path.exists(filename)
+        del reporter, case_node
+        gc.collect()
+        assert not os.path.exists(filename)
+
+    def test_close(self, tmp_path):
+        filename = str(tmp_path / SpillFile.file_name)
+        reporter = self.make_reporter(filename)
+        reporter.spill.close()
+        reporter.spill.close()
+        assert not os.path.exists(filename)
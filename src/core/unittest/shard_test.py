@@ -0,0 +1,95 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/12/03 0003 10:20
+# @Type: Unit Test
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: shard_test.py
+import pytest
+
+from core.case.decorator import case
+from core.testengine.history import CaseHistory
+from core.testengine.shard import ShardCoordinator, ShardError, connect_coordinator, parse_address, parse_shard, \
+    hash_split, duration_split, dependency_groups, flatten_case_tree
+
+EMPTY_TREE = {'list_name': "main", 'test_cases': [], 'sub_list': []}
+
+
+def make_case(name, pre_tests=()):
+    return case(priority=1, pre_tests=list(pre_tests))(type(name, (), {}))
+
+
+def make_tree():
+    """
+    依赖链ChainA -> ChainB -> ChainC(子列表中还有一个依赖ChainA的测试用例), PairA -> PairB, 以及8个独立的测试用例
+    """
+    cases = [make_case("ChainA"), make_case("PairA"), make_case("ChainB", ["ChainA"]),
+             make_case("ChainC", ["ChainB"]), make_case("PairB", ["PairA"])]
+    cases += [make_case(f"Single{index}") for index in range(8)]
+    sub_cases = [make_case("SubAfterChainA", ["ChainA"]), make_case("SubSingle")]
+
+    def descriptors(list_key, case_classes):
+        return [{'case_key': f"{list_key}#{index}", 'case_name': case_class.__name__, 'case_class': case_class}
+                for index, case_class in enumerate(case_classes)]
+
+    return {'list_name': "main", 'test_cases': descriptors("main", cases),
+            'sub_list': [{'list_name': "sub", 'test_cases': descriptors("main/0.sub", sub_cases), 'sub_list': []}]}
+
+
+class TestShardSecurity:
+
+    def test_refuse_without_authkey(self):
+        """
+        没有配置认证密钥时拒绝监听和连接
+        """
+        for authkey in ("", b""):
+            with pytest.raises(ShardError):
+                ShardCoordinator(EMPTY_TREE, ("127.0.0.1", 0), authkey)
+            with pytest.raises(ShardError):
+                connect_coordinator(("127.0.0.1", 1), authkey)
+
+    def test_default_host(self):
+        """
+        只指定端口时只监听本机
+        """
+        assert parse_address("9000") == ("127.0.0.1", 9000)
+        assert parse_address(":9000") == ("127.0.0.1", 9000)
+        assert parse_address("0.0.0.0:9000") == ("0.0.0.0", 9000)
+        coordinator = ShardCoordinator(EMPTY_TREE, parse_address("0"), "secret")
+        assert coordinator.address[0] == "127.0.0.1"
+        coordinator.listener.close()
+
+
+class TestStaticShard:
+
+    def test_dependency_groups(self):
+        groups = [[test['case_name'] for test in group] for group in dependency_groups(make_tree())]
+        assert groups[0] == ["ChainA", "ChainB", "ChainC", "SubAfterChainA"]
+        assert groups[1] == ["PairA", "PairB"]
+        assert len(groups) == 2 + 8 + 1
+
+    def test_keep_dependencies_together(self, tmp_path):
+        """
+        每个分片要么包含整条依赖链, 要么完全不包含, 所有分片合起来正好是全部测试用例
+        """
+        case_tree = make_tree()
+        history = CaseHistory(str(tmp_path / "history.json"))
+        names = {test['case_key']: test['case_name'] for test in flatten_case_tree(case_tree)}
+        for count in (1, 2, 3, 4):
+            for split in (lambda index: hash_split(case_tree, index, count),
+                          lambda index: duration_split(case_tree, index, count, history)):
+                shards = [split(index) for index in range(count)]
+                assert set().union(*shards) == set(names)
+                assert sum(len(keys) for keys in shards) == len(names)
+                for keys in shards:
+                    shard_names = {names[key] for key in keys}
+                    for chain in ({"ChainA", "ChainB", "ChainC", "SubAfterChainA"}, {"PairA", "PairB"}):
+                        assert chain <= shard_names or not chain & shard_names
+
+    def test_invalid_shard(self):
+        for index, count in ((3, 2), (2, 2), (0, 0), (-1, 2)):
+            with pytest.raises(ShardError):
+                hash_split(make_tree(), index, count)
+        for shard in ("3/2", "0/0", "-1/2", "1", "a/b"):
+            with pytest.raises(ShardError):
+                parse_shard(shard)
+        assert parse_shard("1/3") == (1, 3)
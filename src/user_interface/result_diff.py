@@ -0,0 +1,42 @@
+# -*- coding:utf-8 -*-
+# @Time: 2021/11/29 0029 21:03
+# @Type: py file
+# @Author: yangxin
+# @Email: 2827709585@qq.com
+# @File: result_diff.py
+
+import argparse
+import json
+import os
+import sys
+
+package_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(package_path, ".."))
+
+from core.result.diff import load_result, diff_results
+
+parser = argparse.ArgumentParser(description="比较两次执行的测试结果")
+
+parser.add_argument("old", type=str,
+                    help="上次执行的测试结果(json文件或事件日志)")
+parser.add_argument("new", type=str,
+                    help="本次执行的测试结果(json文件或事件日志)")
+parser.add_argument("--threshold", type=float, dest="threshold", default=0.2,
+                    help="执行时间增加超过该比例时记为变长, 默认0.2")
+parser.add_argument("--min-delta", type=float, dest="min_delta", default=1.0,
+                    help="执行时间增加的最小秒数, 默认1.0")
+parser.add_argument("--json", action="store_true", dest="json", default=False,
+                    help="以json格式输出差异")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    old_root, new_root = load_result(args.old), load_result(args.new)
+    if old_root is None or new_root is None:
+        parser.error("测试结果文件为空")
+    result_diff = diff_results(old_root, new_root, args.threshold, args.min_delta)
+    if args.json:
+        print(json.dumps(result_diff.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(result_diff.to_text())
+    # 有新增失败时返回非0, 便于在CI中使用
+    sys.exit(1 if result_diff.newly_failing else 0)
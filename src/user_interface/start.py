@@ -10,6 +10,7 @@ import os
 import sys
 
 from controller.manager import *
+from core.result.render import REPORT_FORMATS
 
 package_path = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(os.path.join(package_path, ".."))
@@ -21,16 +22,56 @@ parser.add_argument("-s", "--setting", type=str, dest="setting",
 parser.add_argument("-t", "--testlist", type=str, dest="testlist",
                     help="测试用例列表文件", required=True)
 parser.add_argument("-r", "--resource", type=str, dest="resource",
-                    help="测试资源文件", required=True)
+                    help="测试资源文件, 作为分片协调器或只输出执行计划时不需要")
 parser.add_argument("-u", "--user", type=str, dest="user",
-                    help="当前测试用户", required=True)
+                    help="当前测试用户, 作为分片协调器或只输出执行计划时不需要")
+parser.add_argument("--resume", type=str, dest="resume", default=None,
+                    help="从检查点继续执行, 指定被中断的那次执行的测试用例日志目录")
+parser.add_argument("--shard", type=str, dest="shard", default=None,
+                    help="静态分片, 格式为i/N, 只执行第i个分片(从0开始)的测试用例")
+parser.add_argument("--shard-policy", type=str, dest="shard_policy", default="hash", choices=["hash", "duration"],
+                    help="静态分片的方式: hash-按测试用例的哈希值, duration-按历史执行时间均衡")
+parser.add_argument("--plan", action="store_true", dest="plan", default=False,
+                    help="只输出执行计划(执行顺序, 跳过的测试用例, 预计耗时), 不连接设备")
+parser.add_argument("--coordinator", type=str, dest="coordinator", default=None,
+                    help="作为分片协调器在host:port上监听, 向测试机分发测试用例; 只指定port时只监听本机, "
+                         "需要在平台配置中设置认证密钥(shard_authkey)")
+parser.add_argument("--worker", type=str, dest="worker", default=None,
+                    help="作为测试机连接host:port上的分片协调器, 认证密钥与协调器相同")
+parser.add_argument("--report", type=str, dest="report", default=None,
+                    help="将测试结果写入文件, 格式由--report-format指定或根据扩展名判断(.json, .xml为JUnit, 其他为文本)")
+parser.add_argument("--report-format", type=str, dest="report_format", default=None, choices=REPORT_FORMATS,
+                    help="测试结果文件的格式")
 
-args = parser.parse_args()
+# 测试用例在独立进程中执行时会重新导入本模块, 因此只在主进程中装载和执行
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if not (args.coordinator or args.plan) and not (args.resource and args.user):
+        parser.error("执行测试时必须指定测试资源文件(-r)和测试用户(-u)")
 
-load_settings(args.setting)
-init_engine()
-load_resource(args.resource, args.user)
-load_test_list(args.testlist)
+    load_settings(args.setting)
+    init_engine()
+    if args.plan:
+        # 执行计划只需要测试列表
+        load_test_list(args.testlist)
+        if args.shard:
+            set_shard(args.shard, args.shard_policy)
+        plan_test()
+    elif args.coordinator:
+        # 协调器只分发测试用例, 不装载测试资源
+        load_test_list(args.testlist)
+        run_coordinator(args.coordinator)
+    else:
+        load_resource(args.resource, args.user)
+        load_test_list(args.testlist)
+        if args.shard:
+            set_shard(args.shard, args.shard_policy)
 
-if __name__ == '__main__':
-    run_test()
+        if args.worker:
+            run_worker(args.worker)
+        elif args.resume:
+            resume_test(args.resume)
+        else:
+            run_test()
+    if args.report and not args.plan:
+        save_report(args.report, args.report_format)